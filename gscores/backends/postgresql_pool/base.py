@@ -0,0 +1,118 @@
+"""PostgreSQL backend that takes its connections from a per-process pool.
+
+Django only pools connections natively from 5.1 on. This backend is the
+regular psycopg2 one with a ``ThreadedConnectionPool`` per database alias and
+worker process behind it: closing a Django connection hands it back to the
+pool instead of hanging up, so the next request, including one on another
+thread under ASGI, skips the TCP, TLS and authentication handshake.
+
+``OPTIONS['pool']`` takes ``min_size``, the idle connections kept open, and
+``max_size``, the most handed out at once. When every pooled connection is in
+use a plain one is opened and closed as before rather than failing the
+request. With ``CONN_HEALTH_CHECKS`` a pooled connection is pinged before it
+is handed out and replaced if the server dropped it while idle.
+"""
+import threading
+
+import psycopg2
+from psycopg2 import pool as psycopg2_pool
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+
+
+if base.is_psycopg3:
+    raise ImproperlyConfigured('The pooled PostgreSQL backend needs psycopg2, not psycopg 3.')
+
+
+class ConnectionPool(psycopg2_pool.ThreadedConnectionPool):
+    """Thread-safe pool whose connections are opened by a callable"""
+
+    def __init__(self, min_size, max_size, connect):
+        self.connect = connect
+        super().__init__(min_size, max_size)
+
+    def _connect(self, key=None):
+        connection = self.connect()
+        if key is not None:
+            self._used[key] = connection
+            self._rused[id(connection)] = key
+        else:
+            self._pool.append(connection)
+        return connection
+
+
+# Pools by alias and connection parameters, so a test database gets its own
+_pools = {}
+_lock = threading.Lock()
+
+
+def close_pools(alias=None):
+    """Close the idle connections of an alias's pools, or of every pool"""
+    with _lock:
+        for key in [key for key in _pools if alias in (None, key[0])]:
+            _pools.pop(key).closeall()
+
+
+def is_alive(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections to the test database would block DROP DATABASE
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    # The pool the open connection came from and goes back to, if any
+    pool = None
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_pool(self, conn_params):
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _lock:
+            if key not in _pools:
+                options = self.settings_dict['OPTIONS'].get('pool') or {}
+                # Connections are opened the way the plain backend opens them,
+                # with its isolation level and JSON handling
+                connect = lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+                _pools[key] = ConnectionPool(
+                    options.get('min_size', 10), options.get('max_size', 20), connect
+                )
+            return _pools[key]
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        try:
+            connection = pool.getconn()
+            if self.settings_dict['CONN_HEALTH_CHECKS'] and not is_alive(connection):
+                pool.putconn(connection, close=True)
+                connection = pool.getconn()
+        except psycopg2_pool.PoolError:
+            self.pool = None
+            return super().get_new_connection(conn_params)
+        self.pool = pool
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None or self.pool.closed:
+            return super()._close()
+        # A connection that raised a database error is not trusted again
+        with self.wrap_database_errors:
+            self.pool.putconn(self.connection, close=self.errors_occurred)
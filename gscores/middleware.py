@@ -0,0 +1,172 @@
+"""Database middleware: connection setup timing and replica pinning.
+
+ConnectionTimingMiddleware times ``connect()`` on every database connection
+the request can use: TCP, TLS and authentication plus Django's session
+setup, or taking a connection from the pool. Requests that had to open one
+are logged on the ``gscores.db`` logger with the time it took, along with how
+many of this process's requests needed one; with persistent connections that
+share should stay close to zero. Connections taken from the pool are logged
+at DEBUG.
+
+ReplicaMiddleware keeps the admin and clients that just wrote something on
+the primary database when read replicas are configured.
+"""
+import functools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+
+from scores.routers import track_writes, use_primary
+
+
+logger = logging.getLogger('gscores.db')
+
+# (alias, milliseconds, pooled) of each connection set up by the current request
+_setups = ContextVar('connection_setups', default=None)
+
+
+def time_connections(wrapper_class):
+    """Record the time each connect() of a DatabaseWrapper class takes"""
+    connect = wrapper_class.connect
+
+    @functools.wraps(connect)
+    def timed_connect(wrapper):
+        started = time.perf_counter()
+        try:
+            connect(wrapper)
+        finally:
+            setups = _setups.get()
+            if setups is not None:
+                # The pooled backend notes the pool a connection came from
+                pooled = getattr(wrapper, 'pool', None) is not None
+                setups.append((wrapper.alias, (time.perf_counter() - started) * 1000, pooled))
+
+    wrapper_class.connect = timed_connect
+    wrapper_class.connections_timed = True
+
+
+class RequestCounts:
+    """Requests this process served and how many of them opened a connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connected = 0
+
+    def record(self, connected):
+        with self._lock:
+            self.requests += 1
+            if connected:
+                self.connected += 1
+            return self.connected, self.requests
+
+
+class ConnectionTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.counts = RequestCounts()
+        # Patched on the backend classes, so the connection objects every
+        # thread or ASGI request creates later are timed too
+        for alias in connections:
+            wrapper_class = type(connections[alias])
+            if not getattr(wrapper_class, 'connections_timed', False):
+                time_connections(wrapper_class)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        setups = self.start()
+        response = self.get_response(request)
+        self.finish(request, setups)
+        return response
+
+    async def __acall__(self, request):
+        setups = self.start()
+        response = await self.get_response(request)
+        self.finish(request, setups)
+        return response
+
+    def start(self):
+        setups = []
+        _setups.set(setups)
+        return setups
+
+    def finish(self, request, setups):
+        opened = [(alias, milliseconds) for alias, milliseconds, pooled in setups if not pooled]
+        connected, requests = self.counts.record(bool(opened))
+        if opened:
+            logger.info(
+                '%s %s opened %s in %.1f ms (%d of %d requests needed a new connection)',
+                request.method,
+                request.path,
+                ', '.join(alias for alias, _ in opened),
+                sum(milliseconds for _, milliseconds in opened),
+                connected,
+                requests,
+            )
+        for alias, milliseconds, pooled in setups:
+            if pooled:
+                logger.debug('%s %s took %s from the pool in %.1f ms', request.method, request.path, alias, milliseconds)
+
+
+class ReplicaMiddleware:
+    """Read from the primary where a replica could show stale data.
+
+    The admin always reads the primary. A request that writes to the scores
+    tables sets a cookie that keeps the client on the primary for
+    REPLICA_PIN_SECONDS, so they see their own changes before the replicas
+    have them. Statistics and distributions that a page rebuilds while
+    reading are not the client's changes and do not pin it; a response that
+    does pin is marked private so shared caches do not keep the cookie.
+    """
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'use_primary'
+    # Tables derived from the students, which read paths may rebuild
+    derived_models = {
+        'scores.ScoreStatistics', 'scores.ScoreDistribution',
+        'scores.CumulativeDistribution', 'scores.DatasetSummary',
+    }
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with use_primary(self.pinned(request)), track_writes() as writes:
+            response = self.get_response(request)
+        return self.pin(response, writes)
+
+    async def __acall__(self, request):
+        with use_primary(self.pinned(request)), track_writes() as writes:
+            response = await self.get_response(request)
+        return self.pin(response, writes)
+
+    def pinned(self, request):
+        return self.cookie_name in request.COOKIES or request.path.startswith(reverse('admin:index'))
+
+    def pin(self, response, writes):
+        if writes - self.derived_models:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+            patch_cache_control(response, private=True)
+        return response
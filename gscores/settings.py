@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'gscores.middleware.ConnectionTimingMiddleware',
+    'gscores.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -59,7 +61,7 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
+        'APP_DIRS': DEBUG,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -71,6 +73,16 @@ TEMPLATES = [
     },
 ]
 
+# Production keeps compiled templates in memory for the life of the worker.
+# Development uses Django's default loaders, which reload edited templates.
+if not DEBUG:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'gscores.wsgi.application'
 
 
@@ -105,6 +117,61 @@ else:
         }
     }
 
+# The fast import engine loads MySQL with LOAD DATA LOCAL INFILE, which the
+# client library only allows when local_infile is enabled on the connection
+if DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+    DATABASES['default'].setdefault('OPTIONS', {}).setdefault('local_infile', 1)
+
+# Read replicas: DATABASE_REPLICA_URLS lists, comma-separated, databases that
+# hold copies of the primary kept up to date outside Django (streaming
+# replicas, or for trying it out locally, a copy of db.sqlite3). The
+# scores.routers router sends the scores app's reads to them; writes and
+# everything else use the primary.
+DATABASE_REPLICAS = []
+for index, url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv()), start=1):
+    DATABASE_REPLICAS.append(f'replica{index}')
+    DATABASES[f'replica{index}'] = {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['scores.routers.ReplicaRouter']
+
+# Seconds a worker trusts its last check of a replica. Replicas that fail the
+# check, or do not have the current dataset version yet, are skipped until
+# the next one.
+REPLICA_HEALTH_INTERVAL = config('REPLICA_HEALTH_INTERVAL', default=5, cast=int)
+# After a request writes to the scores tables, that client reads from the
+# primary for this many seconds so it sees its own changes.
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Persistent connections: on PostgreSQL and MySQL each worker keeps its
+# database connection for DATABASE_CONN_MAX_AGE seconds (0 closes it after
+# every request, empty keeps it open indefinitely) and checks that a kept
+# connection is still alive before the next request uses it. Opening a SQLite
+# file costs next to nothing, so it reconnects per request unless the
+# variable is set.
+#
+# Under ASGI every request queries from its own thread and so opens its own
+# connection, which a persistent one cannot be shared with; start.sh sets
+# DATABASE_CONN_MAX_AGE=0 there. On PostgreSQL, DATABASE_POOL=True instead
+# returns closed connections to a per-process pool that keeps
+# DATABASE_POOL_MIN_SIZE of them open and hands out at most
+# DATABASE_POOL_MAX_SIZE at once; keep enough open for the requests a worker
+# has in flight, or the pool closes and reopens the rest.
+SERVER_DATABASE_ENGINES = ('django.db.backends.postgresql', 'django.db.backends.mysql')
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = config(
+        'DATABASE_CONN_MAX_AGE',
+        default=60 if database['ENGINE'] in SERVER_DATABASE_ENGINES else 0,
+        cast=lambda v: int(v) if v != '' else None,
+    )
+    database['CONN_HEALTH_CHECKS'] = config('DATABASE_CONN_HEALTH_CHECKS', default=True, cast=bool)
+    if database['ENGINE'] == 'django.db.backends.postgresql' and config('DATABASE_POOL', default=False, cast=bool):
+        database['ENGINE'] = 'gscores.backends.postgresql_pool'
+        database['CONN_MAX_AGE'] = 0
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': config('DATABASE_POOL_MIN_SIZE', default=10, cast=int),
+            'max_size': config('DATABASE_POOL_MAX_SIZE', default=20, cast=int),
+        }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -153,6 +220,69 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# CACHE_BACKEND picks the store: "locmem" (per process), "file" (shared by the
+# workers of one host), or "redis" / "memcached" (shared by every host, needs
+# the redis or pymemcache package and CACHE_LOCATION, e.g. redis://host:6379/1).
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHE_DEFAULT_LOCATIONS = {
+    'locmem': 'gscores',
+    'file': str(BASE_DIR / '.cache'),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_DEFAULT_LOCATIONS.get(CACHE_BACKEND, '')),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+        'KEY_PREFIX': 'gscores',
+    }
+}
+
+# Seconds a worker trusts its cached copy of the dataset version. Shared
+# backends see import_scores' bump immediately; with locmem each worker
+# notices a new import within this many seconds.
+DATASET_VERSION_CACHE_TIMEOUT = config('DATASET_VERSION_CACHE_TIMEOUT', default=30, cast=int)
+
+# Browser/CDN caching of the read-only pages and APIs. Responses carry the
+# dataset version as ETag, so after max-age clients revalidate with a cheap
+# 304 and may keep showing the old copy meanwhile for stale-while-revalidate.
+HTTP_CACHE_MAX_AGE = config('HTTP_CACHE_MAX_AGE', default=60, cast=int)
+HTTP_CACHE_STALE_WHILE_REVALIDATE = config('HTTP_CACHE_STALE_WHILE_REVALIDATE', default=600, cast=int)
+
+# Registration number lookups: a per-process LRU of LOOKUP_CACHE_SIZE score
+# tuples, optionally backed by the shared cache above. Unknown numbers are
+# remembered for LOOKUP_CACHE_NEGATIVE_TIMEOUT seconds. A timeout of None
+# keeps found students until the next import changes the dataset version.
+LOOKUP_CACHE_SIZE = config('LOOKUP_CACHE_SIZE', default=10000, cast=int)
+LOOKUP_CACHE_SHARED = config('LOOKUP_CACHE_SHARED', default=False, cast=bool)
+LOOKUP_CACHE_TIMEOUT = config('LOOKUP_CACHE_TIMEOUT', default=None, cast=lambda v: int(v) if v else None)
+LOOKUP_CACHE_NEGATIVE_TIMEOUT = config('LOOKUP_CACHE_NEGATIVE_TIMEOUT', default=30, cast=int)
+
+# Column snapshot written by import_scores: memory-mapped NumPy arrays that
+# statistics, histograms and leaderboards read instead of scanning the
+# database. Hosts without a snapshot for the current data use the database.
+SNAPSHOT_ENABLED = config('SNAPSHOT_ENABLED', default=True, cast=bool)
+SNAPSHOT_DIR = config('SNAPSHOT_DIR', default=str(BASE_DIR / '.snapshot'))
+
+# Serve the lookup page, the single-student API and the chart API from their
+# async views. start.sh turns this on with START_MODE=asgi; under WSGI every
+# async view would need its own event loop, so the sync views are used.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Maximum registration numbers accepted by /api/students/batch/
+LOOKUP_BATCH_LIMIT = config('LOOKUP_BATCH_LIMIT', default=5000, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -193,5 +323,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # Database connection setup per request; WARNING silences it
+        'gscores.db': {
+            'handlers': ['console'],
+            'level': config('DATABASE_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
     },
 }
@@ -5,18 +5,25 @@ from django.conf.urls.static import static
 from django.http import HttpResponse, JsonResponse
 from django.db import connections
 from django.db.utils import OperationalError
+from scores.routers import replica_status
 
 def health_check(request):
     """Health check endpoint that tests database connectivity"""
     try:
-        # Test database connection
-        db_conn = connections['default']
-        db_conn.cursor()
-        return JsonResponse({
+        # Round trip on the worker's persistent connection; cursor() alone
+        # does not reach the server once a connection is open
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        payload = {
             'status': 'healthy',
             'database': 'connected',
             'django': 'running'
-        })
+        }
+        # Reads fall back to the primary, so a bad replica is reported
+        # without failing the check
+        if settings.DATABASE_REPLICAS:
+            payload['replicas'] = replica_status()
+        return JsonResponse(payload)
     except OperationalError:
         return JsonResponse({
             'status': 'unhealthy',
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Student, Subject, ForeignLanguage, ScoreStatistics
+from .dataset import refresh_dataset_summary
+from .distributions import refresh_distributions
+from .models import (
+    Combination, CumulativeDistribution, DatasetSummary, ImportCheckpoint, Student, Subject,
+    ForeignLanguage, ScoreDistribution, ScoreStatistics,
+)
+from .snapshot import get_snapshot
 
 
 @admin.register(ForeignLanguage)
@@ -8,19 +14,57 @@ class ForeignLanguageAdmin(admin.ModelAdmin):
     search_fields = ['code', 'name']
 
 
+class DerivedDataAdmin(admin.ModelAdmin):
+    """Admin for the models score distributions and leaderboards are built from.
+    
+    Any change rebuilds the distributions and cumulative tables, then bumps
+    the dataset version so leaderboards and percentile tables are rebuilt
+    for it. The hook is save_related, which runs once the subjects of a
+    combination are saved too.
+    """
+    
+    def refresh_derived_data(self):
+        # The students are unchanged, so the current snapshot still applies
+        refresh_distributions(snapshot=get_snapshot())
+        CumulativeDistribution.objects.filter(kind=CumulativeDistribution.COMBINATION).exclude(
+            key__in=Combination.objects.values('code')
+        ).delete()
+        refresh_dataset_summary(mark_import=False)
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        self.refresh_derived_data()
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.refresh_derived_data()
+    
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        self.refresh_derived_data()
+
+
 @admin.register(Subject)
-class SubjectAdmin(admin.ModelAdmin):
-    list_display = ['code', 'name', 'is_group_a']
+class SubjectAdmin(DerivedDataAdmin):
+    list_display = ['code', 'name', 'is_group_a', 'score_step']
     list_filter = ['is_group_a']
     search_fields = ['code', 'name']
 
 
+@admin.register(Combination)
+class CombinationAdmin(DerivedDataAdmin):
+    list_display = ['code', 'name']
+    search_fields = ['code', 'name']
+    filter_horizontal = ['subjects']
+
+
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
     list_display = ['sbd', 'toan', 'ngu_van', 'ngoai_ngu', 'vat_li', 'hoa_hoc', 'get_group_a_total']
     search_fields = ['sbd']
     list_filter = ['ma_ngoai_ngu', 'created_at']
     readonly_fields = ['created_at', 'updated_at']
+    ordering = ['sbd']
     
     fieldsets = (
         ('Student Information', {
@@ -41,6 +85,19 @@ class StudentAdmin(admin.ModelAdmin):
         }),
     )
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # The student signals drop the stored statistics; recount the summary
+        refresh_dataset_summary(mark_import=False)
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_dataset_summary(mark_import=False)
+    
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        refresh_dataset_summary(mark_import=False)
+    
     def get_group_a_total(self, obj):
         return obj.get_group_a_total()
     get_group_a_total.short_description = 'Group A Total'
@@ -51,3 +108,29 @@ class ScoreStatisticsAdmin(admin.ModelAdmin):
     list_display = ['subject_name', 'level_excellent', 'level_good', 'level_average', 'level_below', 'total_students', 'last_updated']
     readonly_fields = ['last_updated']
     list_filter = ['last_updated']
+
+
+@admin.register(ScoreDistribution)
+class ScoreDistributionAdmin(admin.ModelAdmin):
+    list_display = ['subject_name', 'total_students', 'mean', 'median', 'stddev', 'step', 'last_updated']
+    readonly_fields = ['last_updated']
+
+
+@admin.register(CumulativeDistribution)
+class CumulativeDistributionAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'key', 'total_students', 'last_updated']
+    list_filter = ['kind']
+    readonly_fields = ['last_updated']
+
+
+@admin.register(DatasetSummary)
+class DatasetSummaryAdmin(admin.ModelAdmin):
+    list_display = ['version', 'total_students', 'subjects_count', 'languages_count', 'last_import_at', 'last_updated']
+    readonly_fields = ['version', 'last_updated']
+
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['file_path', 'mode', 'row', 'offset', 'file_size', 'started_at', 'updated_at', 'completed_at']
+    list_filter = ['mode']
+    readonly_fields = [field.name for field in ImportCheckpoint._meta.fields]
@@ -0,0 +1,132 @@
+"""Helpers shared by the ``benchmark`` management command"""
+import contextlib
+import csv
+import random
+import tempfile
+
+from django.db import connection
+from django.test.utils import override_settings
+
+from .models import Student
+from .routers import use_primary
+
+
+LANGUAGE_WEIGHTS = [('N1', 90), ('N2', 1), ('N3', 2), ('N4', 2), ('N5', 1), ('N6', 4)]
+
+
+def generate_csv(path, rows, seed=2024):
+    """Write a synthetic score CSV shaped like diem_thi_thpt_2024.csv"""
+    rng = random.Random(seed)
+    codes = [code for code, weight in LANGUAGE_WEIGHTS for _ in range(weight)]
+
+    def score(taken=0.8, step=0.25):
+        if rng.random() > taken:
+            return ''
+        return f'{min(10, max(0, round(rng.gauss(6.5, 1.6) / step) * step)):g}'
+
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['sbd', *Student.SCORE_FIELDS, 'ma_ngoai_ngu'])
+        for number in range(1, rows + 1):
+            natural = rng.random() < 0.4
+            language = score(0.95, 0.2)
+            writer.writerow([
+                f'{1000000 + number:08d}',
+                score(0.98, 0.2),
+                score(0.98),
+                language,
+                score(0.9 if natural else 0.05),
+                score(0.9 if natural else 0.05),
+                score(0.9 if natural else 0.05),
+                score(0.05 if natural else 0.9),
+                score(0.05 if natural else 0.9),
+                score(0.05 if natural else 0.8),
+                rng.choice(codes) if language else '',
+            ])
+
+
+def lookup_workload(sbds, count, seed=2024):
+    """Registration numbers shaped like results-night lookup traffic.
+
+    80% of requests hit a hot set of 1% of students, 15% are mistyped
+    numbers that get retried and 5% are spread over everyone.
+    """
+    rng = random.Random(seed)
+    hot = rng.sample(sbds, max(1, len(sbds) // 100))
+    typos = [f'{rng.randrange(90000000, 99999999):08d}' for _ in range(len(hot))]
+    workload = []
+    for _ in range(count):
+        draw = rng.random()
+        pool = hot if draw < 0.8 else typos if draw < 0.95 else sbds
+        workload.append(rng.choice(pool))
+    return workload
+
+
+def clear_students():
+    """Empty the student table in one statement, without the per-row delete signals"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {connection.ops.quote_name(Student._meta.db_table)}')
+
+
+def relation_sizes(table):
+    """Return (table bytes, {index name: bytes}) for a table on the default database.
+    
+    Secondary indexes only: the primary key is part of the table size on
+    SQLite and MySQL and left out on PostgreSQL.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_relation_size(%s)', [table])
+            table_size = cursor.fetchone()[0]
+            cursor.execute(
+                'SELECT indexrelid::regclass::text, pg_relation_size(indexrelid) FROM pg_index '
+                'WHERE indrelid = %s::regclass AND NOT indisprimary',
+                [table]
+            )
+            return table_size, dict(cursor.fetchall())
+        if connection.vendor == 'mysql':
+            cursor.execute(f'ANALYZE TABLE {connection.ops.quote_name(table)}')
+            cursor.execute(
+                'SELECT index_name, stat_value * @@innodb_page_size FROM mysql.innodb_index_stats '
+                'WHERE database_name = DATABASE() AND table_name = %s AND stat_name = %s',
+                [table, 'size']
+            )
+            sizes = dict(cursor.fetchall())
+            return sizes.pop('PRIMARY', 0), sizes
+        # SQLite: the dbstat virtual table reports the pages of every b-tree
+        cursor.execute(
+            "SELECT master.name, SUM(dbstat.pgsize) FROM sqlite_master AS master "
+            "JOIN dbstat ON dbstat.name = master.name "
+            "WHERE master.tbl_name = %s GROUP BY master.name",
+            [table]
+        )
+        sizes = dict(cursor.fetchall())
+        return sizes.pop(table, 0), sizes
+
+
+@contextlib.contextmanager
+def throwaway_database():
+    """Point the default connection at a fresh test database for the block.
+
+    Column snapshots go to a temporary directory so they cannot replace the
+    real database's snapshot of the same dataset version, and reads stay on
+    the test database rather than going to configured replicas.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as snapshot_dir, override_settings(SNAPSHOT_DIR=snapshot_dir), use_primary():
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class QueryCounter:
+    """Execute wrapper counting statements sent to the database"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,109 @@
+"""Checkpoints and rejected-row files that make import_scores resumable.
+
+Every batch an import commits updates the import's ImportCheckpoint row in
+the same transaction. The row holds the byte offset and row number where the
+next batch starts, the running counts and the size of the rejected-rows file.
+An interrupted import therefore stops exactly after its last committed
+batch, and ``import_scores --resume`` seeks straight back there. The file's
+size and modification time are recorded too, so a file that changed since is
+not resumed.
+"""
+import csv
+import os
+
+from django.utils import timezone
+
+from .models import ImportCheckpoint
+
+
+COUNTS = {
+    ImportCheckpoint.APPEND: ['imported', 'rejected'],
+    ImportCheckpoint.REPLACE: ['imported', 'rejected'],
+    ImportCheckpoint.UPSERT: ['inserted', 'updated', 'unchanged', 'rejected'],
+}
+
+
+def file_signature(csv_file):
+    """(absolute path, size, modification time) identifying a version of a file"""
+    stat = os.stat(csv_file)
+    return os.path.abspath(csv_file), stat.st_size, stat.st_mtime
+
+
+def start_checkpoint(csv_file, mode, rejected_file):
+    """Checkpoint of a new import, replacing unfinished ones of the same file"""
+    path, size, mtime = file_signature(csv_file)
+    ImportCheckpoint.objects.filter(file_path=path, completed_at__isnull=True).delete()
+    return ImportCheckpoint.objects.create(
+        file_path=path,
+        file_size=size,
+        file_mtime=mtime,
+        mode=mode,
+        counts=dict.fromkeys(COUNTS[mode], 0),
+        rejected_file=os.path.abspath(rejected_file),
+    )
+
+
+def unfinished_checkpoint(csv_file, mode):
+    """Latest unfinished checkpoint of a file in the given mode, or None"""
+    return ImportCheckpoint.objects.filter(
+        file_path=os.path.abspath(csv_file), mode=mode, completed_at__isnull=True
+    ).first()
+
+
+def file_changed(checkpoint):
+    """Whether the file was modified since the checkpointed import started"""
+    return file_signature(checkpoint.file_path)[1:] != (checkpoint.file_size, checkpoint.file_mtime)
+
+
+def advance(checkpoint, chunk, rejected_size):
+    """Record a loaded chunk; call inside the transaction that loaded it"""
+    checkpoint.offset = chunk.offset
+    checkpoint.row = chunk.row
+    checkpoint.counts['rejected'] += len(chunk.rejected)
+    checkpoint.rejected_size = rejected_size
+    checkpoint.save(update_fields=['offset', 'row', 'counts', 'changed_subjects', 'rejected_size', 'updated_at'])
+
+
+def complete(checkpoint):
+    checkpoint.completed_at = timezone.now()
+    checkpoint.save(update_fields=['completed_at', 'updated_at'])
+
+
+class RejectedRows:
+    """CSV of the rows an import skipped: their original columns, row number and reason.
+
+    The file is only created once a row is rejected. A new import removes the
+    previous one's file; a resumed import cuts it back to the size saved with
+    the checkpoint, dropping rows written for a batch that never committed.
+    """
+
+    def __init__(self, checkpoint, header, resume=False):
+        self.path = checkpoint.rejected_file
+        self.header = header
+        self.size = checkpoint.rejected_size if resume and os.path.exists(self.path) else 0
+        self.file = None
+        self.writer = None
+        if os.path.exists(self.path):
+            if self.size:
+                os.truncate(self.path, self.size)
+            else:
+                os.remove(self.path)
+
+    def write(self, rejected):
+        """Append (row number, reason, record) entries and flush them to disk"""
+        if not rejected:
+            return
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8', newline='')
+            self.writer = csv.writer(self.file)
+            if not self.size:
+                self.writer.writerow([*self.header, 'row', 'reason'])
+        width = len(self.header)
+        for row, reason, record in rejected:
+            self.writer.writerow([*record[:width], *[''] * (width - len(record)), row, reason])
+        self.file.flush()
+        self.size = self.file.tell()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
@@ -0,0 +1,60 @@
+"""Dataset-wide summary shared by the pages that show overall counts"""
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import aget_or_compute, bump_dataset_version, get_or_compute, store
+from .models import DatasetSummary, Student, Subject
+
+
+def refresh_dataset_summary(mark_import=True):
+    """Recount the dataset, store the summary row and bump the dataset version.
+
+    This is the only place that scans the student table for these counts;
+    it runs at the end of every import and after admin changes. Bumping the
+    version invalidates every cached entry derived from the old data.
+    """
+    defaults = {
+        'total_students': Student.objects.count(),
+        'subjects_count': Subject.objects.count(),
+        'languages_count': (
+            Student.objects.exclude(ma_ngoai_ngu__isnull=True)
+            .values('ma_ngoai_ngu').distinct().count()
+        ),
+    }
+    if mark_import:
+        defaults['last_import_at'] = timezone.now()
+    DatasetSummary.objects.update_or_create(pk=DatasetSummary.SINGLETON_ID, defaults=defaults)
+    bump_dataset_version()
+    summary = load_dataset_summary()
+    # Cached under the new version once it is visible
+    transaction.on_commit(lambda: store('dataset_summary', summary))
+    return summary
+
+
+def summary_to_dict(summary):
+    return {
+        'total_students': summary.total_students,
+        'subjects_count': summary.subjects_count,
+        'languages_count': summary.languages_count,
+        'last_import_at': summary.last_import_at,
+        'last_updated': summary.last_updated,
+        'version': summary.version,
+    }
+
+
+def load_dataset_summary():
+    """Read the summary row, computing it once if nothing was imported yet"""
+    summary = DatasetSummary.objects.filter(pk=DatasetSummary.SINGLETON_ID).first()
+    if summary is None:
+        return refresh_dataset_summary(mark_import=False)
+    return summary_to_dict(summary)
+
+
+def get_dataset_summary():
+    """Summary for the current dataset version"""
+    return get_or_compute('dataset_summary', load_dataset_summary)
+
+
+async def aget_dataset_summary():
+    """Summary for the current dataset version, for async views"""
+    return await aget_or_compute('dataset_summary', load_dataset_summary)
@@ -0,0 +1,321 @@
+"""Per-subject score histograms, percentiles, moments and percentile ranks.
+
+Scores are stored as hundredths, so the exact distribution of a subject is a
+bincount over 0..1000, and that of a three-subject combination total one over
+0..3000. One chunked scan of the student table fills the bincounts of every
+requested subject and combination at once; histograms, percentiles, mean,
+median, standard deviation and the cumulative tables behind a student's
+percentile rank are then all derived without touching the database again.
+"""
+import math
+from bisect import bisect_right
+
+import numpy as np
+from django.db import connections, router, transaction
+
+from .fields import ScaledScoreField
+from .cache import adataset_version, aget_or_compute, dataset_version, get_or_compute
+from .models import Combination, CumulativeDistribution, ScoreDistribution, Student, Subject
+from .snapshot import get_snapshot
+
+
+PERCENTILES = (10, 25, 50, 75, 90, 95, 99)
+MAX_SCORE = 10
+SCALE = ScaledScoreField.SCALE
+SCAN_CHUNK_SIZE = 50000
+
+
+def scan_score_counts(subjects, combinations=None, chunk_size=SCAN_CHUNK_SIZE, snapshot=None):
+    """Count students per hundredth of a point in one table scan.
+
+    Returns a bincount per subject and, for ``combinations`` given as
+    ``{code: subject codes}``, one per combination total keyed by code.
+    Reads the stored integers with a plain cursor: going through the ORM
+    would convert every value to a float only for it to be scaled back.
+    Given a snapshot, its columns are counted instead.
+    """
+    combinations = combinations or {}
+    columns = list(subjects)
+    for codes in combinations.values():
+        columns += [subject for subject in codes if subject not in columns]
+    positions = {subject: index for index, subject in enumerate(columns)}
+    size = MAX_SCORE * SCALE + 1
+    counts = {subject: np.zeros(size, dtype=np.int64) for subject in subjects}
+    for code, codes in combinations.items():
+        counts[code] = np.zeros(len(codes) * (size - 1) + 1, dtype=np.int64)
+    if not columns:
+        return counts
+
+    def add(key, values):
+        size = len(counts[key])
+        values = np.clip(values[~np.isnan(values)], 0, size - 1).astype(np.intp)
+        counts[key] += np.bincount(values, minlength=size)
+
+    if snapshot is not None:
+        for subject in subjects:
+            add(subject, snapshot.units(subject))
+        for code, codes in combinations.items():
+            add(code, snapshot.total_units(codes))
+        return counts
+
+    # A plain cursor skips the database router, so ask it where to read
+    connection = connections[router.db_for_read(Student)]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {", ".join(quote(column) for column in columns)} '
+            f'FROM {quote(Student._meta.db_table)}'
+        )
+        while chunk := cursor.fetchmany(chunk_size):
+            # None becomes NaN, which marks the students who skipped a subject
+            # and, through the sums, those missing part of a combination
+            scores = np.array(chunk, dtype=np.float64)
+            for subject in subjects:
+                add(subject, scores[:, positions[subject]])
+            for code, codes in combinations.items():
+                add(code, scores[:, [positions[subject] for subject in codes]].sum(axis=1))
+    return counts
+
+
+def summarize(counts, step):
+    """Histogram at the given step plus percentiles and moments of a bincount"""
+    total = int(counts.sum())
+    step_units = round(step * SCALE)
+    histogram = np.bincount(np.arange(len(counts)) // step_units, weights=counts)
+    summary = {
+        'step': step,
+        'histogram': [int(count) for count in histogram],
+        'total': total,
+        'percentiles': {},
+        'mean': None,
+        'median': None,
+        'stddev': None,
+    }
+    if not total:
+        return summary
+
+    values = np.arange(len(counts)) / SCALE
+    mean = float((values * counts).sum() / total)
+    cumulative = np.cumsum(counts)
+
+    def percentile(p):
+        # Nearest rank: the lowest score reached by at least p% of students
+        rank = max(1, math.ceil(p / 100 * total))
+        return float(values[np.searchsorted(cumulative, rank)])
+
+    summary.update({
+        'percentiles': {f'p{p}': percentile(p) for p in PERCENTILES},
+        'mean': round(mean, 4),
+        'median': percentile(50),
+        'stddev': round(float(np.sqrt(((values - mean) ** 2 * counts).sum() / total)), 4),
+    })
+    return summary
+
+
+def cumulative_table(counts):
+    """Distinct scores in hundredths with the number of students at or below each"""
+    present = np.flatnonzero(counts)
+    return {
+        'total': int(counts.sum()),
+        'scores': present.tolist(),
+        'cumulative': np.cumsum(counts)[present].tolist(),
+    }
+
+
+def combination_subjects(subjects=Student.SCORE_FIELDS):
+    """Subject codes of every combination that includes one of the given subjects"""
+    combinations = {}
+    for combination in Combination.objects.prefetch_related('subjects'):
+        codes = combination.get_subject_codes()
+        if set(codes) & set(subjects):
+            combinations[combination.code] = codes
+    return combinations
+
+
+def summarize_subjects(counts, subjects):
+    """Summaries of the given subjects' bincounts at each subject's score step"""
+    steps = dict(Subject.objects.values_list('code', 'score_step'))
+    return {
+        subject: summarize(counts[subject], steps.get(subject) or 0.25)
+        for subject in subjects
+    }
+
+
+def compute_distributions(subjects=Student.SCORE_FIELDS, snapshot=None):
+    """Distribution summaries of the given subjects from a single scan"""
+    return summarize_subjects(scan_score_counts(list(subjects), snapshot=snapshot), subjects)
+
+
+def refresh_distributions(subjects=Student.SCORE_FIELDS, snapshot=None):
+    """Recompute the given subjects' summaries and cumulative tables in one scan.
+
+    The cumulative tables of every combination that includes one of the
+    subjects are rebuilt from the same scan.
+    """
+    combinations = combination_subjects(subjects)
+    counts = scan_score_counts(list(subjects), combinations, snapshot=snapshot)
+    distributions = summarize_subjects(counts, subjects)
+    with transaction.atomic():
+        for subject, summary in distributions.items():
+            ScoreDistribution.objects.update_or_create(
+                subject_name=subject,
+                defaults={
+                    'step': summary['step'],
+                    'histogram': summary['histogram'],
+                    'percentiles': summary['percentiles'],
+                    'total_students': summary['total'],
+                    'mean': summary['mean'],
+                    'median': summary['median'],
+                    'stddev': summary['stddev'],
+                },
+            )
+        for kind, keys in [
+            (CumulativeDistribution.SUBJECT, subjects),
+            (CumulativeDistribution.COMBINATION, combinations),
+        ]:
+            for key in keys:
+                table = cumulative_table(counts[key])
+                CumulativeDistribution.objects.update_or_create(
+                    kind=kind, key=key,
+                    defaults={
+                        'total_students': table['total'],
+                        'scores': table['scores'],
+                        'cumulative': table['cumulative'],
+                    },
+                )
+    return distributions
+
+
+def invalidate_distributions(subjects=None):
+    """Delete stored rows so the next read recomputes them; None means everything"""
+    rows = ScoreDistribution.objects.all()
+    tables = CumulativeDistribution.objects.all()
+    if subjects is not None:
+        rows = rows.filter(subject_name__in=subjects)
+        tables = tables.filter(kind=CumulativeDistribution.SUBJECT, key__in=subjects)
+    rows.delete()
+    tables.delete()
+
+
+def load_distributions():
+    """Read stored distributions in subject order, recomputing any that are missing"""
+    distributions = {}
+    for row in ScoreDistribution.objects.all():
+        distributions[row.subject_name] = {
+            'step': row.step,
+            'histogram': row.histogram,
+            'total': row.total_students,
+            'percentiles': row.percentiles,
+            'mean': row.mean,
+            'median': row.median,
+            'stddev': row.stddev,
+        }
+
+    missing = [subject for subject in Student.SCORE_FIELDS if subject not in distributions]
+    if missing:
+        distributions.update(refresh_distributions(missing, snapshot=get_snapshot()))
+    return {subject: distributions[subject] for subject in Student.SCORE_FIELDS}
+
+
+def subject_distributions():
+    """Stored distributions with display names and the score at each histogram bin"""
+    subject_names = dict(Subject.SUBJECT_CHOICES)
+    result = {}
+    for subject, summary in load_distributions().items():
+        step = summary['step']
+        result[subject] = {
+            'name': subject_names[subject],
+            **summary,
+            'scores': [round(index * step, 2) for index in range(len(summary['histogram']))],
+        }
+    return result
+
+
+def load_percentile_tables():
+    """Cumulative tables for every subject and combination, rebuilding missing ones"""
+    combinations = combination_subjects()
+    expected = {
+        CumulativeDistribution.SUBJECT: Student.SCORE_FIELDS,
+        CumulativeDistribution.COMBINATION: list(combinations),
+    }
+
+    def read():
+        tables = {kind: {} for kind in expected}
+        for row in CumulativeDistribution.objects.all():
+            tables[row.kind][row.key] = {
+                'total': row.total_students,
+                'scores': row.scores,
+                'cumulative': row.cumulative,
+            }
+        return tables
+
+    tables = read()
+    if any(set(keys) - set(tables[kind]) for kind, keys in expected.items()):
+        refresh_distributions(snapshot=get_snapshot())
+        tables = read()
+
+    subjects = tables[CumulativeDistribution.SUBJECT]
+    return {
+        CumulativeDistribution.SUBJECT: {subject: subjects[subject] for subject in Student.SCORE_FIELDS},
+        CumulativeDistribution.COMBINATION: {
+            code: {**tables[CumulativeDistribution.COMBINATION][code], 'subjects': codes}
+            for code, codes in combinations.items()
+        },
+    }
+
+
+# (dataset version, tables) last used by this process, so a lookup does not
+# unpickle every table from the cache again
+_tables = (None, None)
+
+
+def get_percentile_tables():
+    """Percentile tables for the current dataset version"""
+    global _tables
+    version = dataset_version()
+    if _tables[0] != version:
+        _tables = (version, get_or_compute('percentile_tables', load_percentile_tables))
+    return _tables[1]
+
+
+async def aget_percentile_tables():
+    """Percentile tables for the current dataset version, for async views"""
+    global _tables
+    version = await adataset_version()
+    if _tables[0] != version:
+        _tables = (version, await aget_or_compute('percentile_tables', load_percentile_tables))
+    return _tables[1]
+
+
+def percentile_rank(table, score):
+    """Percentage of students scoring at or below score, by binary search"""
+    if not table['total']:
+        return None
+    index = bisect_right(table['scores'], round(score * SCALE))
+    below = table['cumulative'][index - 1] if index else 0
+    return round(100 * below / table['total'], 1)
+
+
+def student_percentiles(scores, tables=None):
+    """Percentile ranks of a {subject: score} dict, per subject and per combination.
+
+    Combinations are only ranked when the student sat all of their subjects.
+    """
+    tables = tables or get_percentile_tables()
+    subjects = {
+        subject: percentile_rank(tables[CumulativeDistribution.SUBJECT][subject], score)
+        for subject, score in scores.items()
+        if score is not None and subject in tables[CumulativeDistribution.SUBJECT]
+    }
+    combinations = []
+    for code, table in tables[CumulativeDistribution.COMBINATION].items():
+        values = [scores.get(subject) for subject in table['subjects']]
+        if None not in values:
+            total = round(sum(values), 2)
+            combinations.append({
+                'code': code,
+                'subjects': table['subjects'],
+                'total': total,
+                'percentile': percentile_rank(table, total),
+            })
+    return {'subjects': subjects, 'combinations': combinations}
@@ -0,0 +1,88 @@
+"""Streaming exports of the student table.
+
+Rows are read with ``values_list(...).iterator(chunk_size)`` so memory use
+stays flat regardless of how many students match. The CSV layout is the same
+as the import file, so an export can be fed back to ``import_scores``.
+"""
+import csv
+
+import pandas as pd
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import Student
+
+
+EXPORT_HEADER = ('sbd', *Student.SCORE_FIELDS, 'ma_ngoai_ngu')
+EXPORT_FIELDS = ('sbd', *Student.SCORE_FIELDS, 'ma_ngoai_ngu__code')
+EXPORT_CHUNK_SIZE = 10000
+
+
+class Echo:
+    """File-like object whose write() returns the line, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(subject=None, min_score=None, max_score=None, language=None):
+    """Export rows in SBD order, filtered by subject, score range and language code"""
+    students = Student.objects.order_by('sbd')
+    if subject:
+        students = students.filter(**{f'{subject}__isnull': False})
+        if min_score is not None:
+            students = students.filter(**{f'{subject}__gte': min_score})
+        if max_score is not None:
+            students = students.filter(**{f'{subject}__lte': max_score})
+    if language:
+        students = students.filter(ma_ngoai_ngu__code=language)
+    return students.values_list(*EXPORT_FIELDS)
+
+
+def iter_chunks(rows, chunk_size):
+    """Read a values_list queryset in lists of at most chunk_size rows"""
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def format_score(score):
+    """Render a score like the source CSV: 6 rather than 6.0, blank when missing"""
+    return '' if score is None else f'{score:g}'
+
+
+def iter_csv(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield CSV text for the rows, one string per chunk"""
+    writer = csv.writer(Echo(), lineterminator='\n')
+    yield writer.writerow(EXPORT_HEADER)
+    for chunk in iter_chunks(rows, chunk_size):
+        yield ''.join(
+            writer.writerow([sbd, *map(format_score, scores), language_code or ''])
+            for sbd, *scores, language_code in chunk
+        )
+
+
+def write_parquet(rows, target, chunk_size=EXPORT_CHUNK_SIZE):
+    """Write the rows to a Parquet file or path, one row group per chunk"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImproperlyConfigured('Parquet export requires pyarrow (pip install pyarrow).')
+
+    schema = pa.schema([
+        ('sbd', pa.string()),
+        *[(subject, pa.float64()) for subject in Student.SCORE_FIELDS],
+        ('ma_ngoai_ngu', pa.string()),
+    ])
+    written = 0
+    with pq.ParquetWriter(target, schema) as writer:
+        for chunk in iter_chunks(rows, chunk_size):
+            frame = pd.DataFrame.from_records(chunk, columns=EXPORT_HEADER)
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            written += len(chunk)
+    return written
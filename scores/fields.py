@@ -0,0 +1,48 @@
+"""Custom model fields for the scores app"""
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+
+
+class ScaledScoreField(models.SmallIntegerField):
+    """Score stored as hundredths in a small integer and read back as a float.
+    
+    Exam scores are multiples of 0.05 or 0.25 between 0 and 10, so
+    ``round(score * 100)`` is exact and takes two bytes instead of eight.
+    Query values are given in score units: ``filter(toan__gte=7.5)`` compares
+    against 750. Arithmetic such as ``F('toan') + F('vat_li')`` resolves to a
+    plain IntegerField, so pass ``output_field=ScaledScoreField()`` to get
+    scores back instead of hundredths.
+    """
+    SCALE = 100
+    
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else value / self.SCALE
+    
+    def to_python(self, value):
+        if value is None or isinstance(value, float):
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages['invalid'],
+                code='invalid',
+                params={'value': value},
+            )
+    
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        return round(float(value) * self.SCALE)
+    
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{'form_class': forms.FloatField, **kwargs})
+
+
+# IntegerField rounds float operands of these lookups up to whole numbers,
+# which would turn gte=7.75 into gte=8 before scaling
+ScaledScoreField.register_lookup(GreaterThanOrEqual)
+ScaledScoreField.register_lookup(LessThan)
@@ -49,4 +49,30 @@ class SubjectFilterForm(forms.Form):
         widget=forms.Select(attrs={
             'class': 'form-select'
         })
-    )
\ No newline at end of file
+    )
+
+
+class ExportFilterForm(forms.Form):
+    """Filters for the student export endpoint and the export_scores command"""
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('parquet', 'Parquet'),
+    ]
+    
+    subject = forms.ChoiceField(choices=SubjectFilterForm.SUBJECT_CHOICES, required=False)
+    min_score = forms.FloatField(required=False, min_value=0, max_value=10)
+    max_score = forms.FloatField(required=False, min_value=0, max_value=10)
+    language = forms.CharField(required=False, max_length=5)
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        min_score = cleaned_data.get('min_score')
+        max_score = cleaned_data.get('max_score')
+        
+        if (min_score is not None or max_score is not None) and not cleaned_data.get('subject'):
+            raise ValidationError("A score range needs a subject to apply to.")
+        if min_score is not None and max_score is not None and min_score > max_score:
+            raise ValidationError("Minimum score cannot be greater than maximum score.")
+        
+        return cleaned_data
@@ -0,0 +1,76 @@
+"""Conditional GET for pages and APIs that only change when the dataset does.
+
+The ETag is the dataset version and Last-Modified the time the summary row
+last changed (an import or an admin edit), both read from the cached dataset
+summary. A matching If-None-Match or If-Modified-Since gets a 304 before the
+view runs, and every response carries Cache-Control so browsers and CDNs
+can reuse it for HTTP_CACHE_MAX_AGE seconds and serve it stale while they
+revalidate.
+
+This does what Django's ``condition`` decorator does, but also wraps async
+views, which ``condition`` does not support before Django 5.0.
+"""
+import asyncio
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .dataset import aget_dataset_summary, get_dataset_summary
+
+
+def dataset_validators(summary):
+    """Quoted ETag and Last-Modified timestamp of a dataset summary"""
+    last_modified = summary.get('last_updated') or summary['last_import_at']
+    return (
+        quote_etag(f'v{summary["version"]}'),
+        int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def add_validators(request, response, etag, last_modified, public):
+    if request.method not in ('GET', 'HEAD'):
+        return response
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers.setdefault('ETag', etag)
+    if response.status_code in (200, 304):
+        patch_cache_control(
+            response,
+            **{'public' if public else 'private': True},
+            max_age=settings.HTTP_CACHE_MAX_AGE,
+            stale_while_revalidate=settings.HTTP_CACHE_STALE_WHILE_REVALIDATE,
+        )
+    return response
+
+
+def dataset_conditional(view=None, public=True):
+    """Decorate a sync or async view with dataset validators and Cache-Control.
+
+    Pass ``public=False`` for pages holding a CSRF token: those may only be
+    kept by the visitor's own browser, not by a shared cache.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                etag, last_modified = dataset_validators(await aget_dataset_summary())
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return add_validators(request, response, etag, last_modified, public)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag, last_modified = dataset_validators(get_dataset_summary())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return add_validators(request, response, etag, last_modified, public)
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
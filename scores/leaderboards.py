@@ -0,0 +1,91 @@
+"""Top-K leaderboards for every combination block, built in one streaming pass"""
+import heapq
+
+import numpy as np
+
+from .cache import get_or_compute, store
+from .models import Combination, Student
+from .snapshot import get_snapshot
+
+
+LEADERBOARD_SIZE = 10
+
+
+def snapshot_leaderboards(snapshot, combinations, size=LEADERBOARD_SIZE):
+    """The same leaderboards as build_leaderboards, vectorized over a column snapshot"""
+    leaderboards = {}
+    for code, subjects in combinations.items():
+        totals = snapshot.total_units(subjects)
+        candidates = np.flatnonzero(~np.isnan(totals))
+        if len(candidates) > size:
+            # Keep everything tied with the size-th best total for the tie-break
+            kth = len(candidates) - size
+            cutoff = np.partition(totals[candidates], kth)[kth]
+            candidates = candidates[totals[candidates] >= cutoff]
+        ranked = candidates[np.lexsort((snapshot.sbd[candidates], -totals[candidates]))][:size]
+
+        leaderboards[code] = []
+        for index in ranked:
+            values = [round(float(snapshot.scores[subject][index]), 2) for subject in subjects]
+            leaderboards[code].append({
+                'sbd': snapshot.format_sbd(index),
+                'total': sum(values),
+                'scores': dict(zip(subjects, values)),
+            })
+    return leaderboards
+
+
+def build_leaderboards(size=LEADERBOARD_SIZE, snapshot=None):
+    """Scan the student table once, keeping a bounded min-heap per combination.
+
+    Returns ``{code: [{'sbd', 'total', 'scores'}, ...]}`` sorted by total
+    descending, ties broken by registration number. Given a snapshot, the
+    ranking is computed from its columns instead.
+    """
+    combinations = {
+        combination.code: combination.get_subject_codes()
+        for combination in Combination.objects.prefetch_related('subjects')
+    }
+    if snapshot is not None:
+        return snapshot_leaderboards(snapshot, combinations, size)
+
+    positions = {subject: index for index, subject in enumerate(Student.SCORE_FIELDS, start=1)}
+    blocks = [
+        ([], [positions[subject] for subject in subjects])
+        for subjects in combinations.values()
+    ]
+
+    rows = Student.objects.order_by().values_list('sbd', *Student.SCORE_FIELDS)
+    for row in rows.iterator(chunk_size=5000):
+        for heap, indexes in blocks:
+            values = [row[index] for index in indexes]
+            if None in values:
+                continue
+            total = sum(values)
+            if len(heap) == size and total < heap[0][0]:
+                continue
+            # The heap root is the weakest entry: lowest total, then highest SBD
+            sbd = row[0]
+            entry = (total, -int(sbd) if sbd.isdigit() else 0, sbd, values)
+            if len(heap) < size:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    leaderboards = {}
+    for (code, subjects), (heap, _) in zip(combinations.items(), blocks):
+        leaderboards[code] = [
+            {'sbd': sbd, 'total': total, 'scores': dict(zip(subjects, values))}
+            for total, _, sbd, values in sorted(heap, reverse=True)
+        ]
+    return leaderboards
+
+
+def refresh_leaderboards(snapshot=None):
+    """Rebuild the leaderboards and cache them for the current dataset version"""
+    return store('leaderboards', build_leaderboards(snapshot=snapshot))
+
+
+def get_leaderboards():
+    """Cached leaderboards, rebuilt once per dataset version"""
+    return get_or_compute('leaderboards', lambda: build_leaderboards(snapshot=get_snapshot()))
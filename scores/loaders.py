@@ -0,0 +1,144 @@
+"""Database-native bulk loaders for student tuples.
+
+Each loader takes rows shaped like ``(sbd, *Student.SCORE_FIELDS, language_code)``
+and writes them with the fastest mechanism the backend offers:
+``LOAD DATA LOCAL INFILE`` on MySQL, ``COPY FROM STDIN`` on PostgreSQL and
+``executemany`` everywhere else. Each loaded chunk is committed on its own (or
+with the caller's transaction), so an interrupted import keeps what it loaded
+and can resume from its last checkpoint.
+"""
+import csv
+import io
+import os
+import tempfile
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .fields import ScaledScoreField
+from .models import Student
+from .parsers import score_hash
+
+
+class BulkLoader:
+    """SQLite loader: executemany, one transaction per chunk"""
+
+    def __init__(self, language_ids, using='default', table=None):
+        self.language_ids = language_ids
+        self.using = using
+        self.connection = connections[using]
+        self.table = table or Student._meta.db_table
+        self.columns = [
+            'sbd', *Student.SCORE_FIELDS, *Student.GROUP_TOTAL_FIELDS,
+            'ma_ngoai_ngu_id', 'score_hash', 'created_at', 'updated_at',
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+    def prepare(self, rows):
+        """Scale scores to hundredths and add group totals, language id, hash and timestamps"""
+        now = self.connection.ops.adapt_datetimefield_value(timezone.now())
+        language_ids = self.language_ids
+        scale = ScaledScoreField.SCALE
+        positions = {subject: index for index, subject in enumerate(Student.SCORE_FIELDS)}
+        groups = [
+            [positions[subject] for subject in subjects]
+            for subjects in Student.GROUP_TOTAL_FIELDS.values()
+        ]
+        for row in rows:
+            scores = row[1:-1]
+            scaled = [None if score is None else round(score * scale) for score in scores]
+            totals = []
+            for indexes in groups:
+                values = [scaled[index] for index in indexes]
+                totals.append(sum(values) if None not in values else None)
+            yield (
+                row[0], *scaled, *totals, language_ids.get(row[-1]),
+                score_hash(scores, row[-1]), now, now,
+            )
+
+    def quoted_columns(self):
+        quote = self.connection.ops.quote_name
+        return ', '.join(quote(column) for column in self.columns)
+
+    def load(self, rows):
+        """Insert rows, skipping registration numbers that already exist"""
+        with transaction.atomic(using=self.using):
+            self.load_chunk(rows)
+
+    def load_chunk(self, rows):
+        placeholders = ', '.join(['%s'] * len(self.columns))
+        sql = self.insert_ignore_sql(placeholders)
+        with self.connection.cursor() as cursor:
+            cursor.executemany(sql, list(self.prepare(rows)))
+
+    def insert_ignore_sql(self, placeholders):
+        return (
+            f'INSERT OR IGNORE INTO {self.connection.ops.quote_name(self.table)} '
+            f'({self.quoted_columns()}) VALUES ({placeholders})'
+        )
+
+
+class PostgreSQLLoader(BulkLoader):
+    """Loader streaming rows through COPY FROM STDIN"""
+
+    def load_chunk(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in self.prepare(rows):
+            writer.writerow(['' if value is None else value for value in row])
+        buffer.seek(0)
+
+        quote = self.connection.ops.quote_name
+        columns = self.quoted_columns()
+        with self.connection.cursor() as cursor:
+            # COPY cannot skip duplicates, so stage the chunk in a temp table
+            cursor.execute(
+                f'CREATE TEMP TABLE import_staging ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {quote(self.table)} WITH NO DATA'
+            )
+            cursor.copy_expert(
+                f'COPY import_staging ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {quote(self.table)} ({columns}) '
+                f'SELECT {columns} FROM import_staging ON CONFLICT (sbd) DO NOTHING'
+            )
+            cursor.execute('DROP TABLE import_staging')
+
+
+class MySQLLoader(BulkLoader):
+    """Loader using LOAD DATA LOCAL INFILE (requires local_infile on both ends)"""
+
+    def load_chunk(self, rows):
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8') as file:
+            for row in self.prepare(rows):
+                file.write('\t'.join('\\N' if value is None else str(value) for value in row))
+                file.write('\n')
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {self.connection.ops.quote_name(self.table)} "
+                    f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                    f"({self.quoted_columns()})",
+                    [file.name],
+                )
+        finally:
+            os.unlink(file.name)
+
+
+LOADERS = {
+    'postgresql': PostgreSQLLoader,
+    'mysql': MySQLLoader,
+}
+
+
+def get_loader(language_ids, using='default', table=None):
+    """Return the bulk loader best suited to the connection's backend"""
+    loader_class = LOADERS.get(connections[using].vendor, BulkLoader)
+    return loader_class(language_ids, using=using, table=table)
@@ -0,0 +1,185 @@
+"""Score lookups by registration number returning plain tuples, not models.
+
+:func:`lookup_student` sits in front of the database with two cache tiers:
+a bounded per-process LRU and, when ``LOOKUP_CACHE_SHARED`` is on, the
+Django cache shared by every worker. Both hold the compact value tuple from
+``values_list`` and are keyed on the dataset version, so an import
+invalidates them without any explicit purge. Unknown numbers are cached too,
+for ``LOOKUP_CACHE_NEGATIVE_TIMEOUT`` seconds, to absorb floods of typos.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import MISSING, adataset_version, cache_aget, cache_aset, cache_key, dataset_version, stats
+from .distributions import student_percentiles
+from .forms import ScoreLookupForm
+from .models import ForeignLanguage, Student, Subject
+from .statistics import LEVEL_BADGES, score_level
+
+
+# Only the columns a lookup response needs, in tuple order
+LOOKUP_FIELDS = ('sbd', *Student.SCORE_FIELDS, 'ma_ngoai_ngu__code', 'ma_ngoai_ngu__name')
+
+# Cached in place of a row for registration numbers with no student
+NOT_FOUND = ()
+
+
+def validate_sbd(sbd):
+    """Run ScoreLookupForm's SBD validation, returning (cleaned_sbd, errors)"""
+    form = ScoreLookupForm({'sbd': sbd})
+    if form.is_valid():
+        return form.cleaned_data['sbd'], []
+    return None, form.errors['sbd']
+
+
+def fetch_student(sbd):
+    """Score tuple for one registration number, or None"""
+    return Student.objects.filter(sbd=sbd).values_list(*LOOKUP_FIELDS).first()
+
+
+async def afetch_student(sbd):
+    """Async fetch_student through the async ORM"""
+    return await Student.objects.filter(sbd=sbd).values_list(*LOOKUP_FIELDS).afirst()
+
+
+def iter_students(sbds, chunk_size=2000):
+    """Stream score tuples for many registration numbers with one sbd__in query"""
+    rows = Student.objects.filter(sbd__in=sbds).order_by().values_list(*LOOKUP_FIELDS)
+    return rows.iterator(chunk_size=chunk_size)
+
+
+def to_payload(row, percentile_tables=None):
+    """JSON-ready dict for a score tuple, with the student's percentile ranks"""
+    sbd, *scores, language_code, language_name = row
+    scores = dict(zip(Student.SCORE_FIELDS, scores))
+    return {
+        'sbd': sbd,
+        'scores': scores,
+        'foreign_language': language_code,
+        'percentiles': student_percentiles(scores, percentile_tables),
+    }
+
+
+def to_student(row):
+    """Unsaved Student built from a score tuple, for the lookup template"""
+    sbd, *scores, language_code, language_name = row
+    language = ForeignLanguage(code=language_code, name=language_name) if language_code else None
+    return Student(sbd=sbd, ma_ngoai_ngu=language, **dict(zip(Student.SCORE_FIELDS, scores)))
+
+
+def score_rows(scores, percentiles):
+    """Display rows for the subjects a student sat: name, icon, score, level badge, percentile"""
+    subject_names = dict(Subject.SUBJECT_CHOICES)
+    rows = []
+    for subject, score in scores.items():
+        if score is None:
+            continue
+        label, badge = LEVEL_BADGES[score_level(score)]
+        rows.append({
+            'name': subject_names[subject],
+            'icon': Subject.SUBJECT_ICONS[subject],
+            'score': score,
+            'level': label,
+            'badge': badge,
+            'percentile': percentiles['subjects'].get(subject),
+        })
+    return rows
+
+
+class LookupCache:
+    """Thread-safe LRU of score tuples for the current dataset version"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sbd, version):
+        """Cached row, NOT_FOUND, or MISSING when absent, stale or expired"""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+                return MISSING
+            entry = self._entries.get(sbd)
+            if entry is None:
+                return MISSING
+            row, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[sbd]
+                return MISSING
+            self._entries.move_to_end(sbd)
+            return row
+
+    def set(self, sbd, row, version, timeout=None):
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            expires = time.monotonic() + timeout if timeout is not None else None
+            self._entries[sbd] = (row, expires)
+            self._entries.move_to_end(sbd)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LookupCache(settings.LOOKUP_CACHE_SIZE)
+
+
+def lookup_student(sbd):
+    """Score tuple for a validated registration number, or None, through the caches"""
+    version = dataset_version()
+    row = local_cache.get(sbd, version)
+    if row is not MISSING:
+        stats.record('student', True)
+        return row or None
+
+    key = cache_key(f'student:{sbd}')
+    if settings.LOOKUP_CACHE_SHARED:
+        row = cache.get(key, MISSING, version=version)
+    stats.record('student', row is not MISSING)
+    if row is MISSING:
+        row = fetch_student(sbd) or NOT_FOUND
+        if settings.LOOKUP_CACHE_SHARED:
+            cache.set(key, row, timeout_for(row), version=version)
+
+    local_cache.set(sbd, row, version, timeout_for(row))
+    return row or None
+
+
+async def alookup_student(sbd):
+    """Async lookup_student: a local LRU hit never leaves the event loop"""
+    version = await adataset_version()
+    row = local_cache.get(sbd, version)
+    if row is not MISSING:
+        stats.record('student', True)
+        return row or None
+
+    key = cache_key(f'student:{sbd}')
+    if settings.LOOKUP_CACHE_SHARED:
+        row = await cache_aget(key, MISSING, version=version)
+    stats.record('student', row is not MISSING)
+    if row is MISSING:
+        row = await afetch_student(sbd) or NOT_FOUND
+        if settings.LOOKUP_CACHE_SHARED:
+            await cache_aset(key, row, timeout_for(row), version=version)
+
+    local_cache.set(sbd, row, version, timeout_for(row))
+    return row or None
+
+
+def timeout_for(row):
+    """Negative results expire quickly in case the student is added later"""
+    return settings.LOOKUP_CACHE_TIMEOUT if row else settings.LOOKUP_CACHE_NEGATIVE_TIMEOUT
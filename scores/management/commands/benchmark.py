@@ -0,0 +1,290 @@
+import io
+import os
+import tempfile
+import time
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from scores.benchmarks import QueryCounter, clear_students, generate_csv, lookup_workload, relation_sizes, throwaway_database
+from scores.cache import dataset_version, stats as cache_stats
+from scores.distributions import compute_distributions
+from scores.leaderboards import build_leaderboards
+from scores.loaders import get_loader
+from scores.lookup import fetch_student, local_cache, lookup_student
+from scores.models import ForeignLanguage, Student
+from scores.parsers import iter_parsed_chunks
+from scores.snapshot import get_snapshot
+from scores.statistics import compute_level_counts, level_filters
+
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks against a throwaway test database'
+
+    targets = ['import', 'statistics', 'lookup', 'storage', 'insert', 'render']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'target',
+            choices=self.targets,
+            help='What to benchmark'
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000000,
+            help='Number of synthetic students to generate (default: 1000000)'
+        )
+        parser.add_argument(
+            '--file',
+            type=str,
+            help='Use an existing score CSV instead of generating one'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Repetitions for latency measurements (default: 5)'
+        )
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=50000,
+            help='Requests in the lookup load test (default: 50000)'
+        )
+
+    def handle(self, *args, **options):
+        csv_file = options['file']
+        if csv_file and not os.path.exists(csv_file):
+            raise CommandError(f'File "{csv_file}" does not exist.')
+
+        with tempfile.TemporaryDirectory() as workdir:
+            if not csv_file:
+                csv_file = os.path.join(workdir, 'scores.csv')
+                self.stdout.write(f'Generating {options["rows"]} synthetic rows...')
+                generate_csv(csv_file, options['rows'])
+
+            with throwaway_database():
+                getattr(self, f'bench_{options["target"]}')(csv_file, options)
+
+    def report(self, title, header, rows):
+        """Print a small fixed-width result table"""
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+        for row in [header, *rows]:
+            self.stdout.write('  '.join(str(value).rjust(width) for value, width in zip(row, widths)))
+
+    def seed(self, csv_file):
+        """Load the benchmark file with the fast engine"""
+        self.stdout.write('Seeding database...')
+        call_command('import_scores', file=csv_file, engine='fast', stdout=io.StringIO())
+
+    def bulk_load(self, csv_file):
+        """Load the benchmark file with the native loader alone, as the fast engine does"""
+        language_ids = dict(ForeignLanguage.objects.values_list('code', 'pk'))
+        chunks = iter_parsed_chunks(csv_file, Student.SCORE_FIELDS, 20000, os.cpu_count() or 1)
+        with get_loader(language_ids) as loader:
+            for chunk in chunks:
+                for code in {row[-1] for row in chunk.rows} - {None, *language_ids}:
+                    language, _ = ForeignLanguage.objects.get_or_create(code=code, defaults={'name': code})
+                    language_ids[code] = language.pk
+                loader.load(chunk.rows)
+
+    def measure(self, func, repeat):
+        """Run func repeat times, returning (queries per call, best ms, mean ms)"""
+        timings = []
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - started) * 1000)
+        return queries.count // repeat, f'{min(timings):.1f}', f'{sum(timings) / repeat:.1f}'
+
+    def bench_import(self, csv_file, options):
+        """Compare the ORM import path with the native loader engines"""
+        results = []
+        for engine in ['orm', 'fast', 'pandas']:
+            clear_students()
+            queries = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(queries):
+                call_command('import_scores', file=csv_file, engine=engine, stdout=io.StringIO())
+            elapsed = time.perf_counter() - started
+            count = Student.objects.count()
+            results.append((
+                engine, count, f'{elapsed:.2f}', f'{count / elapsed:,.0f}',
+                # An empty or fully rejected file imports no rows
+                queries.count, f'{queries.count / count:.4f}' if count else '-',
+            ))
+
+        self.report(
+            'Import',
+            ('engine', 'rows', 'seconds', 'rows/sec', 'queries', 'queries/row'),
+            results
+        )
+
+    def bench_statistics(self, csv_file, options):
+        """Compare per-subject aggregate queries, the single-scan engine and the column snapshot"""
+        self.seed(csv_file)
+        snapshot = get_snapshot()
+
+        def per_subject():
+            for subject in Student.SCORE_FIELDS:
+                filters = level_filters(subject)
+                Student.objects.filter(**{f'{subject}__isnull': False}).aggregate(
+                    total=Count('id'),
+                    **{level: Count('id', filter=condition) for level, condition in filters.items()}
+                )
+
+        results = [
+            ('per-subject', *self.measure(per_subject, options['repeat'])),
+            ('single-scan', *self.measure(compute_level_counts, options['repeat'])),
+            ('histograms', *self.measure(compute_distributions, options['repeat'])),
+            ('top-n', *self.measure(build_leaderboards, options['repeat'])),
+        ]
+        if snapshot is not None:
+            results += [
+                ('snapshot single-scan', *self.measure(lambda: compute_level_counts(snapshot=snapshot), options['repeat'])),
+                ('snapshot histograms', *self.measure(lambda: compute_distributions(snapshot=snapshot), options['repeat'])),
+                ('snapshot top-n', *self.measure(lambda: build_leaderboards(snapshot=snapshot), options['repeat'])),
+            ]
+        self.report(
+            f'Statistics ({Student.objects.count()} students)',
+            ('strategy', 'queries', 'best ms', 'mean ms'),
+            results
+        )
+
+    def bench_lookup(self, csv_file, options):
+        """Replay a results-night lookup mix with and without the lookup cache"""
+        self.seed(csv_file)
+        sbds = list(Student.objects.values_list('sbd', flat=True))
+        workload = lookup_workload(sbds, options['lookups'])
+        
+        def replay(lookup):
+            timings = []
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                for sbd in workload:
+                    started = time.perf_counter()
+                    lookup(sbd)
+                    timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            percentile = lambda p: f'{timings[min(len(timings) - 1, int(len(timings) * p))]:.3f}'
+            return queries.count, percentile(0.5), percentile(0.99), f'{sum(timings):.0f}'
+        
+        local_cache.clear()
+        before = cache_stats.snapshot()['entries'].get('student', {'hits': 0, 'misses': 0})
+        cached = replay(lookup_student)
+        after = cache_stats.snapshot()['entries']['student']
+        hits = after['hits'] - before['hits']
+        lookups = hits + after['misses'] - before['misses']
+        
+        self.report(
+            f'Lookup ({len(workload)} requests, {len(set(workload))} distinct numbers)',
+            ('strategy', 'hit rate', 'queries', 'p50 ms', 'p99 ms', 'total ms'),
+            [
+                ('uncached', '-', *replay(fetch_student)),
+                ('cached', f'{hits / lookups:.1%}', *cached),
+            ]
+        )
+
+    def bench_storage(self, csv_file, options):
+        """Compare table and index size with float and scaled-integer score columns"""
+        self.seed(csv_file)
+        table = Student._meta.db_table
+        # The (toan, vat_li, hoa_hoc) index, which existed until 0008
+        group_a_index = 'scores_stud_toan_6e4ba5_idx'
+        
+        def measure(label):
+            table_size, index_sizes = relation_sizes(table)
+            mb = lambda size: f'{size / 1024 / 1024:.1f}'
+            return (
+                label, mb(table_size), mb(sum(index_sizes.values())),
+                mb(index_sizes.get(group_a_index, 0)), mb(table_size + sum(index_sizes.values())),
+            )
+        
+        call_command('migrate', 'scores', '0007', verbosity=0)
+        after = measure('smallint x100')
+        # Unapplying 0007 rewrites the columns back to floats
+        call_command('migrate', 'scores', '0006', verbosity=0)
+        before = measure('float')
+        call_command('migrate', 'scores', verbosity=0)
+        
+        self.report(
+            f'Storage ({Student.objects.count()} students)',
+            ('scores', 'table MB', 'indexes MB', f'{group_a_index} MB', 'total MB'),
+            [before, after]
+        )
+
+    def bench_insert(self, csv_file, options):
+        """Compare bulk import and admin list speed before and after the 0008 index audit.
+        
+        The rows go straight to the bulk loader: import_scores needs tables
+        from migrations after the ones compared here.
+        """
+        table = Student._meta.db_table
+        results = []
+        for label, migration, ordering in [
+            ('0007 (6 extra indexes)', '0007', ('-created_at', '-pk')),
+            ('0008 (audited)', '0008', ('sbd',)),
+        ]:
+            call_command('migrate', 'scores', migration, verbosity=0)
+            clear_students()
+            started = time.perf_counter()
+            self.bulk_load(csv_file)
+            elapsed = time.perf_counter() - started
+            count = Student.objects.count()
+            
+            # The admin changelist's first page under that migration's ordering
+            first_page = lambda: list(Student.objects.order_by(*ordering)[:100])
+            _, best, _ = self.measure(first_page, options['repeat'])
+            results.append((
+                label, len(relation_sizes(table)[1]), count, f'{elapsed:.2f}',
+                f'{count / elapsed:,.0f}', best,
+            ))
+        call_command('migrate', 'scores', verbosity=0)
+        
+        self.report(
+            'Insert',
+            ('schema', 'indexes', 'rows', 'seconds', 'rows/sec', 'list page ms'),
+            results
+        )
+    
+    def bench_render(self, csv_file, options):
+        """Time every page end to end, with cached page fragments kept and rebuilt"""
+        self.seed(csv_file)
+        client = Client()
+        sbd = Student.objects.order_by('sbd').values_list('sbd', flat=True).first()
+        pages = [
+            ('home', None, lambda: client.get(reverse('scores:home'))),
+            ('lookup', None, lambda: client.post(reverse('scores:lookup'), {'sbd': sbd})),
+            ('statistics', 'statistics_table', lambda: client.get(reverse('scores:statistics'))),
+            ('top-group-a', 'top_group_a', lambda: client.get(reverse('scores:top_group_a'))),
+            ('leaderboard', None, lambda: client.get(reverse('scores:leaderboard', args=['A00']))),
+            ('about', None, lambda: client.get(reverse('scores:about'))),
+        ]
+        
+        results = []
+        for label, fragment, request in pages:
+            # First request fills the derived-data caches and the fragment
+            request()
+            results.append((label, 'cached' if fragment else '-', *self.measure(request, options['repeat'])))
+            if fragment:
+                key = make_template_fragment_key(fragment, [dataset_version()])
+                
+                def rebuild():
+                    cache.delete(key)
+                    request()
+                
+                results.append((label, 'rebuilt', *self.measure(rebuild, options['repeat'])))
+        
+        self.report(
+            f'Render ({Student.objects.count()} students)',
+            ('page', 'fragment', 'queries', 'best ms', 'mean ms'),
+            results
+        )
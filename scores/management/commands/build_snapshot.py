@@ -0,0 +1,23 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from scores.routers import use_primary
+from scores.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write the column snapshot for the current dataset version (import_scores does this automatically)'
+    
+    @use_primary()
+    def handle(self, *args, **options):
+        if not settings.SNAPSHOT_ENABLED:
+            raise CommandError('SNAPSHOT_ENABLED is off.')
+        
+        started = time.time()
+        snapshot = build_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Wrote snapshot of {len(snapshot)} students to {snapshot.path} '
+                f'in {time.time() - started:.2f} seconds.'
+            )
+        )
@@ -0,0 +1,90 @@
+import sys
+import time
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from scores.exports import EXPORT_CHUNK_SIZE, export_queryset, iter_csv, write_parquet
+from scores.forms import ExportFilterForm
+from scores.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Export student scores as CSV (same layout as the import file) or Parquet'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='File to write (default: CSV to standard output)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'parquet'],
+            default='csv',
+            help='Output format; parquet needs pyarrow (default: csv)'
+        )
+        parser.add_argument(
+            '--subject',
+            choices=Student.SCORE_FIELDS,
+            help='Only students with a score in this subject'
+        )
+        parser.add_argument(
+            '--min-score',
+            type=float,
+            help='Lowest --subject score to include'
+        )
+        parser.add_argument(
+            '--max-score',
+            type=float,
+            help='Highest --subject score to include'
+        )
+        parser.add_argument(
+            '--language',
+            type=str,
+            help='Only students with this foreign language code (e.g. N1)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help=f'Rows fetched per database round trip (default: {EXPORT_CHUNK_SIZE})'
+        )
+    
+    def handle(self, *args, **options):
+        # Validate with the same form as the export endpoint
+        form = ExportFilterForm({
+            key: value for key in ['subject', 'min_score', 'max_score', 'language', 'format']
+            if (value := options[key]) is not None
+        })
+        if not form.is_valid():
+            errors = [message for messages in form.errors.values() for message in messages]
+            raise CommandError(' '.join(errors))
+        
+        filters = dict(form.cleaned_data)
+        export_format = filters.pop('format')
+        rows = export_queryset(**filters)
+        output = options['output']
+        started = time.time()
+        
+        if export_format == 'parquet':
+            if not output:
+                raise CommandError('Parquet export needs --output.')
+            try:
+                count = write_parquet(rows, output, options['chunk_size'])
+            except ImproperlyConfigured as error:
+                raise CommandError(str(error))
+        else:
+            file = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+            try:
+                count = -1  # header line
+                for text in iter_csv(rows, options['chunk_size']):
+                    file.write(text)
+                    count += text.count('\n')
+            finally:
+                if output:
+                    file.close()
+        
+        if output:
+            elapsed = time.time() - started
+            self.stdout.write(
+                self.style.SUCCESS(f'Exported {count} students to {output} in {elapsed:.2f} seconds.')
+            )
@@ -1,9 +1,26 @@
 import csv
 import os
+import time
+from datetime import timedelta
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connection, transaction
 from django.conf import settings
-from scores.models import Student, ForeignLanguage, Subject
+from django.core.validators import MaxValueValidator, MinValueValidator
+from scores.dataset import refresh_dataset_summary
+from scores.distributions import refresh_distributions
+from scores.leaderboards import refresh_leaderboards
+from scores.checkpoints import (
+    RejectedRows, advance, complete, file_changed, start_checkpoint, unfinished_checkpoint,
+)
+from scores.loaders import get_loader
+from scores.models import ImportCheckpoint, Student, ForeignLanguage, Subject
+from scores.parsers import (
+    ParsedChunk, iter_dataframe_chunks, iter_parsed_chunks, read_header, read_lines, score_hash, valid_sbd,
+)
+from scores.routers import use_primary
+from scores.snapshot import discard_snapshot, publish_snapshot, write_snapshot
+from scores.statistics import refresh_statistics
+from scores.swap import get_table_swap
 
 
 class Command(BaseCommand):
@@ -19,44 +36,134 @@ class Command(BaseCommand):
         parser.add_argument(
             '--batch-size',
             type=int,
-            default=1000,
-            help='Number of records to process in each batch (default: 1000)'
+            default=None,
+            help='Number of records to process in each batch (default: 1000, or 20000 for the fast engine)'
         )
         parser.add_argument(
             '--clear',
             action='store_true',
-            help='Clear existing data before import'
+            help='Replace existing data: load into a shadow table and swap it in once complete'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Only write new or changed students, detected by comparing score hashes'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=['orm', 'fast', 'pandas'],
+            default='orm',
+            help='Import engine: "orm" uses bulk_create, "fast" parses in a process pool '
+                 'and loads with the database\'s native bulk path, "pandas" reads typed '
+                 'chunks, validates them vectorized and feeds the same native path (default: orm)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Parser processes for the fast engine (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted import of the same file from its last committed batch'
+        )
+        parser.add_argument(
+            '--rejected-file',
+            type=str,
+            default=None,
+            help='CSV listing the rows that were not imported and why (default: <file>.rejected.csv)'
         )
     
+    # Everything the import reads has to include what it just wrote
+    @use_primary()
     def handle(self, *args, **options):
         csv_file = options['file']
-        batch_size = options['batch_size']
         clear_data = options['clear']
+        upsert = options['upsert']
+        engine = options['engine']
+        resume = options['resume']
+        batch_size = options['batch_size'] or {'fast': 20000, 'pandas': 50000}.get(engine, 1000)
+        
+        if clear_data and upsert:
+            raise CommandError('--clear and --upsert cannot be combined.')
         
         # Check if file exists
         if not os.path.exists(csv_file):
             raise CommandError(f'File "{csv_file}" does not exist.')
         
-        self.stdout.write(f'Starting import from {csv_file}...')
+        mode = (
+            ImportCheckpoint.REPLACE if clear_data
+            else ImportCheckpoint.UPSERT if upsert
+            else ImportCheckpoint.APPEND
+        )
+        # Replacing the data: the site keeps reading the current table until
+        # the new one is complete and swapped in
+        swap = get_table_swap() if clear_data else None
         
-        # Clear existing data if requested
-        if clear_data:
-            self.stdout.write('Clearing existing data...')
-            Student.objects.all().delete()
-            ForeignLanguage.objects.all().delete()
-            self.stdout.write(self.style.SUCCESS('Existing data cleared.'))
+        if resume:
+            checkpoint = unfinished_checkpoint(csv_file, mode)
+            if checkpoint is None:
+                raise CommandError(f'No unfinished {mode} import of "{csv_file}" to resume.')
+            if file_changed(checkpoint):
+                raise CommandError(
+                    f'"{csv_file}" changed since the interrupted import started; import it again without --resume.'
+                )
+            if swap is not None and not swap.shadow_exists():
+                raise CommandError(f'{swap.shadow} no longer exists; import the file again without --resume.')
+            self.stdout.write(f'Resuming import from {csv_file} at row {checkpoint.row + 1}...')
+        else:
+            checkpoint = start_checkpoint(csv_file, mode, options['rejected_file'] or f'{csv_file}.rejected.csv')
+            self.stdout.write(f'Starting import from {csv_file}...')
+        self.checkpoint = checkpoint
+        self.rejected = RejectedRows(checkpoint, read_header(csv_file), resume)
         
         # Create foreign languages and subjects
         self.create_initial_data()
+        self.load_language_ids()
         
-        # Import students
-        imported_count = self.import_students(csv_file, batch_size)
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Successfully imported {imported_count} student records.'
+        try:
+            if upsert:
+                self.upsert_students(csv_file, batch_size, options['workers'])
+                return
+            
+            table = None
+            if swap is not None:
+                swap.create_shadow(resume)
+                table = swap.shadow
+                self.stdout.write(f'Loading into {table}; the current data stays live until the swap.')
+            
+            # Import students
+            imported_before = checkpoint.counts['imported']
+            started = time.perf_counter()
+            if engine == 'fast':
+                self.fast_import_students(csv_file, batch_size, options['workers'], table)
+            elif engine == 'pandas':
+                self.pandas_import_students(csv_file, batch_size, table)
+            elif table is not None:
+                with get_loader(self.language_ids, table=table) as loader:
+                    self.import_students(csv_file, batch_size, loader)
+            else:
+                self.import_students(csv_file, batch_size)
+            elapsed = time.perf_counter() - started
+            
+            imported_count = checkpoint.counts['imported'] - imported_before
+            total = f', {checkpoint.counts["imported"]} with the interrupted run' if imported_before else ''
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Successfully imported {imported_count} student records{total} '
+                    f'in {elapsed:.1f}s ({self.rate(imported_count, elapsed)} rows/sec).'
+                )
             )
-        )
+            self.report_rejected()
+            
+            if swap is not None:
+                started = time.perf_counter()
+                swap.build_indexes()
+                self.stdout.write(f'Prepared {table} for the swap in {time.perf_counter() - started:.1f}s.')
+            self.refresh_derived_data(Student.SCORE_FIELDS, swap)
+        finally:
+            self.rejected.close()
     
     def create_initial_data(self):
         """Create initial foreign languages and subjects"""
@@ -78,75 +185,273 @@ class Command(BaseCommand):
                 defaults={'name': name}
             )
         
-        # Create subjects
+        # Create subjects (code, name, is_group_a, score_step)
         subjects = [
-            ('toan', 'Toán', True),
-            ('ngu_van', 'Ngữ Văn', False),
-            ('ngoai_ngu', 'Ngoại Ngữ', False),
-            ('vat_li', 'Vật Lý', True),
-            ('hoa_hoc', 'Hóa Học', True),
-            ('sinh_hoc', 'Sinh Học', False),
-            ('lich_su', 'Lịch Sử', False),
-            ('dia_li', 'Địa Lý', False),
-            ('gdcd', 'GDCD', False),
+            ('toan', 'Toán', True, 0.2),
+            ('ngu_van', 'Ngữ Văn', False, 0.25),
+            ('ngoai_ngu', 'Ngoại Ngữ', False, 0.2),
+            ('vat_li', 'Vật Lý', True, 0.25),
+            ('hoa_hoc', 'Hóa Học', True, 0.25),
+            ('sinh_hoc', 'Sinh Học', False, 0.25),
+            ('lich_su', 'Lịch Sử', False, 0.25),
+            ('dia_li', 'Địa Lý', False, 0.25),
+            ('gdcd', 'GDCD', False, 0.25),
         ]
         
-        for code, name, is_group_a in subjects:
+        for code, name, is_group_a, score_step in subjects:
             Subject.objects.get_or_create(
                 code=code,
-                defaults={'name': name, 'is_group_a': is_group_a}
+                defaults={'name': name, 'is_group_a': is_group_a, 'score_step': score_step}
             )
         
         self.stdout.write(self.style.SUCCESS('Initial data created.'))
     
-    def import_students(self, csv_file, batch_size):
-        """Import student data from CSV file"""
-        students_to_create = []
-        imported_count = 0
+    def position(self):
+        """(byte offset, row number) to start reading at: the checkpoint's, or the top"""
+        return self.checkpoint.offset or None, self.checkpoint.row
+    
+    def load_chunks(self, chunks, load):
+        """Load each chunk in one transaction together with the checkpoint that records it"""
+        checkpoint = self.checkpoint
+        started = time.perf_counter()
+        start_offset, start_row = checkpoint.offset, checkpoint.row
         
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
+        for chunk in chunks:
+            # Written before the commit: a resumed import cuts off the rows of
+            # a batch that never committed
+            self.rejected.write(chunk.rejected)
+            with transaction.atomic():
+                load(chunk.rows)
+                if checkpoint.mode != ImportCheckpoint.UPSERT:
+                    checkpoint.counts['imported'] += len(chunk.rows)
+                advance(checkpoint, chunk, self.rejected.size)
             
-            for row_num, row in enumerate(reader, start=1):
+            elapsed = time.perf_counter() - started
+            read = checkpoint.offset - start_offset
+            remaining = checkpoint.file_size - checkpoint.offset
+            eta = timedelta(seconds=round(elapsed * remaining / read)) if read else 'n/a'
+            self.stdout.write(
+                f'Processed {checkpoint.row} records '
+                f'({100 * checkpoint.offset / checkpoint.file_size:.1f}% of the file, '
+                f'{self.rate(checkpoint.row - start_row, elapsed)} rows/sec, ETA {eta})...'
+            )
+    
+    def report_rejected(self):
+        rejected_count = self.checkpoint.counts['rejected']
+        if rejected_count:
+            self.stdout.write(
+                self.style.WARNING(f'Rejected {rejected_count} rows, listed in {self.rejected.path}.')
+            )
+    
+    def import_students(self, csv_file, batch_size, loader=None):
+        """Import student data from CSV file, through a bulk loader if given"""
+        chunks = self.iter_student_chunks(csv_file, batch_size, as_tuples=loader is not None)
+        self.load_chunks(chunks, loader.load if loader is not None else self.bulk_create_students)
+    
+    def iter_student_chunks(self, csv_file, batch_size, as_tuples=False):
+        """Build the students (or loader tuples) of each batch of CSV rows"""
+        for header, first_row, lines, offset in read_lines(csv_file, batch_size, *self.position()):
+            rows = [
+                (row_num, dict(zip(header, record)), record)
+                for row_num, record in enumerate(csv.reader(lines), start=first_row)
+                if record
+            ]
+            self.ensure_languages(row.get('ma_ngoai_ngu') for _, row, _ in rows)
+            
+            students, rejected = [], []
+            for row_num, row, record in rows:
                 try:
-                    student = self.create_student_from_row(row)
-                    if student:
-                        students_to_create.append(student)
-                    
-                    # Batch insert
-                    if len(students_to_create) >= batch_size:
-                        self.bulk_create_students(students_to_create)
-                        imported_count += len(students_to_create)
-                        students_to_create = []
-                        self.stdout.write(f'Processed {imported_count} records...')
-                
+                    students.append(self.parse_row(row) if as_tuples else self.create_student_from_row(row))
                 except Exception as e:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'Error processing row {row_num}: {str(e)}'
-                        )
-                    )
+                    rejected.append((row_num, str(e) or type(e).__name__, record))
+            yield ParsedChunk(students, rejected, offset, first_row + len(lines) - 1)
+    
+    def load_language_ids(self):
+        """Load the code -> pk map used to resolve ma_ngoai_ngu without per-row queries"""
+        self.language_ids = dict(ForeignLanguage.objects.values_list('code', 'pk'))
+    
+    def ensure_languages(self, codes):
+        """Bulk create any language codes not seen before and add them to the map"""
+        max_length = ForeignLanguage._meta.get_field('code').max_length
+        missing = {
+            code for code in codes
+            if code and len(code) <= max_length and code not in self.language_ids
+        }
+        if not missing:
+            return
+        
+        ForeignLanguage.objects.bulk_create(
+            [ForeignLanguage(code=code, name=code) for code in sorted(missing)],
+            ignore_conflicts=True
+        )
+        self.language_ids.update(
+            ForeignLanguage.objects.filter(code__in=missing).values_list('code', 'pk')
+        )
+    
+    def load_rows(self, loader, rows):
+        """Add language codes not seen before, then bulk load a chunk of tuples"""
+        self.ensure_languages({row[-1] for row in rows})
+        loader.load(rows)
+    
+    def fast_import_students(self, csv_file, batch_size, workers, table=None):
+        """Parse the CSV in a process pool and load chunks with the native bulk loader"""
+        chunks = iter_parsed_chunks(
+            csv_file, Student.SCORE_FIELDS, batch_size, workers, *self.position(),
+            sbd_length=Student._meta.get_field('sbd').max_length,
+        )
+        with get_loader(self.language_ids, table=table) as loader:
+            self.load_chunks(chunks, lambda rows: self.load_rows(loader, rows))
+    
+    def pandas_import_students(self, csv_file, batch_size, table=None):
+        """Read typed chunks with pandas, validate vectorized and load them as tuples"""
+        bounds = {field: self.score_bounds(field) for field in Student.SCORE_FIELDS}
+        sbd_length = Student._meta.get_field('sbd').max_length
+        chunks = iter_dataframe_chunks(
+            csv_file, Student.SCORE_FIELDS, bounds, sbd_length, batch_size, *self.position()
+        )
+        with get_loader(self.language_ids, table=table) as loader:
+            self.load_chunks(chunks, lambda rows: self.load_rows(loader, rows))
+    
+    def upsert_students(self, csv_file, batch_size, workers):
+        """Insert new students and update changed ones, leaving identical rows untouched"""
+        counts = self.checkpoint.counts
+        # Kept in the checkpoint: a resumed upsert refreshes what the first run changed too
+        changed_subjects = set(self.checkpoint.changed_subjects)
+        
+        def load(rows):
+            self.ensure_languages(row[-1] for row in rows)
+            self.upsert_batch(rows, counts, changed_subjects)
+            self.checkpoint.changed_subjects = sorted(changed_subjects)
+        
+        chunks = iter_parsed_chunks(
+            csv_file, Student.SCORE_FIELDS, batch_size, workers, *self.position(),
+            sbd_length=Student._meta.get_field('sbd').max_length,
+        )
+        self.load_chunks(chunks, load)
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Upsert complete: {counts["inserted"]} inserted, {counts["updated"]} updated, '
+                f'{counts["unchanged"]} unchanged.'
+            )
+        )
+        self.report_rejected()
+        
+        # Only the subjects that actually changed need their statistics rebuilt
+        if counts['inserted'] or counts['updated']:
+            self.refresh_derived_data(sorted(changed_subjects))
+        else:
+            complete(self.checkpoint)
+        return counts
+    
+    def upsert_batch(self, rows, counts, changed_subjects):
+        """Compare a chunk against stored hashes and write only what changed"""
+        rows = {row[0]: row for row in rows}
+        stored = {
+            sbd: (stored_hash, scores)
+            for sbd, stored_hash, *scores in Student.objects.filter(sbd__in=rows).values_list(
+                'sbd', 'score_hash', *Student.SCORE_FIELDS
+            )
+        }
+        
+        students = []
+        for sbd, row in rows.items():
+            scores, language_code = row[1:-1], row[-1]
+            row_hash = score_hash(scores, language_code)
+            
+            if sbd in stored:
+                stored_hash, stored_scores = stored[sbd]
+                if stored_hash == row_hash:
+                    counts['unchanged'] += 1
                     continue
+                counts['updated'] += 1
+                old_scores = stored_scores
+            else:
+                counts['inserted'] += 1
+                old_scores = [None] * len(scores)
             
-            # Insert remaining students
-            if students_to_create:
-                self.bulk_create_students(students_to_create)
-                imported_count += len(students_to_create)
+            changed_subjects.update(
+                field for field, old, new in zip(Student.SCORE_FIELDS, old_scores, scores)
+                if old != new
+            )
+            scores_by_subject = dict(zip(Student.SCORE_FIELDS, scores))
+            students.append(Student(
+                sbd=sbd,
+                ma_ngoai_ngu_id=self.language_ids.get(language_code),
+                score_hash=row_hash,
+                **scores_by_subject,
+                **Student.compute_group_totals(scores_by_subject)
+            ))
         
-        return imported_count
+        if not students:
+            return
+        
+        # ON CONFLICT ... DO UPDATE / ON DUPLICATE KEY UPDATE in a single statement
+        features = connection.features
+        with transaction.atomic():
+            Student.objects.bulk_create(
+                students,
+                update_conflicts=True,
+                unique_fields=['sbd'] if features.supports_update_conflicts_with_target else None,
+                update_fields=[
+                    *Student.SCORE_FIELDS, *Student.GROUP_TOTAL_FIELDS,
+                    'ma_ngoai_ngu', 'score_hash', 'updated_at',
+                ],
+            )
     
-    def create_student_from_row(self, row):
-        """Create Student object from CSV row"""
-        # Get foreign language
-        foreign_language = None
-        if row.get('ma_ngoai_ngu'):
-            try:
-                foreign_language = ForeignLanguage.objects.get(
-                    code=row['ma_ngoai_ngu']
-                )
-            except ForeignLanguage.DoesNotExist:
-                pass
+    def refresh_derived_data(self, subjects, swap=None):
+        """Rebuild statistics derived from the student table after an import.
         
+        Given a table swap, the snapshot is read from the shadow table and the
+        swap commits together with the statistics, the new dataset version and
+        the import's completed checkpoint.
+        """
+        # One scan into the column snapshot; everything below is computed from it
+        table = swap.shadow if swap is not None else None
+        snapshot = write_snapshot(table=table) if settings.SNAPSHOT_ENABLED else None
+        try:
+            if snapshot is not None:
+                self.stdout.write(f'Wrote column snapshot of {len(snapshot)} students.')
+            with transaction.atomic():
+                if swap is not None:
+                    started = time.perf_counter()
+                    swap.swap()
+                    self.stdout.write(f'Swapped {table} in as {swap.table} in {time.perf_counter() - started:.2f}s.')
+                refresh_statistics(subjects, snapshot=snapshot)
+                self.stdout.write(f'Refreshed statistics for: {", ".join(subjects) or "student count"}')
+                refresh_distributions(subjects, snapshot=snapshot)
+                self.stdout.write('Refreshed score distributions.')
+                # Bumps the dataset version, so everything cached below lands under the new one
+                summary = refresh_dataset_summary()
+                self.stdout.write(f'Refreshed dataset summary (version {summary["version"]}).')
+                complete(self.checkpoint)
+        except Exception:
+            if snapshot is not None:
+                discard_snapshot(snapshot)
+            raise
+        if snapshot is not None:
+            publish_snapshot(snapshot, summary['version'])
+            self.stdout.write(f'Published snapshot {snapshot.path}.')
+        refresh_leaderboards(snapshot)
+        self.stdout.write('Rebuilt combination leaderboards.')
+    
+    @staticmethod
+    def score_bounds(field_name):
+        """Inclusive (min, max) range taken from a score field's validators"""
+        low, high = float('-inf'), float('inf')
+        for validator in Student._meta.get_field(field_name).validators:
+            if isinstance(validator, MinValueValidator):
+                low = validator.limit_value
+            elif isinstance(validator, MaxValueValidator):
+                high = validator.limit_value
+        return low, high
+    
+    @staticmethod
+    def rate(count, elapsed):
+        return f'{count / elapsed:,.0f}' if elapsed > 0 else 'n/a'
+    
+    def parse_row(self, row):
+        """(sbd, *scores, language_code) tuple from a CSV row, as the bulk loaders take it"""
         # Convert empty strings to None for numeric fields
         def safe_float(value):
             if value == '' or value is None:
@@ -156,19 +461,22 @@ class Command(BaseCommand):
             except (ValueError, TypeError):
                 return None
         
+        sbd = row.get('sbd')
+        if not valid_sbd(sbd, Student._meta.get_field('sbd').max_length):
+            raise ValueError('invalid sbd')
+        scores = [safe_float(row.get(field)) for field in Student.SCORE_FIELDS]
+        return (sbd, *scores, row.get('ma_ngoai_ngu') or None)
+    
+    def create_student_from_row(self, row):
+        """Create Student object from CSV row"""
+        sbd, *scores, language_code = self.parse_row(row)
         student = Student(
-            sbd=row['sbd'],
-            toan=safe_float(row.get('toan')),
-            ngu_van=safe_float(row.get('ngu_van')),
-            ngoai_ngu=safe_float(row.get('ngoai_ngu')),
-            vat_li=safe_float(row.get('vat_li')),
-            hoa_hoc=safe_float(row.get('hoa_hoc')),
-            sinh_hoc=safe_float(row.get('sinh_hoc')),
-            lich_su=safe_float(row.get('lich_su')),
-            dia_li=safe_float(row.get('dia_li')),
-            gdcd=safe_float(row.get('gdcd')),
-            ma_ngoai_ngu=foreign_language
+            sbd=sbd,
+            ma_ngoai_ngu_id=self.language_ids.get(language_code),
+            score_hash=score_hash(scores, language_code),
+            **dict(zip(Student.SCORE_FIELDS, scores))
         )
+        student.update_group_totals()
         
         return student
     
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from scores.benchmarks import lookup_workload
+from scores.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Replay lookup traffic against a running server over many concurrent connections'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            type=str,
+            default='http://127.0.0.1:8000',
+            help='Base URL of the server (default: http://127.0.0.1:8000)'
+        )
+        parser.add_argument(
+            '--path',
+            type=str,
+            default='/api/students/{sbd}/',
+            help='Path requested for each registration number (default: /api/students/{sbd}/)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20000,
+            help='Total number of requests (default: 20000)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=500,
+            help='Connections kept in flight at once (default: 500)'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=30,
+            help='Seconds before a request counts as failed (default: 30)'
+        )
+    
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Only plain http:// URLs are supported.')
+        
+        # Registration numbers come from this project's database, which
+        # should be the one the server under test is reading
+        sbds = list(Student.objects.values_list('sbd', flat=True))
+        if not sbds:
+            raise CommandError('No students in the database; run import_scores first.')
+        paths = [options['path'].format(sbd=sbd) for sbd in lookup_workload(sbds, options['requests'])]
+        
+        self.stdout.write(
+            f'Sending {len(paths)} requests to {url.netloc} over {options["concurrency"]} connections...'
+        )
+        started = time.perf_counter()
+        latencies, statuses = asyncio.run(
+            self.run(url.hostname, url.port or 80, paths, options['concurrency'], options['timeout'])
+        )
+        elapsed = time.perf_counter() - started
+        
+        latencies.sort()
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0
+        self.stdout.write(self.style.MIGRATE_HEADING('Load test'))
+        self.stdout.write(f'  responses:   {", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str))}')
+        self.stdout.write(f'  seconds:     {elapsed:.2f}')
+        self.stdout.write(f'  requests/s:  {len(paths) / elapsed:,.0f}')
+        for label, p in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1)]:
+            self.stdout.write(f'  {label} ms:{" " * (8 - len(label))}{percentile(p):.1f}')
+    
+    async def run(self, host, port, paths, concurrency, timeout):
+        """Drain the paths with concurrency workers, each on its own keep-alive connection"""
+        latencies, statuses = [], Counter()
+        pending = iter(paths)
+        
+        async def worker():
+            connection = None
+            for path in pending:
+                started = time.perf_counter()
+                try:
+                    if connection is None:
+                        connection = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                    status, close = await asyncio.wait_for(self.request(*connection, host, path), timeout)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as error:
+                    status, close = type(error).__name__, True
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] += 1
+                # Sync workers answer with Connection: close, so reconnect
+                if close and connection is not None:
+                    connection[1].close()
+                    connection = None
+            if connection is not None:
+                connection[1].close()
+        
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, len(paths)))])
+        return latencies, statuses
+    
+    async def request(self, reader, writer, host, path):
+        """Send one GET and read the response, returning (status, connection closed)"""
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n'.encode())
+        await writer.drain()
+        
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b'', None)
+        status = int(status_line.split()[1])
+        length, close = 0, False
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection':
+                close = value.strip().lower() == 'close'
+        await reader.readexactly(length)
+        return status, close
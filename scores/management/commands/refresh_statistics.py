@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from scores.distributions import refresh_distributions
+from scores.models import Student
+from scores.routers import use_primary
+from scores.statistics import refresh_statistics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized ScoreStatistics and ScoreDistribution rows'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subject',
+            action='append',
+            choices=Student.SCORE_FIELDS,
+            help='Only refresh this subject (may be repeated; default: all subjects)'
+        )
+    
+    @use_primary()
+    def handle(self, *args, **options):
+        subjects = options['subject'] or Student.SCORE_FIELDS
+        counts = refresh_statistics(subjects)
+        refresh_distributions(subjects)
+        
+        for subject in subjects:
+            self.stdout.write(f'{subject}: {counts[subject]["total"]} students')
+        self.stdout.write(
+            self.style.SUCCESS(f'Refreshed statistics for {len(subjects)} subjects.')
+        )
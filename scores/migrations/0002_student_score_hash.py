@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='score_hash',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Hash of the score tuple as last imported', null=True),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:16
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+# Frozen copy of Student.GROUP_TOTAL_FIELDS at the time of this migration
+GROUP_TOTAL_FIELDS = {
+    'group_a_total': ('toan', 'vat_li', 'hoa_hoc'),
+    'group_a1_total': ('toan', 'vat_li', 'ngoai_ngu'),
+    'group_b_total': ('toan', 'hoa_hoc', 'sinh_hoc'),
+    'group_c_total': ('ngu_van', 'lich_su', 'dia_li'),
+    'group_d_total': ('toan', 'ngu_van', 'ngoai_ngu'),
+}
+
+
+def backfill_group_totals(apps, schema_editor):
+    """Fill the totals set-based; NULL propagation leaves incomplete blocks empty"""
+    Student = apps.get_model('scores', 'Student')
+    students = Student.objects.using(schema_editor.connection.alias)
+    students.update(**{
+        field: F(first) + F(second) + F(third)
+        for field, (first, second, third) in GROUP_TOTAL_FIELDS.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0002_student_score_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='group_a1_total',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Group A1 Total'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='group_a_total',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Group A Total'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='group_b_total',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Group B Total'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='group_c_total',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Group C Total'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='group_d_total',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Group D Total'),
+        ),
+        # Backfill before the indexes exist so the update skips index maintenance
+        migrations.RunPython(backfill_group_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_a_total', 'sbd'], name='student_group_a_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_a1_total', 'sbd'], name='student_group_a1_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_b_total', 'sbd'], name='student_group_b_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_c_total', 'sbd'], name='student_group_c_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_d_total', 'sbd'], name='student_group_d_rank_idx'),
+        ),
+    ]
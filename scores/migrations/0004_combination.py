@@ -0,0 +1,78 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+SUBJECTS = [
+    ('toan', 'Toán', True),
+    ('ngu_van', 'Ngữ Văn', False),
+    ('ngoai_ngu', 'Ngoại Ngữ', False),
+    ('vat_li', 'Vật Lý', True),
+    ('hoa_hoc', 'Hóa Học', True),
+    ('sinh_hoc', 'Sinh Học', False),
+    ('lich_su', 'Lịch Sử', False),
+    ('dia_li', 'Địa Lý', False),
+    ('gdcd', 'GDCD', False),
+]
+
+COMBINATIONS = [
+    ('A00', ('toan', 'vat_li', 'hoa_hoc')),
+    ('A01', ('toan', 'vat_li', 'ngoai_ngu')),
+    ('A02', ('toan', 'vat_li', 'sinh_hoc')),
+    ('B00', ('toan', 'hoa_hoc', 'sinh_hoc')),
+    ('C00', ('ngu_van', 'lich_su', 'dia_li')),
+    ('C03', ('ngu_van', 'toan', 'lich_su')),
+    ('C04', ('ngu_van', 'toan', 'dia_li')),
+    ('C19', ('ngu_van', 'lich_su', 'gdcd')),
+    ('C20', ('ngu_van', 'dia_li', 'gdcd')),
+    ('D01', ('ngu_van', 'toan', 'ngoai_ngu')),
+    ('D07', ('toan', 'hoa_hoc', 'ngoai_ngu')),
+    ('D08', ('toan', 'sinh_hoc', 'ngoai_ngu')),
+    ('D14', ('ngu_van', 'lich_su', 'ngoai_ngu')),
+    ('D15', ('ngu_van', 'dia_li', 'ngoai_ngu')),
+]
+
+
+def create_standard_combinations(apps, schema_editor):
+    Subject = apps.get_model('scores', 'Subject')
+    Combination = apps.get_model('scores', 'Combination')
+    
+    subjects = {}
+    for code, name, is_group_a in SUBJECTS:
+        subjects[code], _ = Subject.objects.get_or_create(
+            code=code,
+            defaults={'name': name, 'is_group_a': is_group_a}
+        )
+    
+    for code, subject_codes in COMBINATIONS:
+        combination, created = Combination.objects.get_or_create(
+            code=code,
+            defaults={'name': ', '.join(subjects[subject].name for subject in subject_codes)}
+        )
+        if created:
+            combination.subjects.set([subjects[subject] for subject in subject_codes])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0003_student_group_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Combination',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='Block code like A00, D01, etc.', max_length=5, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('subjects', models.ManyToManyField(related_name='combinations', to='scores.subject')),
+            ],
+            options={
+                'verbose_name': 'Combination',
+                'verbose_name_plural': 'Combinations',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.RunPython(create_standard_combinations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0005_datasetsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetsummary',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Bumped whenever the dataset changes'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:24
+
+import django.core.validators
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Round
+import scores.fields
+
+
+# Frozen list of the score columns converted to hundredths
+SCALED_FIELDS = (
+    'toan', 'ngu_van', 'ngoai_ngu', 'vat_li', 'hoa_hoc',
+    'sinh_hoc', 'lich_su', 'dia_li', 'gdcd',
+    'group_a_total', 'group_a1_total', 'group_b_total', 'group_c_total', 'group_d_total',
+)
+
+
+def scale_scores(apps, schema_editor):
+    """Rewrite the float columns as whole hundredths before they become integers"""
+    Student = apps.get_model('scores', 'Student')
+    Student.objects.using(schema_editor.connection.alias).update(**{
+        field: Round(F(field) * 100) for field in SCALED_FIELDS
+    })
+
+
+def unscale_scores(apps, schema_editor):
+    """Turn hundredths back into scores once the columns are floats again"""
+    Student = apps.get_model('scores', 'Student')
+    Student.objects.using(schema_editor.connection.alias).update(**{
+        field: F(field) / 100.0 for field in SCALED_FIELDS
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0006_datasetsummary_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(scale_scores, unscale_scores),
+        migrations.AlterField(
+            model_name='student',
+            name='dia_li',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Địa Lý'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='gdcd',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='GDCD'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='group_a1_total',
+            field=scores.fields.ScaledScoreField(blank=True, editable=False, null=True, verbose_name='Group A1 Total'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='group_a_total',
+            field=scores.fields.ScaledScoreField(blank=True, editable=False, null=True, verbose_name='Group A Total'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='group_b_total',
+            field=scores.fields.ScaledScoreField(blank=True, editable=False, null=True, verbose_name='Group B Total'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='group_c_total',
+            field=scores.fields.ScaledScoreField(blank=True, editable=False, null=True, verbose_name='Group C Total'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='group_d_total',
+            field=scores.fields.ScaledScoreField(blank=True, editable=False, null=True, verbose_name='Group D Total'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='hoa_hoc',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Hóa Học'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='lich_su',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Lịch Sử'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='ngoai_ngu',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Ngoại Ngữ'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='ngu_van',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Ngữ Văn'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='sinh_hoc',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Sinh Học'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='toan',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Toán'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='vat_li',
+            field=scores.fields.ScaledScoreField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Vật Lý'),
+        ),
+    ]
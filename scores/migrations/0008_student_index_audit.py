@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0007_student_scaled_scores'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='student',
+            options={'verbose_name': 'Student', 'verbose_name_plural': 'Students'},
+        ),
+        migrations.RemoveIndex(
+            model_name='student',
+            name='scores_stud_sbd_eaf324_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='student',
+            name='scores_stud_toan_6e4ba5_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='student',
+            name='student_group_a1_rank_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='student',
+            name='student_group_b_rank_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='student',
+            name='student_group_c_rank_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='student',
+            name='student_group_d_rank_idx',
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+# Math and the foreign language are 50 multiple-choice questions worth 0.2
+# each; the rest use 0.25
+SCORE_STEPS = {'toan': 0.2, 'ngoai_ngu': 0.2}
+
+
+def set_score_steps(apps, schema_editor):
+    Subject = apps.get_model('scores', 'Subject')
+    for code, step in SCORE_STEPS.items():
+        Subject.objects.using(schema_editor.connection.alias).filter(code=code).update(score_step=step)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0008_student_index_audit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreDistribution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_name', models.CharField(max_length=20, unique=True)),
+                ('step', models.FloatField(help_text="Histogram bin width, the subject's score step")),
+                ('histogram', models.JSONField(default=list, help_text='Students per score step from 0 to 10')),
+                ('percentiles', models.JSONField(default=dict)),
+                ('total_students', models.IntegerField(default=0)),
+                ('mean', models.FloatField(blank=True, null=True)),
+                ('median', models.FloatField(blank=True, null=True)),
+                ('stddev', models.FloatField(blank=True, null=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Score Distribution',
+                'verbose_name_plural': 'Score Distributions',
+            },
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='score_step',
+            field=models.FloatField(default=0.25, help_text="Smallest score increment: 0.25 for most subjects, 0.2 for the 50-question Math and foreign language papers"),
+        ),
+        migrations.RunPython(set_score_steps, migrations.RunPython.noop),
+    ]
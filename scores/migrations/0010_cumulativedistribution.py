@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0009_scoredistribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CumulativeDistribution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('subject', 'Subject'), ('combination', 'Combination')], max_length=12)),
+                ('key', models.CharField(help_text='Subject or combination code', max_length=20)),
+                ('total_students', models.IntegerField(default=0)),
+                ('scores', models.JSONField(default=list, help_text='Distinct scores in hundredths, ascending')),
+                ('cumulative', models.JSONField(default=list, help_text='Students scoring at or below each score')),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Cumulative Distribution',
+                'verbose_name_plural': 'Cumulative Distributions',
+                'unique_together': {('kind', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0010_cumulativedistribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(help_text='Absolute path of the imported CSV', max_length=500)),
+                ('file_size', models.BigIntegerField(help_text='Size of the file when the import started')),
+                ('file_mtime', models.FloatField(help_text='Modification time of the file when the import started')),
+                ('mode', models.CharField(choices=[('append', 'Append'), ('replace', 'Replace (--clear)'), ('upsert', 'Upsert')], max_length=10)),
+                ('offset', models.BigIntegerField(default=0, help_text='Byte offset just past the last committed batch')),
+                ('row', models.BigIntegerField(default=0, help_text='CSV rows read up to that offset, header excluded')),
+                ('counts', models.JSONField(default=dict, help_text='Rows imported, rejected, ... so far')),
+                ('changed_subjects', models.JSONField(default=list, help_text='Subjects an upsert has changed so far')),
+                ('rejected_file', models.CharField(blank=True, max_length=500)),
+                ('rejected_size', models.BigIntegerField(default=0, help_text='Size of the rejected-rows file at that offset')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Import Checkpoint',
+                'verbose_name_plural': 'Import Checkpoints',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
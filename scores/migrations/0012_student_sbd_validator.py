@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0011_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='sbd',
+            field=models.CharField(help_text='Student registration number (SBD)', max_length=8, unique=True, validators=[django.core.validators.RegexValidator('^[0-9]{8}\\Z', 'Registration number must be exactly 8 digits.')], verbose_name='Registration Number'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0012_student_sbd_validator'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_a1_total', 'sbd'], name='student_group_a1_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_b_total', 'sbd'], name='student_group_b_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_c_total', 'sbd'], name='student_group_c_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-group_d_total', 'sbd'], name='student_group_d_rank_idx'),
+        ),
+    ]
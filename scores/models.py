@@ -1,5 +1,6 @@
 from django.db import models
-from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
+from .fields import ScaledScoreField
 
 
 class ForeignLanguage(models.Model):
@@ -28,10 +29,26 @@ class Subject(models.Model):
         ('dia_li', 'Địa Lý'),
         ('gdcd', 'GDCD'),
     ]
+    # Font Awesome icon shown next to each subject
+    SUBJECT_ICONS = {
+        'toan': 'fa-calculator',
+        'ngu_van': 'fa-book',
+        'ngoai_ngu': 'fa-language',
+        'vat_li': 'fa-atom',
+        'hoa_hoc': 'fa-flask',
+        'sinh_hoc': 'fa-dna',
+        'lich_su': 'fa-landmark',
+        'dia_li': 'fa-globe',
+        'gdcd': 'fa-balance-scale',
+    }
     
     code = models.CharField(max_length=10, choices=SUBJECT_CHOICES, unique=True)
     name = models.CharField(max_length=50)
     is_group_a = models.BooleanField(default=False, help_text="True if subject is part of Group A")
+    score_step = models.FloatField(
+        default=0.25,
+        help_text="Smallest score increment: 0.25 for most subjects, 0.2 for the 50-question Math and foreign language papers"
+    )
     
     def __str__(self):
         return self.name
@@ -54,57 +71,94 @@ class Subject(models.Model):
         verbose_name_plural = "Subjects"
 
 
+class Combination(models.Model):
+    """Admission block such as A00 (Toán, Vật Lý, Hóa Học) ranked by its total"""
+    code = models.CharField(max_length=5, unique=True, help_text="Block code like A00, D01, etc.")
+    name = models.CharField(max_length=100)
+    subjects = models.ManyToManyField(Subject, related_name='combinations')
+    
+    def __str__(self):
+        return f"{self.code} - {self.name}"
+    
+    def get_subject_codes(self):
+        """Subject codes of this block in the standard subject order"""
+        codes = {subject.code for subject in self.subjects.all()}
+        return [field for field in Student.SCORE_FIELDS if field in codes]
+    
+    class Meta:
+        verbose_name = "Combination"
+        verbose_name_plural = "Combinations"
+        ordering = ['code']
+
+
 class Student(models.Model):
     """Model for student exam results"""
+    SCORE_FIELDS = (
+        'toan', 'ngu_van', 'ngoai_ngu', 'vat_li', 'hoa_hoc',
+        'sinh_hoc', 'lich_su', 'dia_li', 'gdcd',
+    )
+    
+    # Stored combination totals and the subjects they add up
+    GROUP_TOTAL_FIELDS = {
+        'group_a_total': ('toan', 'vat_li', 'hoa_hoc'),     # A00
+        'group_a1_total': ('toan', 'vat_li', 'ngoai_ngu'),  # A01
+        'group_b_total': ('toan', 'hoa_hoc', 'sinh_hoc'),   # B00
+        'group_c_total': ('ngu_van', 'lich_su', 'dia_li'),  # C00
+        'group_d_total': ('toan', 'ngu_van', 'ngoai_ngu'),  # D01
+    }
+    
     sbd = models.CharField(
         max_length=8, 
         unique=True, 
+        # The same rule as the lookup form and the importers
+        validators=[RegexValidator(r'^[0-9]{8}\Z', "Registration number must be exactly 8 digits.")],
         verbose_name="Registration Number",
         help_text="Student registration number (SBD)"
     )
     
-    # Subject scores (nullable for students who didn't take certain subjects)
-    toan = models.FloatField(
+    # Subject scores (nullable for students who didn't take certain subjects),
+    # stored as hundredths in two-byte integers and read back as floats
+    toan = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="Toán"
     )
-    ngu_van = models.FloatField(
+    ngu_van = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="Ngữ Văn"
     )
-    ngoai_ngu = models.FloatField(
+    ngoai_ngu = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="Ngoại Ngữ"
     )
-    vat_li = models.FloatField(
+    vat_li = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="Vật Lý"
     )
-    hoa_hoc = models.FloatField(
+    hoa_hoc = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="Hóa Học"
     )
-    sinh_hoc = models.FloatField(
+    sinh_hoc = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="Sinh Học"
     )
-    lich_su = models.FloatField(
+    lich_su = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="Lịch Sử"
     )
-    dia_li = models.FloatField(
+    dia_li = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="Địa Lý"
     )
-    gdcd = models.FloatField(
+    gdcd = ScaledScoreField(
         null=True, blank=True,
         validators=[MinValueValidator(0), MaxValueValidator(10)],
         verbose_name="GDCD"
@@ -118,6 +172,19 @@ class Student(models.Model):
         verbose_name="Foreign Language"
     )
     
+    # Combination totals, filled at import time so rankings can read an index
+    group_a_total = ScaledScoreField(null=True, blank=True, editable=False, verbose_name="Group A Total")
+    group_a1_total = ScaledScoreField(null=True, blank=True, editable=False, verbose_name="Group A1 Total")
+    group_b_total = ScaledScoreField(null=True, blank=True, editable=False, verbose_name="Group B Total")
+    group_c_total = ScaledScoreField(null=True, blank=True, editable=False, verbose_name="Group C Total")
+    group_d_total = ScaledScoreField(null=True, blank=True, editable=False, verbose_name="Group D Total")
+    
+    # Fingerprint of the imported scores, used by incremental imports
+    score_hash = models.BigIntegerField(
+        null=True, blank=True, editable=False,
+        help_text="Hash of the score tuple as last imported"
+    )
+    
     # Calculated fields
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -125,6 +192,24 @@ class Student(models.Model):
     def __str__(self):
         return f"SBD: {self.sbd}"
     
+    def save(self, *args, **kwargs):
+        self.update_group_totals()
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def compute_group_totals(cls, scores):
+        """Map each stored total field to its sum, given a {subject: score} dict"""
+        totals = {}
+        for field, subjects in cls.GROUP_TOTAL_FIELDS.items():
+            values = [scores.get(subject) for subject in subjects]
+            totals[field] = sum(values) if None not in values else None
+        return totals
+    
+    def update_group_totals(self):
+        """Recalculate the stored combination totals from the subject scores"""
+        for field, total in self.compute_group_totals(self.get_all_scores()).items():
+            setattr(self, field, total)
+    
     def get_group_a_total(self):
         """Calculate total score for Group A subjects (Math, Physics, Chemistry)"""
         scores = [self.toan, self.vat_li, self.hoa_hoc]
@@ -171,15 +256,26 @@ class Student(models.Model):
     class Meta:
         verbose_name = "Student"
         verbose_name_plural = "Students"
-        ordering = ['-created_at']
+        # No default ordering: every read path orders explicitly, and an
+        # implicit sort on created_at would hit querysets that don't need it.
+        # The unique constraint on sbd already indexes point lookups; subject
+        # statistics are one full scan at import time and need no index.
         indexes = [
-            models.Index(fields=['sbd']),
-            models.Index(fields=['toan', 'vat_li', 'hoa_hoc']),  # For Group A queries
+            # Top-N range reads for the rankings of the blocks with a stored
+            # total; other blocks' leaderboards are built in one scan and cached
+            models.Index(fields=['-group_a_total', 'sbd'], name='student_group_a_rank_idx'),
+            models.Index(fields=['-group_a1_total', 'sbd'], name='student_group_a1_rank_idx'),
+            models.Index(fields=['-group_b_total', 'sbd'], name='student_group_b_rank_idx'),
+            models.Index(fields=['-group_c_total', 'sbd'], name='student_group_c_rank_idx'),
+            models.Index(fields=['-group_d_total', 'sbd'], name='student_group_d_rank_idx'),
         ]
 
 
 class ScoreStatistics(models.Model):
     """Model to store calculated statistics for better performance"""
+    # subject_name of the row holding the overall number of students
+    OVERALL = 'all'
+    
     subject_name = models.CharField(max_length=20)
     level_excellent = models.IntegerField(default=0)  # >=8
     level_good = models.IntegerField(default=0)       # 6-8
@@ -195,3 +291,102 @@ class ScoreStatistics(models.Model):
         verbose_name = "Score Statistics"
         verbose_name_plural = "Score Statistics"
         unique_together = ['subject_name']
+
+
+
+class ScoreDistribution(models.Model):
+    """Histogram and summary statistics of one subject, precomputed at import"""
+    subject_name = models.CharField(max_length=20, unique=True)
+    step = models.FloatField(help_text="Histogram bin width, the subject's score step")
+    histogram = models.JSONField(default=list, help_text="Students per score step from 0 to 10")
+    percentiles = models.JSONField(default=dict)
+    total_students = models.IntegerField(default=0)
+    mean = models.FloatField(null=True, blank=True)
+    median = models.FloatField(null=True, blank=True)
+    stddev = models.FloatField(null=True, blank=True)
+    last_updated = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Distribution for {self.subject_name}"
+    
+    class Meta:
+        verbose_name = "Score Distribution"
+        verbose_name_plural = "Score Distributions"
+
+
+class CumulativeDistribution(models.Model):
+    """Cumulative score counts of a subject or combination, for percentile ranks"""
+    SUBJECT = 'subject'
+    COMBINATION = 'combination'
+    KIND_CHOICES = [
+        (SUBJECT, 'Subject'),
+        (COMBINATION, 'Combination'),
+    ]
+    
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    key = models.CharField(max_length=20, help_text="Subject or combination code")
+    total_students = models.IntegerField(default=0)
+    scores = models.JSONField(default=list, help_text="Distinct scores in hundredths, ascending")
+    cumulative = models.JSONField(default=list, help_text="Students scoring at or below each score")
+    last_updated = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"CDF for {self.kind} {self.key}"
+    
+    class Meta:
+        verbose_name = "Cumulative Distribution"
+        verbose_name_plural = "Cumulative Distributions"
+        unique_together = ['kind', 'key']
+
+
+class DatasetSummary(models.Model):
+    """Single-row summary of the imported dataset, refreshed by import_scores"""
+    SINGLETON_ID = 1
+    
+    version = models.PositiveIntegerField(default=0, help_text="Bumped whenever the dataset changes")
+    total_students = models.IntegerField(default=0)
+    subjects_count = models.IntegerField(default=0)
+    languages_count = models.IntegerField(default=0)
+    last_import_at = models.DateTimeField(null=True, blank=True)
+    last_updated = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Dataset v{self.version} ({self.total_students} students)"
+    
+    class Meta:
+        verbose_name = "Dataset Summary"
+        verbose_name_plural = "Dataset Summary"
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of an import_scores run, saved with every batch it commits"""
+    APPEND = 'append'
+    REPLACE = 'replace'
+    UPSERT = 'upsert'
+    MODE_CHOICES = [
+        (APPEND, 'Append'),
+        (REPLACE, 'Replace (--clear)'),
+        (UPSERT, 'Upsert'),
+    ]
+    
+    file_path = models.CharField(max_length=500, help_text="Absolute path of the imported CSV")
+    file_size = models.BigIntegerField(help_text="Size of the file when the import started")
+    file_mtime = models.FloatField(help_text="Modification time of the file when the import started")
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    offset = models.BigIntegerField(default=0, help_text="Byte offset just past the last committed batch")
+    row = models.BigIntegerField(default=0, help_text="CSV rows read up to that offset, header excluded")
+    counts = models.JSONField(default=dict, help_text="Rows imported, rejected, ... so far")
+    changed_subjects = models.JSONField(default=list, help_text="Subjects an upsert has changed so far")
+    rejected_file = models.CharField(max_length=500, blank=True)
+    rejected_size = models.BigIntegerField(default=0, help_text="Size of the rejected-rows file at that offset")
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_mode_display()} import of {self.file_path} at row {self.row}"
+    
+    class Meta:
+        verbose_name = "Import Checkpoint"
+        verbose_name_plural = "Import Checkpoints"
+        ordering = ['-started_at']
@@ -0,0 +1,191 @@
+"""CSV parsing helpers for the score importer.
+
+This module must stay free of Django imports: its functions run inside
+worker processes of the fast import path, which never call django.setup().
+"""
+import csv
+import hashlib
+import io
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+
+def parse_float(value):
+    """Convert a CSV cell to float, returning None for blanks and garbage"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def valid_sbd(sbd, length):
+    """Whether a registration number is exactly length ASCII digits"""
+    return bool(sbd) and len(sbd) == length and sbd.isascii() and sbd.isdigit()
+
+
+def score_hash(scores, language_code):
+    """Stable signed 64-bit fingerprint of a student's scores and language code"""
+    parts = ['' if score is None else str(float(score)) for score in scores]
+    parts.append(language_code or '')
+    digest = hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+# A parsed chunk: the rows to load, the rejected rows as (row number, reason,
+# record) and the byte offset and row number where the next chunk starts,
+# which is what a checkpoint records
+ParsedChunk = namedtuple('ParsedChunk', ['rows', 'rejected', 'offset', 'row'])
+
+
+def parse_chunk(lines, header, score_fields, first_row=1, sbd_length=8):
+    """Parse raw CSV lines into (sbd, *scores, language_code) tuples and rejected records"""
+    sbd_index = header.index('sbd')
+    score_indexes = [header.index(field) if field in header else None for field in score_fields]
+    language_index = header.index('ma_ngoai_ngu') if 'ma_ngoai_ngu' in header else None
+
+    rows = []
+    rejected = []
+    for row, record in enumerate(csv.reader(lines), start=first_row):
+        if not record:
+            continue
+        if sbd_index >= len(record) or not valid_sbd(record[sbd_index], sbd_length):
+            rejected.append((row, 'invalid sbd', record))
+            continue
+        scores = [
+            parse_float(record[index]) if index is not None and index < len(record) else None
+            for index in score_indexes
+        ]
+        language_code = None
+        if language_index is not None and language_index < len(record):
+            language_code = record[language_index] or None
+        rows.append((record[sbd_index], *scores, language_code))
+    return rows, rejected
+
+
+def iter_line_chunks(file, chunk_size):
+    """Yield lists of at most chunk_size raw lines from an open file"""
+    while True:
+        lines = list(islice(file, chunk_size))
+        if not lines:
+            return
+        yield lines
+
+
+def read_header(csv_file):
+    """Column names from the first line of a CSV"""
+    with open(csv_file, 'rb') as file:
+        return next(csv.reader([file.readline().decode('utf-8')]), [])
+
+
+def read_lines(csv_file, chunk_size, offset=None, row=0):
+    """Read a CSV in chunks of whole lines, keeping track of where each one ends.
+
+    Yields ``(header, first_row, lines, offset)``: the column names, the row
+    number of the chunk's first line (row 1 follows the header), the decoded
+    lines and the byte offset just past them. Given the offset and row number
+    of an earlier chunk's end, reading picks up right there. Every line is one
+    record, which rules out line breaks inside quoted fields.
+    """
+    with open(csv_file, 'rb') as file:
+        header = next(csv.reader([file.readline().decode('utf-8')]))
+        if offset is None:
+            offset = file.tell()
+        else:
+            file.seek(offset)
+        for lines in iter_line_chunks(file, chunk_size):
+            offset += sum(len(line) for line in lines)
+            yield header, row + 1, [line.decode('utf-8') for line in lines], offset
+            row += len(lines)
+
+
+def iter_parsed_chunks(csv_file, score_fields, chunk_size=10000, workers=1, offset=None, row=0, sbd_length=8):
+    """Parse a score CSV in chunks, fanning the work out to a process pool.
+
+    Chunks are yielded in file order as ParsedChunk tuples, starting after
+    ``offset`` and ``row`` when resuming. Rows whose SBD is not ``sbd_length``
+    digits are rejected. At most two chunks per worker are in flight at any
+    time so memory stays bounded regardless of file size.
+    """
+    chunks = read_lines(csv_file, chunk_size, offset, row)
+
+    if workers <= 1:
+        for header, first_row, lines, end in chunks:
+            rows, rejected = parse_chunk(lines, header, score_fields, first_row, sbd_length)
+            yield ParsedChunk(rows, rejected, end, first_row + len(lines) - 1)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for header, first_row, lines, end in chunks:
+            future = pool.submit(parse_chunk, lines, header, score_fields, first_row, sbd_length)
+            pending.append((future, end, first_row + len(lines) - 1))
+            if len(pending) >= workers * 2:
+                future, end, last_row = pending.popleft()
+                yield ParsedChunk(*future.result(), end, last_row)
+        while pending:
+            future, end, last_row = pending.popleft()
+            yield ParsedChunk(*future.result(), end, last_row)
+
+
+def iter_dataframe_chunks(csv_file, score_fields, bounds, sbd_length, chunk_size=50000, offset=None, row=0):
+    """Read a score CSV with pandas in typed chunks and validate them vectorized.
+
+    ``bounds`` maps each score field to its inclusive (min, max) range. Rows
+    whose SBD is not exactly ``sbd_length`` ASCII digits or with any score out
+    of range are rejected; scores that are not numbers load as missing, as
+    they do with the other engines. Yields ParsedChunk tuples whose rows are
+    shaped like the output of :func:`parse_chunk`, starting after ``offset``
+    and ``row`` when resuming.
+
+    Chunks come from :func:`read_lines` and each is parsed with its own
+    ``read_csv`` call rather than ``read_csv(chunksize=...)``: the pandas
+    reader does not report the byte offset a chunk ends at, which is what a
+    checkpoint needs to resume with a seek instead of re-reading the file.
+    """
+    # pandas and numpy are only needed by this engine; keep worker imports light
+    import numpy as np
+    import pandas as pd
+
+    dtype = {'sbd': 'string', 'ma_ngoai_ngu': 'string'}
+    dtype.update({field: 'string' for field in score_fields})
+    columns = ['sbd', *score_fields, 'ma_ngoai_ngu']
+
+    for header, first_row, lines, end in read_lines(csv_file, chunk_size, offset, row):
+        frame = pd.read_csv(
+            io.StringIO(''.join(lines)),
+            header=None,
+            names=header,
+            dtype=dtype,
+            usecols=lambda column: column in dtype,
+            keep_default_na=False,
+        )
+        frame = frame.reindex(columns=columns)
+        for field in score_fields:
+            frame[field] = pd.to_numeric(frame[field], errors='coerce').astype('float64')
+
+        valid_sbd = frame['sbd'].str.fullmatch(rf'[0-9]{{{sbd_length}}}').fillna(False).to_numpy(dtype=bool)
+        in_range = {}
+        for field in score_fields:
+            low, high = bounds[field]
+            values = frame[field]
+            in_range[field] = (values.isna() | values.between(low, high)).to_numpy()
+        valid = valid_sbd & np.logical_and.reduce(list(in_range.values()))
+
+        # pandas skips blank lines, so map frame positions back to row numbers
+        numbers = [number for number, line in enumerate(lines, start=first_row) if line.strip('\r\n')]
+        rejected = []
+        for position in np.flatnonzero(~valid):
+            number = numbers[position]
+            reason = 'invalid sbd' if not valid_sbd[position] else next(
+                f'{field} out of range' for field in score_fields if not in_range[field][position]
+            )
+            rejected.append((number, reason, next(csv.reader([lines[number - first_row]]))))
+
+        frame = frame[valid].assign(ma_ngoai_ngu=lambda f: f['ma_ngoai_ngu'].replace('', pd.NA))
+        records = frame.astype(object).where(frame.notna(), None)
+        yield ParsedChunk(
+            list(records.itertuples(index=False, name=None)), rejected, end, first_row + len(lines) - 1
+        )
@@ -0,0 +1,130 @@
+"""Routing between the primary database and its read replicas.
+
+Replicas are the aliases in ``settings.DATABASE_REPLICAS``: copies of the
+primary that something outside Django keeps up to date. Reads of the scores
+app's models go to a healthy replica; writes, reads inside a transaction on
+the primary, the dataset summary row and every other app's models (sessions,
+users, the admin log) use the primary.
+
+A replica is healthy when it answers a query for its dataset version and
+that version is not behind the current one. Each worker checks at most every
+``REPLICA_HEALTH_INTERVAL`` seconds, so a replica that is down or still
+replaying an import is skipped and, with none left, reads fall back to the
+primary. Because a lagging replica is never read, nothing cached under the
+new dataset version is computed from the old data.
+
+``use_primary()`` is the escape hatch for code that must read what it just
+wrote: import_scores and the rebuild commands run under it, and
+ReplicaMiddleware applies it to the admin and to clients that wrote recently.
+"""
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .cache import dataset_version
+from .models import DatasetSummary
+
+
+logger = logging.getLogger('gscores.db')
+
+_primary = ContextVar('use_primary', default=False)
+# Labels of the scores models written in the current block, when tracked
+_writes = ContextVar('replica_writes', default=None)
+# Alias -> (monotonic time of the last check, dataset version or None if down)
+_checks = {}
+
+
+@contextmanager
+def use_primary(enabled=True):
+    """Read from the primary inside the block (also usable as a decorator)"""
+    token = _primary.set(_primary.get() or enabled)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+@contextmanager
+def track_writes():
+    """Collect the labels of scores models written inside the block"""
+    writes = set()
+    token = _writes.set(writes)
+    try:
+        yield writes
+    finally:
+        _writes.reset(token)
+
+
+def replica_version(alias):
+    """Dataset version held by a replica, or None if it cannot be queried"""
+    try:
+        return (
+            DatasetSummary.objects.using(alias).filter(pk=DatasetSummary.SINGLETON_ID)
+            .values_list('version', flat=True).first()
+        ) or 0
+    except DatabaseError:
+        return None
+
+
+def check_replica(alias, version):
+    """Whether a replica is up and has the given dataset version, rechecked on an interval"""
+    now = time.monotonic()
+    checked_at, seen = _checks.get(alias, (None, None))
+    if checked_at is None or now - checked_at >= settings.REPLICA_HEALTH_INTERVAL:
+        previous, seen = seen, replica_version(alias)
+        if seen is None and (checked_at is None or previous is not None):
+            logger.warning('Replica %s is unavailable; reading from the primary', alias)
+            connections[alias].close()
+        elif seen is not None and checked_at is not None and previous is None:
+            logger.info('Replica %s is available again', alias)
+        _checks[alias] = (now, seen)
+    return seen is not None and seen >= version
+
+
+def replica_status():
+    """Health of every replica as {alias: 'healthy' | 'behind' | 'unavailable'}"""
+    version = dataset_version()
+    status = {}
+    for alias in settings.DATABASE_REPLICAS:
+        healthy = check_replica(alias, version)
+        status[alias] = 'healthy' if healthy else 'unavailable' if _checks[alias][1] is None else 'behind'
+    return status
+
+
+def choose_replica():
+    """A random healthy replica, or the primary if there is none"""
+    version = dataset_version()
+    healthy = [alias for alias in settings.DATABASE_REPLICAS if check_replica(alias, version)]
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            model._meta.app_label != 'scores'
+            # The version every cache entry is keyed on comes from the primary
+            or model is DatasetSummary
+            or _primary.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None and model._meta.app_label == 'scores':
+            writes.add(model._meta.label)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every database holds the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the primary's schema along with its data
+        return db not in settings.DATABASE_REPLICAS
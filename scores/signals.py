@@ -0,0 +1,21 @@
+"""Keep the derived score tables in step with single-student writes"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_dataset_version
+from .distributions import invalidate_distributions
+from .models import Student
+from .statistics import invalidate_statistics
+
+
+@receiver([post_save, post_delete], sender=Student)
+def student_changed(sender, **kwargs):
+    """Drop the stored statistics and distributions and start a new dataset version.
+
+    Imports write through bulk operations, which send no signals, and refresh
+    these tables themselves; any other save or delete of a student lands
+    here. Code calling update() on a queryset has to refresh them too.
+    """
+    invalidate_statistics()
+    invalidate_distributions()
+    bump_dataset_version()
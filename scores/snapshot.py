@@ -0,0 +1,169 @@
+"""Columnar snapshot of the student table as memory-mapped NumPy arrays.
+
+import_scores writes one ``.npy`` file per subject (float32, NaN where the
+subject was not taken) plus ``sbd.npy``, the registration numbers as
+fixed-width byte strings in ascending order. The files land
+in ``SNAPSHOT_DIR/v<dataset version>``; every worker maps them read-only, so
+the pages are shared through the OS page cache and nothing is copied.
+
+The database stays the source of truth: when no snapshot exists for the
+current dataset version (nothing imported on this host yet, or
+``SNAPSHOT_ENABLED`` is off) callers fall back to their SQL paths.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+
+from .cache import dataset_version
+from .fields import ScaledScoreField
+from .models import Student
+
+
+SNAPSHOT_CHUNK_SIZE = 50000
+SCALE = ScaledScoreField.SCALE
+
+
+class Snapshot:
+    """Read-only view of a snapshot directory"""
+
+    def __init__(self, path, version=None):
+        self.path = Path(path)
+        with open(self.path / 'meta.json', encoding='utf-8') as file:
+            self.meta = json.load(file)
+        self.version = version
+        rows = self.meta['rows']
+        self.sbd = np.load(self.path / 'sbd.npy', mmap_mode='r')[:rows]
+        self.scores = {
+            subject: np.load(self.path / f'{subject}.npy', mmap_mode='r')[:rows]
+            for subject in Student.SCORE_FIELDS
+        }
+
+    def __len__(self):
+        return len(self.sbd)
+
+    def units(self, subject):
+        """A subject's scores in whole hundredths, NaN where missing"""
+        return np.rint(self.scores[subject] * SCALE)
+
+    def total_units(self, subjects):
+        """Combination totals in hundredths, NaN unless every subject was taken"""
+        return np.sum([self.units(subject) for subject in subjects], axis=0)
+
+    def format_sbd(self, index):
+        sbd = self.sbd[index]
+        # Snapshots written before the numbers were kept as strings hold int64
+        return sbd.decode('utf-8', 'replace') if isinstance(sbd, bytes) else f'{int(sbd):08d}'
+
+
+def snapshot_root():
+    return Path(settings.SNAPSHOT_DIR)
+
+
+def write_snapshot(chunk_size=SNAPSHOT_CHUNK_SIZE, table=None):
+    """Dump the student table, or a shadow copy of it, into a new, unpublished snapshot directory"""
+    root = snapshot_root()
+    root.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix='.building-', dir=root))
+
+    # Count and read from the same database, the one the router reads
+    # students from
+    connection = connections[router.db_for_read(Student)]
+    quote = connection.ops.quote_name
+    table = table or Student._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {quote(table)}')
+        capacity = cursor.fetchone()[0]
+    # Kept as strings: a number added in the admin before SBDs were validated
+    # may not be all digits
+    sbd_dtype = f'S{Student._meta.get_field("sbd").max_length}'
+    sbd = np.lib.format.open_memmap(path / 'sbd.npy', mode='w+', dtype=sbd_dtype, shape=(capacity,))
+    columns = {
+        subject: np.lib.format.open_memmap(
+            path / f'{subject}.npy', mode='w+', dtype=np.float32, shape=(capacity,)
+        )
+        for subject in Student.SCORE_FIELDS
+    }
+
+    # Stored hundredths straight from a cursor, in SBD order for the index
+    rows = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {quote("sbd")}, {", ".join(quote(subject) for subject in Student.SCORE_FIELDS)} '
+            f'FROM {quote(table)} ORDER BY {quote("sbd")}'
+        )
+        while (chunk := cursor.fetchmany(chunk_size)) and rows < capacity:
+            chunk = chunk[:capacity - rows]
+            end = rows + len(chunk)
+            sbd[rows:end] = [row[0].encode('utf-8') for row in chunk]
+            values = np.array([row[1:] for row in chunk], dtype=np.float64) / SCALE
+            for index, subject in enumerate(Student.SCORE_FIELDS):
+                columns[subject][rows:end] = values[:, index]
+            rows = end
+
+    for array in [sbd, *columns.values()]:
+        array.flush()
+    with open(path / 'meta.json', 'w', encoding='utf-8') as file:
+        json.dump({'rows': rows, 'built_at': timezone.now().isoformat()}, file)
+    return Snapshot(path)
+
+
+def publish_snapshot(snapshot, version):
+    """Make a written snapshot the one served for a dataset version.
+
+    The directory is renamed into place atomically. Older versions are
+    removed except the previous one; workers still mapping its files keep
+    their pages until they move on.
+    """
+    root = snapshot_root()
+    target = root / f'v{version}'
+    if target.exists():
+        shutil.rmtree(target)
+    os.replace(snapshot.path, target)
+    snapshot.path, snapshot.version = target, version
+
+    published = sorted(
+        (int(entry.name[1:]), entry) for entry in root.iterdir()
+        if entry.is_dir() and entry.name[:1] == 'v' and entry.name[1:].isdigit()
+    )
+    for old_version, entry in published:
+        if old_version < version - 1:
+            shutil.rmtree(entry, ignore_errors=True)
+    return snapshot
+
+
+def discard_snapshot(snapshot):
+    """Delete a snapshot that was written but will not be published"""
+    shutil.rmtree(snapshot.path, ignore_errors=True)
+
+
+def build_snapshot():
+    """Write a snapshot of the current data and publish it for the current version"""
+    return publish_snapshot(write_snapshot(), dataset_version())
+
+
+_current = None
+_lock = threading.Lock()
+
+
+def get_snapshot():
+    """This process's mapping of the current version's snapshot, or None"""
+    global _current
+    if not settings.SNAPSHOT_ENABLED:
+        return None
+    version = dataset_version()
+    path = snapshot_root() / f'v{version}'
+    with _lock:
+        if _current is not None and _current.path == path:
+            return _current
+        if not (path / 'meta.json').exists():
+            return None
+        _current = Snapshot(path, version)
+        return _current
@@ -0,0 +1,156 @@
+"""Score statistics computed in a single scan of the student table"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import ScoreStatistics, Student, Subject
+from .snapshot import SCALE, get_snapshot
+
+
+LEVELS = ('excellent', 'good', 'average', 'below')
+
+# Inclusive lower and exclusive upper score of each level; None is unbounded
+LEVEL_BOUNDS = {
+    'excellent': (8, None),
+    'good': (6, 8),
+    'average': (4, 6),
+    'below': (None, 4),
+}
+
+# Label and Bootstrap badge class of each level
+LEVEL_BADGES = {
+    'excellent': ('Excellent (≥8)', 'bg-success'),
+    'good': ('Good (6-8)', 'bg-info'),
+    'average': ('Average (4-6)', 'bg-warning text-dark'),
+    'below': ('Below Average (<4)', 'bg-danger'),
+}
+
+
+def score_level(score):
+    """The level a score falls in according to LEVEL_BOUNDS"""
+    for level, (low, high) in LEVEL_BOUNDS.items():
+        if (low is None or score >= low) and (high is None or score < high):
+            return level
+
+
+def level_filters(subject):
+    """Q objects selecting each score level of a subject"""
+    filters = {}
+    for level, (low, high) in LEVEL_BOUNDS.items():
+        conditions = {}
+        if low is not None:
+            conditions[f'{subject}__gte'] = low
+        if high is not None:
+            conditions[f'{subject}__lt'] = high
+        filters[level] = Q(**conditions)
+    return filters
+
+
+def snapshot_level_counts(snapshot, subjects, include_overall=False):
+    """The same counts as compute_level_counts, vectorized over a column snapshot"""
+    counts = {}
+    if include_overall:
+        counts[ScoreStatistics.OVERALL] = {'total': len(snapshot)}
+    for subject in subjects:
+        units = snapshot.units(subject)
+        stats = {'total': int(np.count_nonzero(~np.isnan(units)))}
+        for level, (low, high) in LEVEL_BOUNDS.items():
+            selected = np.ones(len(units), dtype=bool) if low is None else units >= low * SCALE
+            if high is not None:
+                selected &= units < high * SCALE
+            stats[level] = int(np.count_nonzero(selected))
+        counts[subject] = stats
+    return counts
+
+
+def compute_level_counts(subjects=Student.SCORE_FIELDS, include_overall=False, snapshot=None):
+    """Count every subject's level buckets and totals with one aggregate query.
+
+    Returns ``{subject: {'excellent': n, 'good': n, 'average': n, 'below': n, 'total': n}}``.
+    With ``include_overall`` the number of students is added under
+    ``ScoreStatistics.OVERALL`` in the same scan. Given a snapshot, the
+    counts are taken from its columns instead of the database.
+    """
+    if snapshot is not None:
+        return snapshot_level_counts(snapshot, subjects, include_overall)
+
+    aggregates = {}
+    if include_overall:
+        aggregates[f'{ScoreStatistics.OVERALL}__total'] = Count('id')
+    for subject in subjects:
+        for level, condition in level_filters(subject).items():
+            aggregates[f'{subject}__{level}'] = Count('id', filter=condition)
+        aggregates[f'{subject}__total'] = Count(subject)
+
+    result = Student.objects.order_by().aggregate(**aggregates)
+
+    counts = {}
+    for key, value in result.items():
+        subject, name = key.split('__')
+        counts.setdefault(subject, {})[name] = value
+    return counts
+
+
+def refresh_statistics(subjects=Student.SCORE_FIELDS, include_overall=True, snapshot=None):
+    """Recompute the given subjects in one scan and store them as ScoreStatistics rows"""
+    counts = compute_level_counts(subjects, include_overall, snapshot)
+    with transaction.atomic():
+        for subject, stats in counts.items():
+            ScoreStatistics.objects.update_or_create(
+                subject_name=subject,
+                defaults={
+                    'level_excellent': stats.get('excellent', 0),
+                    'level_good': stats.get('good', 0),
+                    'level_average': stats.get('average', 0),
+                    'level_below': stats.get('below', 0),
+                    'total_students': stats['total'],
+                },
+            )
+    return counts
+
+
+def invalidate_statistics(subjects=None):
+    """Delete stored rows so the next read recomputes them; None means everything"""
+    rows = ScoreStatistics.objects.all()
+    if subjects is not None:
+        rows = rows.filter(subject_name__in=subjects)
+    rows.delete()
+
+
+def load_level_counts():
+    """Read materialized level counts, recomputing any subject that is missing.
+
+    Imports rewrite the rows and any other save or delete of a student
+    drops them (see ``scores.signals``), so a missing row is what makes the
+    table stale. Missing subjects are computed live (still in a single scan)
+    and written back for the next reader.
+    """
+    counts = {}
+    for row in ScoreStatistics.objects.all():
+        counts[row.subject_name] = {
+            'excellent': row.level_excellent,
+            'good': row.level_good,
+            'average': row.level_average,
+            'below': row.level_below,
+            'total': row.total_students,
+        }
+
+    missing = [subject for subject in Student.SCORE_FIELDS if subject not in counts]
+    if missing or ScoreStatistics.OVERALL not in counts:
+        counts.update(refresh_statistics(missing, snapshot=get_snapshot()))
+    return counts
+
+
+def subject_statistics():
+    """Level counts with display names and percentages for every subject"""
+    subject_names = dict(Subject.SUBJECT_CHOICES)
+    counts = load_level_counts()
+    statistics = {}
+    for subject in Student.SCORE_FIELDS:
+        stats = counts[subject]
+        total = stats['total']
+        entry = {'name': subject_names[subject], 'icon': Subject.SUBJECT_ICONS[subject], **stats}
+        for level in LEVELS:
+            entry[f'{level}_pct'] = (stats[level] / total) * 100 if total > 0 else 0
+        statistics[subject] = entry
+    return statistics
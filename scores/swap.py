@@ -0,0 +1,265 @@
+"""Blue/green replacement of the student table for full imports.
+
+``import_scores --clear`` no longer empties the live table. It loads into a
+shadow table that only has the primary key and the unique ``sbd`` key the
+loaders need to skip duplicates, so the bulk load does not maintain the
+secondary indexes row by row. The indexes are built once the data is in,
+and the statistics are computed from the shadow. Then ``swap()`` drops the
+live table and renames the shadow in its place under the original index and
+constraint names. Readers see the complete old dataset until the swap
+commits and the complete new one after it, never a half-loaded table. An
+import that fails leaves the shadow behind for ``--resume`` to keep loading.
+
+Each backend swaps the way it can:
+
+- PostgreSQL builds every index on the shadow under a temporary name. The
+  swap only drops, renames and renames back, all in one transaction, so
+  readers wait for a few milliseconds at most.
+- SQLite cannot rename an index, so it builds the secondary indexes inside
+  the swap transaction, after the rename.
+- MySQL swaps both names in one atomic ``RENAME TABLE``. DDL commits on its
+  own there, so the statistics written with the swap land just after it.
+  The foreign key constraint is added back after the rename.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Student
+
+
+class TableSwap:
+    """SQLite: the shadow is created from the live table's own CREATE TABLE"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.connection = connections[using]
+        self.table = Student._meta.db_table
+        self.shadow = f'{self.table}_shadow'
+        self.indexes = []
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def execute(self, *statements):
+        with self.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def shadow_exists(self):
+        with self.connection.cursor() as cursor:
+            return self.shadow in self.connection.introspection.table_names(cursor)
+
+    def create_shadow(self, resume=False):
+        """Create an empty shadow table, or keep the one an interrupted import was loading.
+
+        Without resume, a shadow left behind by a failed import is dropped first.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT type, sql FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL",
+                [self.table],
+            )
+            definitions = cursor.fetchall()
+        table_sql = next(sql for kind, sql in definitions if kind == 'table')
+        # Explicit indexes are recreated as they are under the live table's name
+        self.indexes = [sql for kind, sql in definitions if kind == 'index']
+        if resume:
+            return
+        self.execute(
+            f'DROP TABLE IF EXISTS {self.quote(self.shadow)}',
+            table_sql.replace(self.quote(self.table), self.quote(self.shadow), 1),
+        )
+
+    def build_indexes(self):
+        """Build the secondary indexes on the loaded shadow table"""
+        # Done by swap(), under their own names
+
+    def swap(self):
+        """Replace the live table with the shadow; run inside a transaction"""
+        self.execute(
+            f'DROP TABLE {self.quote(self.table)}',
+            f'ALTER TABLE {self.quote(self.shadow)} RENAME TO {self.quote(self.table)}',
+            *self.indexes,
+            f'ANALYZE {self.quote(self.table)}',
+        )
+
+
+class PostgreSQLTableSwap(TableSwap):
+    """PostgreSQL: everything is built on the shadow under temporary names"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        super().__init__(using)
+        # (statement template, temporary name, live name) applied after the rename
+        self.renames = []
+
+    def temporary_name(self, template, name):
+        temporary = f'{self.shadow}_{len(self.renames)}'
+        self.renames.append((template, temporary, name))
+        return temporary
+
+    def fetch(self, sql):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [self.quote(self.table)])
+            return cursor.fetchall()
+
+    def constraints(self, kinds):
+        return self.fetch(
+            f"SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            f"WHERE conrelid = %s::regclass AND contype IN ({', '.join(repr(kind) for kind in kinds)}) "
+            f"ORDER BY conname"
+        )
+
+    def create_shadow(self, resume=False):
+        self.renames = []
+        # Primary and unique keys: the loaders rely on them to skip duplicates.
+        # Their temporary names follow this order, so a resumed import finds them
+        rename = 'ALTER TABLE {table} RENAME CONSTRAINT {temporary} TO {name}'
+        keys = [
+            f'ALTER TABLE {self.quote(self.shadow)} '
+            f'ADD CONSTRAINT {self.quote(self.temporary_name(rename, name))} {definition}'
+            for name, definition in self.constraints('pu')
+        ]
+        if resume:
+            return
+        self.execute(
+            f'DROP TABLE IF EXISTS {self.quote(self.shadow)}',
+            f'CREATE TABLE {self.quote(self.shadow)} (LIKE {self.quote(self.table)} '
+            f'INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS)',
+            *keys,
+        )
+
+    def build_indexes(self):
+        indexes = self.fetch(
+            "SELECT i.relname, pg_get_indexdef(x.indexrelid) FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT EXISTS ("
+            "SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid AND c.conrelid = x.indrelid"
+            ") ORDER BY i.relname"
+        )
+        # pg_get_indexdef keeps operator classes, like varchar_pattern_ops on the _like indexes
+        rename = 'ALTER INDEX {temporary} RENAME TO {name}'
+        statements = [
+            re.sub(
+                r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ ',
+                lambda match: (
+                    f'{match[1]} {self.quote(self.temporary_name(rename, name))} ON {self.quote(self.shadow)} '
+                ),
+                definition,
+            )
+            for name, definition in indexes
+        ]
+        rename = 'ALTER TABLE {table} RENAME CONSTRAINT {temporary} TO {name}'
+        statements += [
+            f'ALTER TABLE {self.quote(self.shadow)} '
+            f'ADD CONSTRAINT {self.quote(self.temporary_name(rename, name))} {definition}'
+            for name, definition in self.constraints('fx')
+        ]
+        self.execute(*statements, f'ANALYZE {self.quote(self.shadow)}')
+
+    def identity_sequence(self, table):
+        """Name of the sequence behind the primary key, or None"""
+        column = Student._meta.pk.column
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT relname FROM pg_class WHERE oid = pg_get_serial_sequence(%s, %s)::regclass',
+                [self.quote(table), column],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def swap(self):
+        sequence = self.identity_sequence(self.table)
+        self.execute(
+            f'DROP TABLE {self.quote(self.table)}',
+            f'ALTER TABLE {self.quote(self.shadow)} RENAME TO {self.quote(self.table)}',
+            *[
+                template.format(
+                    table=self.quote(self.table), temporary=self.quote(temporary), name=self.quote(name)
+                )
+                for template, temporary, name in self.renames
+            ],
+        )
+        shadow_sequence = self.identity_sequence(self.table)
+        if sequence and shadow_sequence and shadow_sequence != sequence:
+            self.execute(f'ALTER SEQUENCE {self.quote(shadow_sequence)} RENAME TO {self.quote(sequence)}')
+
+
+class MySQLTableSwap(TableSwap):
+    """MySQL: index names are per table, so the shadow keeps the live ones"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        super().__init__(using)
+        self.old = f'{self.table}_old'
+
+    def get_constraints(self, table):
+        with self.connection.cursor() as cursor:
+            return self.connection.introspection.get_constraints(cursor, table)
+
+    def create_shadow(self, resume=False):
+        self.indexes = [
+            (name, constraint['columns'], constraint['orders'] or [])
+            for name, constraint in self.get_constraints(self.table).items()
+            if constraint['index'] and not constraint['unique'] and not constraint['primary_key']
+        ]
+        if resume:
+            return
+        # LIKE copies every index but no foreign key
+        self.execute(
+            f'DROP TABLE IF EXISTS {self.quote(self.shadow)}, {self.quote(self.old)}',
+            f'CREATE TABLE {self.quote(self.shadow)} LIKE {self.quote(self.table)}',
+        )
+        if self.indexes:
+            self.execute(
+                f'ALTER TABLE {self.quote(self.shadow)} '
+                + ', '.join(f'DROP INDEX {self.quote(name)}' for name, _, _ in self.indexes)
+            )
+
+    def build_indexes(self):
+        statements = []
+        if self.indexes:
+            statements.append(
+                f'ALTER TABLE {self.quote(self.shadow)} ' + ', '.join(
+                    f'ADD INDEX {self.quote(name)} (' + ', '.join(
+                        f'{self.quote(column)} {order}'.rstrip()
+                        for column, order in zip(columns, orders or [''] * len(columns))
+                    ) + ')'
+                    for name, columns, orders in self.indexes
+                )
+            )
+        self.execute(*statements, f'ANALYZE TABLE {self.quote(self.shadow)}')
+
+    def swap(self):
+        foreign_keys = [
+            (name, constraint['columns'], constraint['foreign_key'])
+            for name, constraint in self.get_constraints(self.table).items()
+            if constraint['foreign_key']
+        ]
+        self.execute(
+            f'RENAME TABLE {self.quote(self.table)} TO {self.quote(self.old)}, '
+            f'{self.quote(self.shadow)} TO {self.quote(self.table)}',
+            f'DROP TABLE {self.quote(self.old)}',
+        )
+        if foreign_keys:
+            # The rows were loaded with resolved language ids; skip re-checking them
+            self.execute(
+                'SET foreign_key_checks = 0',
+                f'ALTER TABLE {self.quote(self.table)} ' + ', '.join(
+                    f'ADD CONSTRAINT {self.quote(name)} FOREIGN KEY ({self.quote(columns[0])}) '
+                    f'REFERENCES {self.quote(target_table)} ({self.quote(target_column)})'
+                    for name, columns, (target_table, target_column) in foreign_keys
+                ),
+                'SET foreign_key_checks = 1',
+            )
+
+
+SWAPS = {
+    'postgresql': PostgreSQLTableSwap,
+    'mysql': MySQLTableSwap,
+}
+
+
+def get_table_swap(using=DEFAULT_DB_ALIAS):
+    """Return the student table swap for the connection's backend"""
+    swap_class = SWAPS.get(connections[using].vendor, TableSwap)
+    return swap_class(using=using)
@@ -1,3 +1,1304 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils.cache import patch_cache_control
+
+from gscores import urls as root_urls
+from gscores.middleware import ConnectionTimingMiddleware, ReplicaMiddleware, time_connections
+
+from . import checkpoints, distributions, routers, urls, views
+from .cache import MISSING, bump_dataset_version, dataset_version
+from .dataset import get_dataset_summary, refresh_dataset_summary
+from .management.commands import import_scores
+from .distributions import compute_distributions, get_percentile_tables, student_percentiles
+from .leaderboards import build_leaderboards
+from .loaders import BulkLoader, LOADERS, get_loader
+from .lookup import NOT_FOUND, LookupCache, local_cache, lookup_student
+from .models import Combination, DatasetSummary, ForeignLanguage, ImportCheckpoint, ScoreStatistics, Student, Subject
+from .parsers import iter_dataframe_chunks, iter_parsed_chunks, read_lines
+from .routers import ReplicaRouter, use_primary
+from .snapshot import discard_snapshot, write_snapshot
+from .statistics import compute_level_counts, load_level_counts, refresh_statistics
+from .swap import get_table_swap
+from .views import group_a_summary, top_students_by
+
+
+def score_row(sbd, language='N1', **scores):
+    """A CSV record in the layout of the import file"""
+    return [sbd, *[scores.get(field, '') for field in Student.SCORE_FIELDS], language]
+
+
+def clear_caches():
+    """Empty the shared cache and the per-process lookup and percentile caches"""
+    cache.clear()
+    local_cache.clear()
+    distributions._tables = (None, None)
+
+
+class ImportTestMixin:
+    """Runs import_scores on CSV files written to a temporary directory"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(SNAPSHOT_DIR=os.path.join(directory.name, 'snapshots'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['sbd', *Student.SCORE_FIELDS, 'ma_ngoai_ngu'])
+            writer.writerows(rows)
+        return path
+
+    def import_file(self, path, **options):
+        output = io.StringIO()
+        call_command('import_scores', file=path, stdout=output, **{'workers': 1, **options})
+        return output.getvalue()
+
+
+class StaffOnlyViewTests(TestCase):
+    """Exports serve the whole student table and cache stats are internal, so only staff see them"""
+
+    def setUp(self):
+        Student.objects.create(sbd='01000001', toan=8.2, ngu_van=7.5)
+
+    def test_anonymous_users_are_sent_to_the_admin_login(self):
+        for name in ['export_students', 'export_statistics', 'cache_stats_api']:
+            url = reverse(f'scores:{name}')
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response['Location'].startswith(reverse('admin:login')))
+
+    def test_non_staff_users_are_refused(self):
+        User.objects.create_user('student', password='secret')
+        self.client.login(username='student', password='secret')
+        response = self.client.get(reverse('scores:export_students'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_staff_can_export_students(self):
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        response = self.client.get(reverse('scores:export_students'))
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('01000001,8.2,7.5', content)
+
+    def test_staff_can_read_cache_stats(self):
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        response = self.client.get(reverse('scores:cache_stats_api'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('dataset_version', response.json())
+
+
+class ScoreDistributionTests(TestCase):
+    def test_foreign_language_bins_follow_its_fifth_of_a_point_grid(self):
+        Student.objects.create(sbd='01000001', ngoai_ngu=7.4)
+        Student.objects.create(sbd='01000002', ngoai_ngu=7.6)
+        summary = compute_distributions(['ngoai_ngu'])['ngoai_ngu']
+        self.assertEqual(summary['step'], 0.2)
+        self.assertEqual(len(summary['histogram']), 51)
+        self.assertEqual(summary['histogram'][37], 1)
+        self.assertEqual(summary['histogram'][38], 1)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SNAPSHOT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_student_validation_rejects_malformed_sbd(self):
+        for sbd in ['0100000', '0100000a', '０１０００００１']:
+            with self.assertRaises(ValidationError):
+                Student(sbd=sbd).full_clean()
+        Student(sbd='01000001').full_clean()
+
+    def test_rows_saved_without_validation_do_not_break_the_snapshot(self):
+        Student.objects.create(sbd='01000002', toan=9, vat_li=9, hoa_hoc=9)
+        Student.objects.create(sbd='abc', toan=9, vat_li=9, hoa_hoc=9.5)
+        snapshot = write_snapshot()
+        self.addCleanup(discard_snapshot, snapshot)
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual(
+            [snapshot.format_sbd(index) for index in range(len(snapshot))], ['01000002', 'abc']
+        )
+        leaderboard = build_leaderboards(snapshot=snapshot)['A00']
+        self.assertEqual([entry['sbd'] for entry in leaderboard], ['abc', '01000002'])
+        self.assertEqual(leaderboard, build_leaderboards()['A00'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=10)
+class ReplicaPinTests(SimpleTestCase):
+    """Only a client's own changes keep it on the primary"""
+
+    def respond(self, method, *written_models):
+        def view(request):
+            for model in written_models:
+                ReplicaRouter().db_for_write(model)
+            response = HttpResponse()
+            patch_cache_control(response, public=True, max_age=60)
+            return response
+
+        request = getattr(RequestFactory(), method)('/statistics/')
+        return ReplicaMiddleware(view)(request)
+
+    def test_writing_students_pins_the_client_to_the_primary(self):
+        response = self.respond('post', Student)
+        self.assertIn(ReplicaMiddleware.cookie_name, response.cookies)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+    def test_rebuilding_statistics_on_a_get_does_not_pin(self):
+        response = self.respond('get', ScoreStatistics)
+        self.assertNotIn(ReplicaMiddleware.cookie_name, response.cookies)
+        self.assertIn('public', response['Cache-Control'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_HEALTH_INTERVAL=0)
+class ReplicaRouterTests(SimpleTestCase):
+    """Reads go to a healthy replica, with the primary as fallback"""
+
+    def setUp(self):
+        routers._checks.clear()
+        self.addCleanup(routers._checks.clear)
+        # Outside a transaction on the primary, which is up to dataset version 3
+        connections = mock.MagicMock()
+        connections.__getitem__.return_value.in_atomic_block = False
+        for target, value in [('connections', connections), ('dataset_version', mock.Mock(return_value=3))]:
+            patcher = mock.patch.object(routers, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def read_alias(self, replica_version):
+        with mock.patch.object(routers, 'replica_version', return_value=replica_version):
+            return ReplicaRouter().db_for_read(Student)
+
+    def test_reads_go_to_a_healthy_replica(self):
+        self.assertEqual(self.read_alias(3), 'replica1')
+
+    def test_reads_fall_back_to_the_primary_when_the_replica_is_down_or_behind(self):
+        with self.assertLogs('gscores.db', 'WARNING'):
+            self.assertEqual(self.read_alias(None), 'default')
+        # Answering again, but without the latest import yet
+        with self.assertLogs('gscores.db', 'INFO'):
+            self.assertEqual(self.read_alias(2), 'default')
+        self.assertEqual(self.read_alias(3), 'replica1')
+
+    def test_writes_and_primary_blocks_use_the_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_write(Student), 'default')
+        with use_primary():
+            self.assertEqual(self.read_alias(3), 'default')
+
+    def test_client_reads_the_primary_after_writing(self):
+        reads = []
+
+        def view(request):
+            if request.method == 'POST':
+                ReplicaRouter().db_for_write(Student)
+            reads.append(ReplicaRouter().db_for_read(Student))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        factory = RequestFactory()
+        with mock.patch.object(routers, 'replica_version', return_value=3):
+            response = middleware(factory.post('/students/'))
+            pinned = factory.get('/lookup/')
+            pinned.COOKIES = {name: cookie.value for name, cookie in response.cookies.items()}
+            middleware(pinned)
+            middleware(factory.get('/lookup/'))
+        self.assertEqual(reads, ['replica1', 'default', 'replica1'])
+
+
+class UpsertImportTests(ImportTestMixin, TestCase):
+    """--upsert writes only the students whose score hash changed"""
+
+    def setUp(self):
+        super().setUp()
+        self.rows = [
+            score_row('01000001', toan=8.2, ngu_van=7.5, ngoai_ngu=9.2),
+            score_row('01000002', toan=6, vat_li=7.25, hoa_hoc=5.5),
+            score_row('01000003', ngu_van=4.75, lich_su=6.5, dia_li=7, language=''),
+        ]
+        self.import_file(self.write_csv('scores.csv', self.rows))
+
+    def stored(self):
+        return {
+            sbd: rest for sbd, *rest in Student.objects.values_list(
+                'sbd', 'score_hash', 'updated_at', *Student.SCORE_FIELDS
+            )
+        }
+
+    def test_only_the_changed_row_is_rewritten(self):
+        before = self.stored()
+        self.rows[1] = score_row('01000002', toan=6.4, vat_li=7.25, hoa_hoc=5.5)
+        output = self.import_file(self.write_csv('changed.csv', self.rows), upsert=True)
+
+        self.assertIn('0 inserted, 1 updated, 2 unchanged', output)
+        after = self.stored()
+        self.assertEqual(after['01000001'], before['01000001'])
+        self.assertEqual(after['01000003'], before['01000003'])
+        self.assertNotEqual(after['01000002'][0], before['01000002'][0])
+        student = Student.objects.get(sbd='01000002')
+        self.assertEqual((student.toan, student.vat_li, student.hoa_hoc), (6.4, 7.25, 5.5))
+        self.assertEqual(student.group_a_total, 19.15)
+
+    def test_an_unchanged_file_writes_nothing(self):
+        before = self.stored()
+        version = DatasetSummary.objects.get().version
+        with CaptureQueriesContext(connection) as queries:
+            output = self.import_file(self.write_csv('same.csv', self.rows), upsert=True)
+
+        self.assertIn('0 inserted, 0 updated, 3 unchanged', output)
+        self.assertEqual(self.stored(), before)
+        table = Student._meta.db_table
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if table in query['sql'] and query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(DatasetSummary.objects.get().version, version)
+
+
+class ScaledScoreFieldTests(TestCase):
+    """Scores are stored as hundredths but read and queried in score units"""
+
+    def setUp(self):
+        for sbd, toan in [('01000001', 7.5), ('01000002', 7.75), ('01000003', 8), ('01000004', None)]:
+            Student.objects.create(sbd=sbd, toan=toan)
+
+    def raw_toan(self, sbd):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT toan FROM {Student._meta.db_table} WHERE sbd = %s', [sbd])
+            return cursor.fetchone()[0]
+
+    def test_scores_round_trip_through_hundredths(self):
+        self.assertEqual(self.raw_toan('01000002'), 775)
+        self.assertEqual(Student.objects.get(sbd='01000002').toan, 7.75)
+        Student.objects.filter(sbd='01000001').update(toan=6.05)
+        self.assertEqual(self.raw_toan('01000001'), 605)
+        self.assertEqual(Student.objects.get(sbd='01000001').toan, 6.05)
+
+    def test_range_lookups_compare_exact_scores_at_bin_edges(self):
+        def sbds(**filters):
+            return sorted(Student.objects.filter(**filters).values_list('sbd', flat=True))
+
+        self.assertEqual(sbds(toan__gte=7.75), ['01000002', '01000003'])
+        self.assertEqual(sbds(toan__lt=7.75), ['01000001'])
+        self.assertEqual(sbds(toan__gte=7.5, toan__lt=8), ['01000001', '01000002'])
+        self.assertEqual(sbds(toan=8), ['01000003'])
+
+    def test_missing_scores_stay_null(self):
+        self.assertIsNone(self.raw_toan('01000004'))
+        self.assertIsNone(Student.objects.get(sbd='01000004').toan)
+        self.assertEqual(Student.objects.filter(toan__isnull=True).count(), 1)
+        self.assertEqual(Student.objects.filter(toan__lt=10).count(), 3)
+        Student.objects.filter(sbd='01000004').update(toan=None)
+        self.assertIsNone(self.raw_toan('01000004'))
+
+
+class TableSwapTests(ImportTestMixin, TransactionTestCase):
+    """--clear loads a shadow table and swaps it in whole, or not at all"""
+    # The subjects and combinations come from data migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        super().setUp()
+        self.table = Student._meta.db_table
+        self.import_file(self.write_csv('old.csv', [
+            score_row('01000001', toan=5, vat_li=5, hoa_hoc=5),
+            score_row('01000002', toan=6, vat_li=6, hoa_hoc=6),
+        ]))
+        self.new_file = self.write_csv('new.csv', [
+            score_row(f'0200000{number}', toan=number, vat_li=7, hoa_hoc=8) for number in range(1, 6)
+        ])
+
+    def constraints(self):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(cursor, self.table)
+
+    def test_clear_swaps_in_the_new_data_with_indexes_and_constraints(self):
+        constraints = self.constraints()
+        version = DatasetSummary.objects.get().version
+        self.import_file(self.new_file, clear=True, batch_size=2)
+
+        self.assertEqual(
+            sorted(Student.objects.values_list('sbd', flat=True)), [f'0200000{number}' for number in range(1, 6)]
+        )
+        self.assertEqual(self.constraints(), constraints)
+        self.assertIn('student_group_a_rank_idx', constraints)
+        self.assertFalse(get_table_swap().shadow_exists())
+        self.assertEqual(DatasetSummary.objects.get().version, version + 1)
+        self.assertEqual(ScoreStatistics.objects.get(subject_name=ScoreStatistics.OVERALL).total_students, 5)
+
+    def test_a_failed_load_leaves_the_live_table_untouched(self):
+        before = list(Student.objects.order_by('sbd').values_list('sbd', 'toan', 'score_hash'))
+        version = DatasetSummary.objects.get().version
+        loader_class = LOADERS.get(connection.vendor, BulkLoader)
+        load_chunk = loader_class.load_chunk
+        calls = []
+
+        def fail_second_chunk(loader, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            load_chunk(loader, rows)
+
+        with mock.patch.object(loader_class, 'load_chunk', fail_second_chunk):
+            with self.assertRaisesMessage(RuntimeError, 'connection lost'):
+                self.import_file(self.new_file, clear=True, batch_size=2)
+
+        self.assertEqual(list(Student.objects.order_by('sbd').values_list('sbd', 'toan', 'score_hash')), before)
+        self.assertEqual(DatasetSummary.objects.get().version, version)
+        # Kept with the first batch for --resume
+        swap = get_table_swap()
+        self.addCleanup(swap.execute, f'DROP TABLE IF EXISTS {swap.shadow}')
+        self.assertTrue(swap.shadow_exists())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {swap.shadow}')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class ReadLinesTests(SimpleTestCase):
+    def test_reading_resumes_at_the_byte_offset_of_a_chunk(self):
+        with tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as file:
+            # Multi-byte characters and CRLF endings, so characters and bytes differ
+            file.write('sbd,name\r\n'.encode('utf-8'))
+            for number in range(1, 8):
+                file.write(f'0100000{number},Ngữ Văn {number}\r\n'.encode('utf-8'))
+        self.addCleanup(os.unlink, file.name)
+
+        chunks = list(read_lines(file.name, 3))
+        self.assertEqual([(first_row, len(lines)) for _, first_row, lines, _ in chunks], [(1, 3), (4, 3), (7, 1)])
+        self.assertEqual(chunks[-1][3], os.path.getsize(file.name))
+
+        _, first_row, lines, offset = chunks[0]
+        resumed = list(read_lines(file.name, 3, offset, first_row + len(lines) - 1))
+        self.assertEqual(resumed, chunks[1:])
+
+
+class DataFrameChunkTests(ImportTestMixin, SimpleTestCase):
+    """The pandas engine validates whole chunks and yields the rows the other parsers do"""
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.write_csv('scores.csv', [
+            score_row('01000001', toan=8.2, ngu_van=7.5, ngoai_ngu=9.2),
+            score_row('01000002', toan='abc', ngu_van=6, language=''),
+            score_row('０１０００００３', toan=9),
+            score_row('01000004', toan=11, vat_li=7),
+            score_row('0100005', toan=5),
+            score_row('01000006', toan=' 7.25 ', vat_li=-1),
+            score_row('01000007', dia_li=4.5),
+        ])
+        self.bounds = {field: (0, 10) for field in Student.SCORE_FIELDS}
+
+    def test_non_numeric_scores_load_as_missing_and_invalid_rows_are_rejected(self):
+        chunks = list(iter_dataframe_chunks(self.path, Student.SCORE_FIELDS, self.bounds, 8, chunk_size=4))
+        self.assertEqual([(chunk.row, len(chunk.rows)) for chunk in chunks], [(4, 2), (7, 1)])
+        rows = [row for chunk in chunks for row in chunk.rows]
+        self.assertEqual([row[0] for row in rows], ['01000001', '01000002', '01000007'])
+        self.assertEqual(rows[1][1:3], (None, 6.0))
+        self.assertIsNone(rows[1][-1])
+        self.assertEqual(
+            [(number, reason) for chunk in chunks for number, reason, _ in chunk.rejected],
+            [(3, 'invalid sbd'), (4, 'toan out of range'), (5, 'invalid sbd'), (6, 'vat_li out of range')],
+        )
+        self.assertEqual(chunks[0].rejected[0][2][0], '０１０００００３')
+
+    def test_accepted_rows_match_the_csv_parser(self):
+        accepted = {'01000001', '01000002', '01000007'}
+        expected = [
+            row for chunk in iter_parsed_chunks(self.path, Student.SCORE_FIELDS)
+            for row in chunk.rows if row[0] in accepted
+        ]
+        rows = [
+            row for chunk in iter_dataframe_chunks(self.path, Student.SCORE_FIELDS, self.bounds, 8)
+            for row in chunk.rows
+        ]
+        self.assertEqual(rows, expected)
+
+
+class ResumeImportTests(ImportTestMixin, TransactionTestCase):
+    """An interrupted import resumes after its last committed batch"""
+    serialized_rollback = True
+
+    def setUp(self):
+        super().setUp()
+        rows = [score_row(f'{1000000 + number:08d}', toan=number, ngu_van=5) for number in range(1, 11)]
+        # Rows 2 and 8 are rejected: one in a committed batch, one in the batch that fails
+        rows[1][0], rows[7][0] = 'abc', '0100000x'
+        self.path = self.write_csv('scores.csv', rows)
+        self.expected = sorted(row[0] for row in rows if row[0].isdigit())
+
+    def interrupted_import(self, **options):
+        """Run an import that dies while committing its third batch of three rows"""
+        calls = []
+
+        def advance(checkpoint, chunk, rejected_size):
+            calls.append(chunk)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return checkpoints.advance(checkpoint, chunk, rejected_size)
+
+        with mock.patch.object(import_scores, 'advance', advance), self.assertRaises(KeyboardInterrupt):
+            self.import_file(self.path, batch_size=3, **options)
+
+    def test_resume_loads_every_row_once(self):
+        for engine in ['orm', 'fast', 'pandas']:
+            with self.subTest(engine=engine):
+                Student.objects.all().delete()
+                self.interrupted_import(engine=engine)
+                self.assertEqual(Student.objects.count(), 5)
+
+                output = self.import_file(self.path, batch_size=3, engine=engine, resume=True)
+                self.assertIn('at row 7', output)
+                self.assertEqual(sorted(Student.objects.values_list('sbd', flat=True)), self.expected)
+                checkpoint = ImportCheckpoint.objects.first()
+                self.assertIsNotNone(checkpoint.completed_at)
+                self.assertEqual(checkpoint.counts, {'imported': 8, 'rejected': 2})
+
+                with open(f'{self.path}.rejected.csv', encoding='utf-8', newline='') as file:
+                    rejected = list(csv.reader(file))
+                self.assertEqual(rejected[0], ['sbd', *Student.SCORE_FIELDS, 'ma_ngoai_ngu', 'row', 'reason'])
+                self.assertEqual(
+                    [(record[0], record[2], record[-2], record[-1]) for record in rejected[1:]],
+                    [('abc', '5', '2', 'invalid sbd'), ('0100000x', '5', '8', 'invalid sbd')],
+                )
+
+    def test_resuming_a_clear_import_swaps_in_every_row(self):
+        self.interrupted_import(clear=True, engine='fast')
+        self.assertEqual(Student.objects.count(), 0)
+        self.import_file(self.path, batch_size=3, clear=True, engine='fast', resume=True)
+        self.assertEqual(sorted(Student.objects.values_list('sbd', flat=True)), self.expected)
+        self.assertFalse(get_table_swap().shadow_exists())
+
+    def test_resume_refuses_a_changed_or_finished_file(self):
+        self.interrupted_import()
+        with open(self.path, 'a', encoding='utf-8', newline='') as file:
+            csv.writer(file).writerow(score_row('01000011', toan=9))
+        with self.assertRaisesMessage(CommandError, 'changed since'):
+            self.import_file(self.path, resume=True)
+
+        self.import_file(self.path)
+        with self.assertRaisesMessage(CommandError, 'No unfinished append import'):
+            self.import_file(self.path, resume=True)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CombinationLeaderboardTests(TestCase):
+    """Blocks with a stored total are ranked from its index, the others from the cached leaderboards"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for number, (toan, hoa_hoc, sinh_hoc) in enumerate(
+            [(8, 7, 9), (9, 9, 6), (7, 9, 8), (8, 8, 8.5), (5, 6, None)], start=1
+        ):
+            Student.objects.create(
+                sbd=f'{1000000 + number:08d}', toan=toan, hoa_hoc=hoa_hoc, sinh_hoc=sinh_hoc, ngu_van=number
+            )
+
+    def leaderboard(self, block):
+        response = self.client.get(reverse('scores:leaderboard', args=[block]))
+        self.assertEqual(response.status_code, 200)
+        return [
+            {key: entry[key] for key in ('sbd', 'total', 'scores')}
+            for entry in response.context['top_students']
+        ]
+
+    def test_stored_total_ranking_matches_the_full_scan(self):
+        self.assertEqual(Student.objects.get(sbd='01000004').group_b_total, 24.5)
+        with mock.patch('scores.views.get_leaderboards') as get_leaderboards:
+            entries = self.leaderboard('b00')
+        get_leaderboards.assert_not_called()
+        self.assertEqual(
+            [entry['sbd'] for entry in entries], ['01000004', '01000001', '01000002', '01000003']
+        )
+        self.assertEqual(entries, build_leaderboards()['B00'])
+
+    def test_a_block_without_a_stored_total_uses_the_cached_leaderboard(self):
+        combination = Combination.objects.get(code='B00')
+        combination.subjects.set(Subject.objects.filter(code__in=['toan', 'sinh_hoc', 'ngu_van']))
+        entries = self.leaderboard('b00')
+        self.assertEqual(
+            [entry['sbd'] for entry in entries], ['01000004', '01000001', '01000003', '01000002']
+        )
+        self.assertEqual(entries, build_leaderboards()['B00'])
+
+
+@override_settings(SNAPSHOT_ENABLED=False)
+class StudentSignalTests(TestCase):
+    """Saving or deleting a student outside an import drops the stored statistics"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        Student.objects.create(sbd='01000001', toan=8.5, ngu_van=5)
+        Student.objects.create(sbd='01000002', toan=3)
+
+    def test_writes_invalidate_the_stored_counts(self):
+        self.assertEqual(load_level_counts()['toan']['excellent'], 1)
+        self.assertTrue(ScoreStatistics.objects.exists())
+        version = dataset_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Student.objects.create(sbd='01000003', toan=9)
+        self.assertFalse(ScoreStatistics.objects.exists())
+        self.assertGreater(dataset_version(), version)
+        self.assertEqual(load_level_counts()['toan']['excellent'], 2)
+
+        student.toan = 7
+        student.save()
+        counts = load_level_counts()['toan']
+        self.assertEqual((counts['excellent'], counts['good']), (1, 1))
+
+        student.delete()
+        counts = load_level_counts()
+        self.assertEqual((counts['toan']['good'], counts['toan']['total']), (0, 2))
+        self.assertEqual(counts[ScoreStatistics.OVERALL]['total'], 2)
+
+
+class ConnectionTimingTests(SimpleTestCase):
+    """Connection setups are timed by a one-time class patch and counted per process"""
+
+    class Wrapper:
+        alias = 'default'
+
+        def connect(self):
+            pass
+
+    def test_requests_that_open_a_connection_are_logged(self):
+        time_connections(self.Wrapper)
+        requests = iter([True, False])
+
+        def view(request):
+            if next(requests):
+                self.Wrapper().connect()
+            return HttpResponse()
+
+        middleware = ConnectionTimingMiddleware(view)
+        with self.assertLogs('gscores.db', 'INFO') as logs:
+            middleware(RequestFactory().get('/lookup/'))
+            middleware(RequestFactory().get('/lookup/'))
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('GET /lookup/ opened default', logs.output[0])
+        self.assertIn('1 of 1 requests', logs.output[0])
+        self.assertEqual((middleware.counts.connected, middleware.counts.requests), (1, 2))
+
+    def test_backend_classes_are_patched_once(self):
+        ConnectionTimingMiddleware(lambda request: HttpResponse())
+        connect = type(connections['default']).connect
+        ConnectionTimingMiddleware(lambda request: HttpResponse())
+        self.assertIs(type(connections['default']).connect, connect)
+        self.assertTrue(type(connections['default']).connections_timed)
+
+    def test_counts_are_exact_across_threads(self):
+        middleware = ConnectionTimingMiddleware(lambda request: HttpResponse())
+
+        def record():
+            for number in range(1000):
+                middleware.counts.record(number % 2 == 0)
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((middleware.counts.connected, middleware.counts.requests), (4000, 8000))
+
+
+class NativeLoaderTests(ImportTestMixin, TestCase):
+    """The fast engine's bulk loader stores exactly what the ORM import does"""
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.write_csv('scores.csv', [
+            score_row('01000001', toan=8.2, ngu_van=7.5, ngoai_ngu=9.2, vat_li=6.75, hoa_hoc=7),
+            score_row('01000002', toan=6, vat_li=7.25, hoa_hoc=5.5, sinh_hoc=4.25, language=''),
+            score_row('01000003', ngu_van=4.75, lich_su=6.5, dia_li=7, gdcd=9.5, language='N6'),
+            score_row('01000004', toan='x', ngu_van=10, ngoai_ngu=0, language='N1'),
+            score_row('0100005', toan=5),
+        ])
+
+    def stored(self):
+        return list(
+            Student.objects.order_by('sbd').values_list(
+                'sbd', *Student.SCORE_FIELDS, *Student.GROUP_TOTAL_FIELDS, 'ma_ngoai_ngu__code', 'score_hash'
+            )
+        )
+
+    def test_fast_engine_matches_the_orm_engine(self):
+        self.import_file(self.path, engine='orm')
+        expected = self.stored()
+        self.assertEqual(len(expected), 4)
+        self.assertEqual(expected[0][-2], 'N1')
+
+        for workers in [1, 2]:
+            with self.subTest(workers=workers):
+                Student.objects.all().delete()
+                output = self.import_file(self.path, engine='fast', workers=workers, batch_size=2)
+                self.assertIn('Successfully imported 4 student records', output)
+                self.assertEqual(self.stored(), expected)
+
+    def test_loader_inserts_a_chunk_in_one_statement_and_skips_existing_rows(self):
+        Student.objects.create(sbd='01000002', toan=1)
+        language, _ = ForeignLanguage.objects.get_or_create(code='N1', defaults={'name': 'English'})
+        blank = [None] * (len(Student.SCORE_FIELDS) - 1)
+        rows = [('01000001', 8.2, *blank, 'N1'), ('01000002', 9.0, *blank, None)]
+
+        with get_loader({'N1': language.pk}) as loader, CaptureQueriesContext(connection) as queries:
+            loader.load(rows)
+        inserts = [query for query in queries.captured_queries if 'INSERT' in query['sql'].upper()]
+        self.assertEqual(len(inserts), 1)
+        student = Student.objects.get(sbd='01000001')
+        self.assertEqual((student.toan, student.ma_ngoai_ngu_id), (8.2, language.pk))
+        self.assertEqual(Student.objects.get(sbd='01000002').toan, 1)
+
+
+class LanguageMapTests(ImportTestMixin, TestCase):
+    """Language codes resolve through an in-memory map, not a query per row"""
+
+    def language_queries(self, count, languages):
+        rows = [
+            score_row(f'{1000000 + number:08d}', toan=5, language=languages[number % len(languages)])
+            for number in range(count)
+        ]
+        path = self.write_csv(f'scores{count}.csv', rows)
+        table = ForeignLanguage._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            self.import_file(path, engine='orm', batch_size=10)
+        Student.objects.all().delete()
+        return [query['sql'] for query in queries.captured_queries if table in query['sql']]
+
+    def test_language_queries_do_not_grow_with_the_rows(self):
+        # The first import creates the standard languages
+        self.language_queries(1, ['N1'])
+        small = self.language_queries(10, ['N1', 'N6', ''])
+        large = self.language_queries(100, ['N1', 'N6', ''])
+        self.assertEqual(len(large), len(small))
+
+    def test_new_codes_are_created_once(self):
+        self.language_queries(30, ['N1', 'N7', 'N8'])
+        self.assertEqual(
+            list(ForeignLanguage.objects.filter(code__in=['N7', 'N8']).values_list('name', flat=True)),
+            ['N7', 'N8'],
+        )
+        self.import_file(self.write_csv('again.csv', [score_row('01000099', language='N7')]))
+        self.assertEqual(Student.objects.get(sbd='01000099').ma_ngoai_ngu.code, 'N7')
+        self.assertEqual(ForeignLanguage.objects.filter(code='N7').count(), 1)
+
+
+class PandasImportTests(ImportTestMixin, TestCase):
+    """The pandas engine loads what the fast engine does and lists what it rejects"""
+
+    def test_pandas_engine_matches_the_fast_engine(self):
+        path = self.write_csv('scores.csv', [
+            score_row('01000001', toan=8.2, ngu_van=7.5, ngoai_ngu=9.2),
+            score_row('01000002', toan='abc', vat_li=6, hoa_hoc=7, language=''),
+            score_row('01000003', toan=10.5),
+            score_row('０１０００００４', toan=9),
+            score_row('01000005', sinh_hoc=3.25, language='N7'),
+        ])
+        columns = ['sbd', *Student.SCORE_FIELDS, *Student.GROUP_TOTAL_FIELDS, 'ma_ngoai_ngu__code', 'score_hash']
+
+        output = self.import_file(path, engine='pandas')
+        self.assertIn('Rejected 2 rows', output)
+        loaded = list(Student.objects.order_by('sbd').values_list(*columns))
+        self.assertEqual([row[0] for row in loaded], ['01000001', '01000002', '01000005'])
+        with open(f'{path}.rejected.csv', encoding='utf-8', newline='') as file:
+            rejected = list(csv.reader(file))[1:]
+        self.assertEqual(
+            [(record[0], record[-1]) for record in rejected],
+            [('01000003', 'toan out of range'), ('０１０００００４', 'invalid sbd')],
+        )
+
+        Student.objects.all().delete()
+        self.import_file(path, engine='fast')
+        fast = Student.objects.exclude(sbd='01000003').order_by('sbd').values_list(*columns)
+        self.assertEqual(loaded, list(fast))
+
+
+class LevelCountTests(TestCase):
+    """Every subject's level counts come from one aggregate query or the snapshot"""
+
+    def setUp(self):
+        scores = [8, 7.99, 6, 5.75, 4, 3.99, 0, 10, None]
+        for number, score in enumerate(scores, start=1):
+            Student.objects.create(sbd=f'{1000000 + number:08d}', toan=score, ngu_van=score and 10 - score)
+
+    def test_one_query_counts_every_subject(self):
+        with CaptureQueriesContext(connection) as queries:
+            counts = compute_level_counts(include_overall=True)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(counts[ScoreStatistics.OVERALL], {'total': 9})
+        self.assertEqual(counts['toan'], {'excellent': 2, 'good': 2, 'average': 2, 'below': 2, 'total': 8})
+        self.assertEqual(counts['sinh_hoc'], {'excellent': 0, 'good': 0, 'average': 0, 'below': 0, 'total': 0})
+
+        for subject in ['toan', 'ngu_van']:
+            values = [value for value in Student.objects.values_list(subject, flat=True) if value is not None]
+            self.assertEqual(counts[subject]['total'], len(values))
+            self.assertEqual(counts[subject]['excellent'], sum(value >= 8 for value in values))
+            self.assertEqual(counts[subject]['below'], sum(value < 4 for value in values))
+
+    def test_snapshot_counts_match_the_query(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(SNAPSHOT_DIR=directory.name):
+            snapshot = write_snapshot()
+        self.assertEqual(
+            compute_level_counts(include_overall=True, snapshot=snapshot),
+            compute_level_counts(include_overall=True),
+        )
+
+
+@override_settings(SNAPSHOT_ENABLED=False)
+class StoredStatisticsTests(TestCase):
+    """Statistics are read from ScoreStatistics rows, recomputing only the missing ones"""
+
+    def setUp(self):
+        Student.objects.create(sbd='01000001', toan=9, ngu_van=5)
+        Student.objects.create(sbd='01000002', toan=3, hoa_hoc=6.5)
+        refresh_statistics()
+
+    def student_queries(self, queries):
+        table = Student._meta.db_table
+        return [query['sql'] for query in queries.captured_queries if table in query['sql']]
+
+    def test_stored_rows_are_read_without_scanning_students(self):
+        with CaptureQueriesContext(connection) as queries:
+            counts = load_level_counts()
+        self.assertEqual(self.student_queries(queries), [])
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(counts['toan'], {'excellent': 1, 'good': 0, 'average': 0, 'below': 1, 'total': 2})
+
+    def test_missing_subjects_are_recomputed_and_written_back(self):
+        # Bulk updates send no signals, so the stored toan row is now stale
+        Student.objects.filter(sbd='01000002').update(toan=7)
+        ScoreStatistics.objects.filter(subject_name__in=['toan', 'hoa_hoc']).delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = load_level_counts()
+        self.assertEqual(len(self.student_queries(queries)), 1)
+        self.assertEqual(counts['toan']['good'], 1)
+        self.assertEqual(counts['hoa_hoc']['good'], 1)
+        self.assertEqual(ScoreStatistics.objects.get(subject_name='toan').level_good, 1)
+        self.assertEqual(ScoreStatistics.objects.count(), len(Student.SCORE_FIELDS) + 1)
+
+
+class GroupTotalTests(TestCase):
+    """Block totals are stored on save and ranked in (-total, sbd) index order"""
+
+    def setUp(self):
+        Student.objects.create(sbd='01000003', toan=9, vat_li=8, hoa_hoc=7.5)
+        Student.objects.create(sbd='01000001', toan=8, vat_li=8, hoa_hoc=8.5)
+        Student.objects.create(sbd='01000002', toan=10, vat_li=10, ngoai_ngu=9)
+
+    def test_totals_are_stored_only_when_every_subject_is_present(self):
+        student = Student.objects.get(sbd='01000002')
+        self.assertIsNone(student.group_a_total)
+        self.assertEqual(student.group_a1_total, 29)
+        student.hoa_hoc = 9.25
+        student.save()
+        self.assertEqual(Student.objects.get(sbd='01000002').group_a_total, 29.25)
+
+    def test_ranking_breaks_ties_by_registration_number(self):
+        ranked = [(student.sbd, student.group_a_total) for student in top_students_by('group_a_total')]
+        self.assertEqual(ranked, [('01000001', 24.5), ('01000003', 24.5)])
+        summary = group_a_summary()
+        self.assertEqual(summary['total_group_a_students'], 2)
+        self.assertEqual(summary['average_score'], 24.5)
+
+    @skipUnless(connection.vendor == 'sqlite', 'query plan output is backend specific')
+    def test_every_block_ranking_reads_its_index(self):
+        indexes = {index.fields[0][1:]: index.name for index in Student._meta.indexes}
+        for total_field in Student.GROUP_TOTAL_FIELDS:
+            plan = (
+                Student.objects.filter(**{f'{total_field}__isnull': False})
+                .order_by(f'-{total_field}', 'sbd')[:10].explain()
+            )
+            self.assertIn(indexes[total_field], plan)
+
+
+class LeaderboardHeapTests(TestCase):
+    """The bounded heaps rank every block exactly like a full sort"""
+
+    def setUp(self):
+        generator = random.Random(2024)
+        students = []
+        for number in range(300):
+            scores = {
+                field: None if generator.random() < 0.3 else generator.randrange(30, 41) / 4
+                for field in Student.SCORE_FIELDS
+            }
+            students.append(Student(sbd=f'{1000000 + number:08d}', **scores))
+        Student.objects.bulk_create(students)
+
+    def full_sort(self, subjects, size=10):
+        ranked = []
+        for sbd, *scores in Student.objects.values_list('sbd', *subjects):
+            if None not in scores:
+                ranked.append((-sum(scores), sbd, dict(zip(subjects, scores))))
+        ranked.sort(key=lambda entry: entry[:2])
+        return [{'sbd': sbd, 'total': -total, 'scores': scores} for total, sbd, scores in ranked[:size]]
+
+    def test_every_block_matches_a_full_sort(self):
+        leaderboards = build_leaderboards()
+        combinations = Combination.objects.prefetch_related('subjects')
+        self.assertEqual(set(leaderboards), {combination.code for combination in combinations})
+        for combination in combinations:
+            with self.subTest(block=combination.code):
+                expected = self.full_sort(combination.get_subject_codes())
+                self.assertEqual(len(expected), 10)
+                self.assertEqual(leaderboards[combination.code], expected)
+
+    def test_snapshot_leaderboards_match_the_heaps(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(SNAPSHOT_DIR=directory.name):
+            snapshot = write_snapshot()
+        self.assertEqual(build_leaderboards(snapshot=snapshot), build_leaderboards())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DatasetSummaryTests(TestCase):
+    """Home and About show counts from the cached summary row instead of counting students"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        language = ForeignLanguage.objects.create(code='N1', name='English')
+        Student.objects.create(sbd='01000001', toan=8, ma_ngoai_ngu=language)
+        Student.objects.create(sbd='01000002', toan=6)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_dataset_summary()
+
+    def test_pages_do_not_count_students(self):
+        table = Student._meta.db_table
+        for name in ['scores:home', 'scores:about']:
+            with self.subTest(page=name), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([query for query in queries.captured_queries if table in query['sql']], [])
+            self.assertEqual(response.context['total_students'], 2)
+        self.assertEqual(response.context['languages_count'], 1)
+
+    def test_summary_is_cached_per_dataset_version(self):
+        get_dataset_summary()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dataset_summary()['total_students'], 2)
+
+        Student.objects.bulk_create([Student(sbd='01000003')])
+        self.assertEqual(get_dataset_summary()['total_students'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_dataset_summary()
+        self.assertEqual(get_dataset_summary()['total_students'], 3)
+
+
+@override_settings(SNAPSHOT_ENABLED=False)
+class StudentApiTests(TestCase):
+    """JSON lookups of one student, and of many in a single query"""
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        language = ForeignLanguage.objects.create(code='N1', name='English')
+        Student.objects.create(sbd='01000001', toan=8, vat_li=7, hoa_hoc=9, ma_ngoai_ngu=language)
+        Student.objects.create(sbd='01000002', toan=6, ngu_van=7.5)
+
+    def batch(self, response):
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_single_student(self):
+        response = self.client.get(reverse('scores:student_api', args=['01000001']))
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(payload['sbd'], '01000001')
+        self.assertEqual(payload['foreign_language'], 'N1')
+        self.assertEqual(payload['scores']['hoa_hoc'], 9)
+        self.assertIsNone(payload['scores']['ngu_van'])
+        self.assertEqual(payload['percentiles']['subjects']['toan'], 100.0)
+        self.assertEqual(
+            [(entry['code'], entry['total']) for entry in payload['percentiles']['combinations']], [('A00', 24)]
+        )
+
+        self.assertEqual(self.client.get(reverse('scores:student_api', args=['01000009'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('scores:student_api', args=['0100000x'])).status_code, 400)
+
+    def test_batch_resolves_every_number_in_one_query(self):
+        self.client.get(reverse('scores:student_api', args=['01000001']))
+        url = reverse('scores:student_batch_api')
+        table = Student._meta.db_table
+        sbds = ['01000002', '01000001', '01000009', 'abc', '01000002']
+        with CaptureQueriesContext(connection) as queries:
+            data = self.batch(self.client.get(url, {'sbd': sbds}))
+        self.assertEqual(len([query for query in queries.captured_queries if table in query['sql']]), 1)
+        self.assertEqual(sorted(result['sbd'] for result in data['results']), ['01000001', '01000002'])
+        self.assertEqual(data['not_found'], ['01000009'])
+        self.assertEqual(data['invalid'], ['abc'])
+
+        data = self.batch(self.client.post(url, {'sbds': ['01000002']}, content_type='application/json'))
+        self.assertEqual([result['scores']['ngu_van'] for result in data['results']], [7.5])
+
+    def test_batch_rejects_bad_bodies_and_oversized_requests(self):
+        url = reverse('scores:student_batch_api')
+        response = self.client.post(url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {'sbds': '01000001'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        with override_settings(LOOKUP_BATCH_LIMIT=2):
+            response = self.client.get(url, {'sbd': ['01000001', '01000002', '01000003']})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('At most 2', response.json()['error'])
+            self.batch(self.client.get(url, {'sbd': ['01000001', '01000002']}))
+
+
+class LookupCacheTests(SimpleTestCase):
+    """The per-process LRU evicts the oldest entry and forgets everything on a new version"""
+
+    def test_least_recently_used_entry_is_evicted(self):
+        lru = LookupCache(2)
+        lru.set('01000001', ('01000001',), 1)
+        lru.set('01000002', ('01000002',), 1)
+        self.assertEqual(lru.get('01000001', 1), ('01000001',))
+        lru.set('01000003', ('01000003',), 1)
+        self.assertIs(lru.get('01000002', 1), MISSING)
+        self.assertEqual(len(lru), 2)
+
+    def test_a_new_version_empties_the_cache(self):
+        lru = LookupCache(10)
+        lru.set('01000001', ('01000001',), 1)
+        self.assertIs(lru.get('01000001', 2), MISSING)
+        self.assertEqual(len(lru), 0)
+
+    def test_entries_expire_after_their_timeout(self):
+        lru = LookupCache(10)
+        with mock.patch('scores.lookup.time.monotonic', return_value=100):
+            lru.set('01000009', NOT_FOUND, 1, timeout=30)
+            self.assertEqual(lru.get('01000009', 1), NOT_FOUND)
+        with mock.patch('scores.lookup.time.monotonic', return_value=131):
+            self.assertIs(lru.get('01000009', 1), MISSING)
+
+
+@override_settings(LOOKUP_CACHE_SHARED=True, LOOKUP_CACHE_NEGATIVE_TIMEOUT=30)
+class LookupStudentTests(TestCase):
+    """Lookups go to the database once per number and dataset version"""
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        Student.objects.create(sbd='01000001', toan=8)
+
+    def test_hits_and_negative_results_are_served_from_the_caches(self):
+        dataset_version()
+        with self.assertNumQueries(1):
+            self.assertEqual(lookup_student('01000001')[:2], ('01000001', 8))
+        with self.assertNumQueries(1):
+            self.assertIsNone(lookup_student('01000009'))
+        with self.assertNumQueries(0):
+            lookup_student('01000001')
+            self.assertIsNone(lookup_student('01000009'))
+
+        # Another worker: an empty local LRU, filled from the shared cache
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(lookup_student('01000001')[0], '01000001')
+
+    @override_settings(LOOKUP_CACHE_SHARED=False)
+    def test_an_unknown_number_is_looked_up_again_once_its_entry_expires(self):
+        lookup_student('01000002')
+        Student.objects.bulk_create([Student(sbd='01000002', toan=5)])
+        self.assertIsNone(lookup_student('01000002'))
+        with mock.patch('scores.lookup.time.monotonic', return_value=time.monotonic() + 31):
+            self.assertEqual(lookup_student('01000002')[1], 5)
+
+    def test_a_new_dataset_version_invalidates_both_tiers(self):
+        lookup_student('01000001')
+        Student.objects.filter(sbd='01000001').update(toan=9)
+        self.assertEqual(lookup_student('01000001')[1], 8)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_dataset_version()
+        self.assertEqual(lookup_student('01000001')[1], 9)
+
+
+class StudentIndexTests(TestCase):
+    """Student has no implicit ordering and only the indexes its read paths use"""
+
+    def test_querysets_are_unordered_unless_asked(self):
+        self.assertEqual(Student._meta.ordering, [])
+        self.assertNotIn('ORDER BY', str(Student.objects.all().query))
+
+    def test_database_indexes(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Student._meta.db_table)
+        indexes = {
+            name for name, constraint in constraints.items()
+            if constraint['index'] and not constraint['unique'] and not constraint['foreign_key']
+            and constraint['columns'] != ['ma_ngoai_ngu_id']
+            # PostgreSQL's LIKE companion of the unique sbd index
+            and not name.endswith('_like')
+        }
+        self.assertEqual(indexes, {
+            'student_group_a_rank_idx', 'student_group_a1_rank_idx', 'student_group_b_rank_idx',
+            'student_group_c_rank_idx', 'student_group_d_rank_idx',
+        })
+        self.assertTrue(any(
+            constraint['unique'] and constraint['columns'] == ['sbd'] for constraint in constraints.values()
+        ))
+
+
+@override_settings(
+    SNAPSHOT_ENABLED=False, STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+class PercentileRankTests(TestCase):
+    """Percentile ranks are the share of students scoring at or below a score"""
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        generator = random.Random(7)
+        Student.objects.bulk_create([
+            Student(
+                sbd=f'{1000000 + number:08d}',
+                toan=generator.randrange(0, 51) / 5,
+                vat_li=generator.randrange(0, 41) / 4,
+                hoa_hoc=None if number % 5 == 0 else generator.randrange(0, 41) / 4,
+            )
+            for number in range(200)
+        ])
+
+    def brute_force(self, subjects, total):
+        totals = [
+            sum(scores) for scores in Student.objects.values_list(*subjects)
+            if None not in scores
+        ]
+        return round(100 * sum(value <= total + 1e-9 for value in totals) / len(totals), 1)
+
+    def test_ranks_match_a_count_over_every_student(self):
+        tables = get_percentile_tables()
+        for student in Student.objects.all()[:40]:
+            scores = student.get_all_scores()
+            percentiles = student_percentiles(scores, tables)
+            self.assertEqual(percentiles['subjects']['toan'], self.brute_force(['toan'], student.toan))
+            combinations = {entry['code']: entry for entry in percentiles['combinations']}
+            if student.hoa_hoc is None:
+                self.assertNotIn('A00', combinations)
+                self.assertNotIn('hoa_hoc', percentiles['subjects'])
+            else:
+                self.assertEqual(
+                    combinations['A00']['percentile'],
+                    self.brute_force(['toan', 'vat_li', 'hoa_hoc'], combinations['A00']['total']),
+                )
+
+    def test_lookup_page_shows_the_ranks(self):
+        student = Student.objects.exclude(hoa_hoc=None).first()
+        response = self.client.post(reverse('scores:lookup'), {'sbd': student.sbd})
+        self.assertEqual(response.status_code, 200)
+        rows = {row['name']: row['percentile'] for row in response.context['subject_rows']}
+        percentile = rows[dict(Subject.SUBJECT_CHOICES)['toan']]
+        self.assertEqual(percentile, self.brute_force(['toan'], student.toan))
+        self.assertContains(response, f'{percentile:.1f}%')
+
+
+@override_settings(SNAPSHOT_ENABLED=False, HTTP_CACHE_MAX_AGE=60, HTTP_CACHE_STALE_WHILE_REVALIDATE=600)
+class ConditionalGetTests(TestCase):
+    """Read-only views answer revalidations with 304 until the dataset version changes"""
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        Student.objects.create(sbd='01000001', toan=8)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_dataset_summary()
+        self.url = reverse('scores:statistics_api')
+
+    def test_responses_carry_validators_and_cache_control(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"v{dataset_version()}"')
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(
+            set(response['Cache-Control'].split(', ')),
+            {'public', 'max-age=60', 'stale-while-revalidate=600'},
+        )
+
+    def test_matching_validators_get_a_304_without_running_the_view(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with mock.patch('scores.views.get_or_compute') as get_or_compute:
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 304)
+        get_or_compute.assert_not_called()
+        self.assertEqual(response['ETag'], etag)
+
+    def test_a_new_dataset_version_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_dataset_summary()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(
+    SNAPSHOT_ENABLED=False, STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+class FragmentCacheTests(TestCase):
+    """The statistics table and the Group A ranking are rendered once per dataset version"""
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        Student.objects.create(sbd='01000001', toan=9, vat_li=8, hoa_hoc=7.5)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_dataset_summary()
+
+    def test_cached_fragments_skip_the_data(self):
+        for name, target, text in [
+            ('scores:statistics', 'scores.views.get_or_compute', 'Excellent'),
+            ('scores:top_group_a', 'scores.views.group_a_summary', '01000001'),
+        ]:
+            with self.subTest(page=name):
+                first = self.client.get(reverse(name))
+                self.assertContains(first, text)
+                with mock.patch(target) as compute, CaptureQueriesContext(connection) as queries:
+                    second = self.client.get(reverse(name))
+                compute.assert_not_called()
+                self.assertEqual(second.content, first.content)
+                table = Student._meta.db_table
+                self.assertEqual([query for query in queries.captured_queries if table in query['sql']], [])
+
+    def test_a_new_dataset_version_renders_the_fragment_again(self):
+        self.assertNotContains(self.client.get(reverse('scores:top_group_a')), '01000002')
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(sbd='01000002', toan=10, vat_li=10, hoa_hoc=10)
+            refresh_dataset_summary()
+        self.assertContains(self.client.get(reverse('scores:top_group_a')), '01000002')
+
+
+@override_settings(
+    SNAPSHOT_ENABLED=False, STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+class AsyncViewTests(TestCase):
+    """The ASGI read path answers exactly like the sync views it replaces"""
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        Student.objects.create(sbd='01000001', toan=8, vat_li=7, hoa_hoc=9, ngu_van=6.5)
+
+    def reload_urls(self):
+        # The root URLconf holds on to the resolver of the app's patterns
+        importlib.reload(urls)
+        importlib.reload(root_urls)
+        clear_url_caches()
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_async_views_are_routed_under_async_views(self):
+        self.addCleanup(self.reload_urls)
+        self.reload_urls()
+        self.assertIs(resolve(reverse('scores:student_api', args=['01000001'])).func, views.async_student_api)
+        self.assertIs(resolve(reverse('scores:lookup')).func, views.async_score_lookup)
+
+        response = self.client.get(reverse('scores:statistics_api'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        response = self.client.post(reverse('scores:lookup'), {'sbd': '01000001'})
+        self.assertContains(response, 'Found student with registration number 01000001')
+
+    async def test_async_views_match_the_sync_views(self):
+        sync_factory, async_factory = RequestFactory(), AsyncRequestFactory()
+        for sync_view, async_view, path, args in [
+            (views.student_api, views.async_student_api, '/api/students/01000001/', ['01000001']),
+            (views.student_api, views.async_student_api, '/api/students/01000009/', ['01000009']),
+            (views.student_api, views.async_student_api, '/api/students/x/', ['x']),
+            (views.statistics_api, views.async_statistics_api, '/api/statistics/', []),
+        ]:
+            expected = await sync_to_async(sync_view)(sync_factory.get(path), *args)
+            response = await async_view(async_factory.get(path), *args)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    async def test_async_student_api_only_answers_get(self):
+        request = AsyncRequestFactory().post('/api/students/01000001/')
+        response = await views.async_student_api(request, '01000001')
+        self.assertEqual(response.status_code, 405)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'the pooled backend is PostgreSQL only')
+class PooledBackendTests(TestCase):
+    """Closing a pooled connection hands it back instead of hanging up"""
+
+    def wrapper(self, max_size=2):
+        from gscores.backends.postgresql_pool.base import DatabaseWrapper, close_pools
+
+        options = {**connection.settings_dict['OPTIONS'], 'pool': {'min_size': 1, 'max_size': max_size}}
+        settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': options}
+        self.addCleanup(close_pools, 'pooled')
+        wrapper = DatabaseWrapper(settings_dict, alias='pooled')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_connections_are_checked_out_and_returned(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        raw, pool = wrapper.connection, wrapper.pool
+        self.assertIsNotNone(pool)
+        self.assertIn(id(raw), pool._rused)
+
+        wrapper.close()
+        self.assertFalse(raw.closed)
+        self.assertNotIn(id(raw), pool._rused)
+        self.assertIn(raw, pool._pool)
+
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+
+    def test_an_exhausted_pool_falls_back_to_a_plain_connection(self):
+        first, second = self.wrapper(max_size=1), self.wrapper(max_size=1)
+        first.ensure_connection()
+        second.ensure_connection()
+        self.assertIsNone(second.pool)
+        raw = second.connection
+        second.close()
+        self.assertTrue(raw.closed)
+
+    def test_a_dropped_connection_is_replaced(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        raw, pool = wrapper.connection, wrapper.pool
+        wrapper.close()
+        raw.close()
+        wrapper.ensure_connection()
+        self.assertIsNot(wrapper.connection, raw)
+        self.assertIs(wrapper.pool, pool)
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
@@ -1,13 +1,31 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'scores'
 
+# Hot read paths get their async versions when running under ASGI workers
+if settings.ASYNC_VIEWS:
+    score_lookup, statistics_api, student_api = (
+        views.async_score_lookup, views.async_statistics_api, views.async_student_api
+    )
+else:
+    score_lookup, statistics_api, student_api = (
+        views.score_lookup, views.statistics_api, views.student_api
+    )
+
 urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
-    path('lookup/', views.score_lookup, name='lookup'),
+    path('lookup/', score_lookup, name='lookup'),
     path('statistics/', views.score_statistics, name='statistics'),
     path('top-group-a/', views.top_group_a_students, name='top_group_a'),
-    path('api/statistics/', views.statistics_api, name='statistics_api'),
+    path('top/<str:block>/', views.combination_leaderboard, name='leaderboard'),
+    path('api/statistics/', statistics_api, name='statistics_api'),
+    path('api/statistics/histogram/', views.histogram_api, name='histogram_api'),
+    path('api/students/batch/', views.student_batch_api, name='student_batch_api'),
+    path('api/students/<str:sbd>/', student_api, name='student_api'),
+    path('api/cache-stats/', views.cache_stats_api, name='cache_stats_api'),
+    path('export/students/', views.export_students, name='export_students'),
+    path('export/statistics/', views.export_statistics, name='export_statistics'),
     path('about/', views.AboutView.as_view(), name='about'),
 ]
\ No newline at end of file
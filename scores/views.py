@@ -1,12 +1,32 @@
+import csv
+import json
+import tempfile
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from django.db.models import Q, Count
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
 from django.views.generic import TemplateView
 from django.contrib import messages
-from .models import Student, Subject
-from .forms import ScoreLookupForm
+from .cache import aget_or_compute, dataset_version, get_or_compute, stats as cache_stats
+from .dataset import get_dataset_summary
+from .distributions import aget_percentile_tables, get_percentile_tables, student_percentiles, subject_distributions
+from .exports import export_queryset, iter_csv, write_parquet
+from .leaderboards import get_leaderboards
+from .lookup import alookup_student, iter_students, lookup_student, score_rows, to_payload, to_student, validate_sbd
+from .models import Combination, Student, Subject
+from .forms import ExportFilterForm, ScoreLookupForm
+from .http import dataset_conditional
+from .statistics import LEVEL_BADGES, LEVELS, score_level, subject_statistics
 
 
+# The lookup form's CSRF token must not end up in a shared cache
+@method_decorator(dataset_conditional(public=False), name='dispatch')
 class HomeView(TemplateView):
     """Home page view"""
     template_name = 'scores/home.html'
@@ -14,100 +34,105 @@ class HomeView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['form'] = ScoreLookupForm()
-        context['total_students'] = Student.objects.count()
+        context['total_students'] = get_dataset_summary()['total_students']
         return context
 
 
+def lookup_context(request, form, row, percentile_tables):
+    """Template context for a submitted lookup form, flashing the outcome"""
+    context = {'form': form, 'student': None, 'percentiles': None, 'subject_rows': []}
+    sbd = form.cleaned_data['sbd']
+    if row is None:
+        messages.error(request, f'No student found with registration number {sbd}')
+        return context
+    
+    student = to_student(row)
+    scores = student.get_all_scores()
+    percentiles = student_percentiles(scores, percentile_tables)
+    subject_names = dict(Subject.SUBJECT_CHOICES)
+    for combination in percentiles['combinations']:
+        combination['subject_names'] = [subject_names[code] for code in combination['subjects']]
+    messages.success(request, f'Found student with registration number {sbd}')
+    context.update({
+        'student': student,
+        'percentiles': percentiles,
+        'subject_rows': score_rows(scores, percentiles),
+    })
+    return context
+
+
 def score_lookup(request):
     """View for looking up student scores"""
-    student = None
-    form = ScoreLookupForm()
+    context = {'form': ScoreLookupForm(), 'student': None, 'percentiles': None, 'subject_rows': []}
     
     if request.method == 'POST':
         form = ScoreLookupForm(request.POST)
+        context['form'] = form
         if form.is_valid():
-            sbd = form.cleaned_data['sbd']
-            try:
-                student = Student.objects.select_related('ma_ngoai_ngu').get(sbd=sbd)
-                messages.success(request, f'Found student with registration number {sbd}')
-            except Student.DoesNotExist:
-                messages.error(request, f'No student found with registration number {sbd}')
+            row = lookup_student(form.cleaned_data['sbd'])
+            context = lookup_context(request, form, row, get_percentile_tables() if row else None)
     
-    context = {
-        'form': form,
-        'student': student,
-    }
     return render(request, 'scores/lookup.html', context)
 
 
-def score_statistics(request):
-    """View for displaying score statistics and reports"""
-    subjects = ['toan', 'ngu_van', 'ngoai_ngu', 'vat_li', 'hoa_hoc', 'sinh_hoc', 'lich_su', 'dia_li', 'gdcd']
-    subject_names = {
-        'toan': 'Toán',
-        'ngu_van': 'Ngữ Văn',
-        'ngoai_ngu': 'Ngoại Ngữ',
-        'vat_li': 'Vật Lý',
-        'hoa_hoc': 'Hóa Học',
-        'sinh_hoc': 'Sinh Học',
-        'lich_su': 'Lịch Sử',
-        'dia_li': 'Địa Lý',
-        'gdcd': 'GDCD',
-    }
+async def async_score_lookup(request):
+    """score_lookup for ASGI workers: cache hits never leave the event loop"""
+    context = {'form': ScoreLookupForm(), 'student': None, 'percentiles': None, 'subject_rows': []}
     
-    statistics = {}
-    
-    for subject in subjects:
-        # Get statistics for each subject
-        stats = Student.objects.filter(**{f'{subject}__isnull': False}).aggregate(
-            excellent=Count('id', filter=Q(**{f'{subject}__gte': 8})),
-            good=Count('id', filter=Q(**{f'{subject}__gte': 6, f'{subject}__lt': 8})),
-            average=Count('id', filter=Q(**{f'{subject}__gte': 4, f'{subject}__lt': 6})),
-            below=Count('id', filter=Q(**{f'{subject}__lt': 4})),
-            total=Count('id')
-        )
-        
-        # Calculate percentages
-        total = stats['total']
-        if total > 0:
-            excellent_pct = (stats['excellent'] / total) * 100
-            good_pct = (stats['good'] / total) * 100
-            average_pct = (stats['average'] / total) * 100
-            below_pct = (stats['below'] / total) * 100
-        else:
-            excellent_pct = good_pct = average_pct = below_pct = 0
-        
-        statistics[subject] = {
-            'name': subject_names[subject],
-            'excellent': stats['excellent'],
-            'good': stats['good'],
-            'average': stats['average'],
-            'below': stats['below'],
-            'total': stats['total'],
-            'excellent_pct': excellent_pct,
-            'good_pct': good_pct,
-            'average_pct': average_pct,
-            'below_pct': below_pct,
-        }
+    if request.method == 'POST':
+        form = ScoreLookupForm(request.POST)
+        context['form'] = form
+        if form.is_valid():
+            row = await alookup_student(form.cleaned_data['sbd'])
+            context = lookup_context(request, form, row, await aget_percentile_tables() if row else None)
     
+    return render(request, 'scores/lookup.html', context)
+
+
+@dataset_conditional
+def score_statistics(request):
+    """View for displaying score statistics and reports"""
+    # Only evaluated when the cached table fragment is missing
     context = {
-        'statistics': statistics,
-        'subjects': subjects,
-        'subject_names': subject_names,
+        'statistics': SimpleLazyObject(lambda: get_or_compute('subject_statistics', subject_statistics)),
+        'dataset_version': dataset_version(),
     }
     return render(request, 'scores/statistics.html', context)
 
 
-def top_group_a_students(request):
-    """View for displaying top 10 Group A students"""
-    # Get students who have all Group A subjects (Math, Physics, Chemistry)
-    top_students = Student.objects.filter(
-        toan__isnull=False,
-        vat_li__isnull=False,
-        hoa_hoc__isnull=False
-    ).extra(
-        select={'group_a_total': 'toan + vat_li + hoa_hoc'}
-    ).order_by('-group_a_total')[:10]
+def top_students_by(total_field, limit=10):
+    """Top students for a stored combination total, read in index order"""
+    return list(
+        Student.objects.filter(**{f'{total_field}__isnull': False})
+        .select_related('ma_ngoai_ngu')
+        .order_by(f'-{total_field}', 'sbd')[:limit]
+    )
+
+
+def stored_total_field(subject_codes):
+    """The stored combination total adding up exactly these subjects, if any"""
+    subject_codes = set(subject_codes)
+    for total_field, subjects in Student.GROUP_TOTAL_FIELDS.items():
+        if set(subjects) == subject_codes:
+            return total_field
+    return None
+
+
+def level_badge(score):
+    """Bootstrap badge class for a score's level"""
+    return LEVEL_BADGES[score_level(score)][1]
+
+
+def group_a_summary():
+    """Top 10 Group A students with their badges and the summary card figures"""
+    # Range read on the (-group_a_total, sbd) index; the total is only
+    # stored when all Group A subjects (Math, Physics, Chemistry) are present
+    top_students = top_students_by('group_a_total')
+    for student in top_students:
+        student.group_a_scores = [
+            (score, level_badge(score))
+            for score in (student.toan, student.vat_li, student.hoa_hoc)
+        ]
     
     # Calculate statistics for the summary cards
     if top_students:
@@ -120,42 +145,69 @@ def top_group_a_students(request):
         excellent_percentage = (excellent_count / len(top_students)) * 100
         
         # Get total number of Group A students in database
-        total_group_a_students = Student.objects.filter(
-            toan__isnull=False,
-            vat_li__isnull=False,
-            hoa_hoc__isnull=False
-        ).count()
+        total_group_a_students = Student.objects.filter(group_a_total__isnull=False).count()
     else:
         average_score = 0
         excellent_count = 0
         excellent_percentage = 0
         total_group_a_students = 0
     
-    context = {
+    return {
         'top_students': top_students,
         'average_score': average_score,
         'excellent_count': excellent_count,
         'excellent_percentage': excellent_percentage,
         'total_group_a_students': total_group_a_students,
     }
-    return render(request, 'scores/top_group_a.html', context)
 
 
-def statistics_api(request):
-    """API endpoint for statistics data (for charts)"""
-    subjects = ['toan', 'ngu_van', 'ngoai_ngu', 'vat_li', 'hoa_hoc', 'sinh_hoc', 'lich_su', 'dia_li', 'gdcd']
-    subject_names = {
-        'toan': 'Toán',
-        'ngu_van': 'Ngữ Văn',
-        'ngoai_ngu': 'Ngoại Ngữ',
-        'vat_li': 'Vật Lý',
-        'hoa_hoc': 'Hóa Học',
-        'sinh_hoc': 'Sinh Học',
-        'lich_su': 'Lịch Sử',
-        'dia_li': 'Địa Lý',
-        'gdcd': 'GDCD',
+@dataset_conditional
+def top_group_a_students(request):
+    """View for displaying top 10 Group A students"""
+    # Only evaluated when the cached page fragment is missing
+    context = {
+        'group_a': SimpleLazyObject(group_a_summary),
+        'dataset_version': dataset_version(),
     }
+    return render(request, 'scores/top_group_a.html', context)
+
+
+@dataset_conditional
+def combination_leaderboard(request, block):
+    """View for displaying the top students of any combination block"""
+    combination = get_object_or_404(Combination.objects.prefetch_related('subjects'), code=block.upper())
+    subject_names = dict(Subject.SUBJECT_CHOICES)
+    subjects = [(code, subject_names[code]) for code in combination.get_subject_codes()]
+    
+    total_field = stored_total_field(code for code, _ in subjects)
+    if total_field:
+        # A00, A01, B00, C00 and D01 keep a stored total: range read on its index
+        entries = [
+            {
+                'sbd': student.sbd,
+                'total': getattr(student, total_field),
+                'scores': {code: getattr(student, code) for code, _ in subjects},
+            }
+            for student in top_students_by(total_field)
+        ]
+    else:
+        entries = get_leaderboards().get(combination.code, [])
+    for entry in entries:
+        entry['subject_scores'] = [
+            (entry['scores'][code], level_badge(entry['scores'][code])) for code, _ in subjects
+        ]
     
+    context = {
+        'combination': combination,
+        'combinations': Combination.objects.all(),
+        'subjects': subjects,
+        'top_students': entries,
+    }
+    return render(request, 'scores/leaderboard.html', context)
+
+
+def chart_data(statistics):
+    """Level counts per subject in the shape the statistics chart expects"""
     data = {
         'labels': [],
         'excellent': [],
@@ -164,30 +216,175 @@ def statistics_api(request):
         'below': []
     }
     
-    for subject in subjects:
-        stats = Student.objects.filter(**{f'{subject}__isnull': False}).aggregate(
-            excellent=Count('id', filter=Q(**{f'{subject}__gte': 8})),
-            good=Count('id', filter=Q(**{f'{subject}__gte': 6, f'{subject}__lt': 8})),
-            average=Count('id', filter=Q(**{f'{subject}__gte': 4, f'{subject}__lt': 6})),
-            below=Count('id', filter=Q(**{f'{subject}__lt': 4}))
-        )
-        
-        data['labels'].append(subject_names[subject])
-        data['excellent'].append(stats['excellent'])
-        data['good'].append(stats['good'])
-        data['average'].append(stats['average'])
-        data['below'].append(stats['below'])
+    for stats in statistics.values():
+        data['labels'].append(stats['name'])
+        for level in LEVELS:
+            data[level].append(stats[level])
+    return data
+
+
+@dataset_conditional
+def statistics_api(request):
+    """API endpoint for statistics data (for charts)"""
+    return JsonResponse(chart_data(get_or_compute('subject_statistics', subject_statistics)))
+
+
+@dataset_conditional
+async def async_statistics_api(request):
+    """statistics_api for ASGI workers"""
+    return JsonResponse(chart_data(await aget_or_compute('subject_statistics', subject_statistics)))
+
+
+@dataset_conditional
+def histogram_api(request):
+    """API endpoint for full score distributions, optionally ?subject=<code>"""
+    distributions = get_or_compute('score_distributions', subject_distributions)
+    
+    subject = request.GET.get('subject')
+    if subject:
+        if subject not in distributions:
+            return JsonResponse({'error': f'Unknown subject "{subject}"'}, status=400)
+        distributions = {subject: distributions[subject]}
+    
+    return JsonResponse(distributions)
+
+
+@require_GET
+def student_api(request, sbd):
+    """API endpoint returning one student's scores as JSON"""
+    sbd, errors = validate_sbd(sbd)
+    if errors:
+        return JsonResponse({'error': errors[0]}, status=400)
+    
+    row = lookup_student(sbd)
+    if row is None:
+        return JsonResponse({'error': f'No student found with registration number {sbd}'}, status=404)
+    return JsonResponse(to_payload(row))
+
+
+async def async_student_api(request, sbd):
+    """student_api for ASGI workers: cache hits never leave the event loop"""
+    # require_GET cannot wrap async views before Django 5.0
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    
+    sbd, errors = validate_sbd(sbd)
+    if errors:
+        return JsonResponse({'error': errors[0]}, status=400)
     
+    row = await alookup_student(sbd)
+    if row is None:
+        return JsonResponse({'error': f'No student found with registration number {sbd}'}, status=404)
+    return JsonResponse(to_payload(row, await aget_percentile_tables()))
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def student_batch_api(request):
+    """API endpoint resolving many registration numbers in one query.
+    
+    Accepts ``?sbd=...&sbd=...`` or a POSTed ``{"sbds": [...]}`` body and
+    streams ``{"results": [...], "not_found": [...], "invalid": [...]}``.
+    """
+    if request.method == 'POST':
+        try:
+            sbds = json.loads(request.body or b'{}').get('sbds', [])
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Body must be a JSON object with an "sbds" list.'}, status=400)
+    else:
+        sbds = request.GET.getlist('sbd')
+    
+    if not isinstance(sbds, list):
+        return JsonResponse({'error': '"sbds" must be a list.'}, status=400)
+    limit = settings.LOOKUP_BATCH_LIMIT
+    if len(sbds) > limit:
+        return JsonResponse({'error': f'At most {limit} registration numbers per request.'}, status=400)
+    
+    valid, invalid = [], []
+    for sbd in dict.fromkeys(str(sbd) for sbd in sbds):
+        cleaned, errors = validate_sbd(sbd)
+        if errors:
+            invalid.append(sbd)
+        else:
+            valid.append(cleaned)
+    
+    def stream():
+        found = set()
+        percentile_tables = get_percentile_tables()
+        yield '{"results": ['
+        for index, row in enumerate(iter_students(valid)):
+            found.add(row[0])
+            payload = to_payload(row, percentile_tables)
+            yield (',' if index else '') + json.dumps(payload, cls=DjangoJSONEncoder)
+        not_found = [sbd for sbd in valid if sbd not in found]
+        yield f'], "not_found": {json.dumps(not_found)}, "invalid": {json.dumps(invalid)}}}'
+    
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+@staff_member_required
+@require_GET
+def export_students(request):
+    """Download the student table as streamed CSV, or Parquet with ?format=parquet.
+    
+    Staff only. Optional filters: ``subject`` with ``min_score``/``max_score``,
+    and ``language`` (a foreign language code such as N1).
+    """
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    
+    filters = dict(form.cleaned_data)
+    export_format = filters.pop('format') or 'csv'
+    rows = export_queryset(**filters)
+    
+    if export_format == 'parquet':
+        # Parquet writes its footer last, so spool to disk rather than memory
+        file = tempfile.TemporaryFile()
+        try:
+            write_parquet(rows, file)
+        except ImproperlyConfigured as error:
+            file.close()
+            return JsonResponse({'error': str(error)}, status=501)
+        file.seek(0)
+        return FileResponse(file, as_attachment=True, filename='students.parquet')
+    
+    response = StreamingHttpResponse(iter_csv(rows), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="students.csv"'
+    return response
+
+
+@staff_member_required
+@require_GET
+def export_statistics(request):
+    """Download the per-subject level statistics as CSV (staff only)"""
+    statistics = get_or_compute('subject_statistics', subject_statistics)
+    columns = ['name', *LEVELS, 'total', *[f'{level}_pct' for level in LEVELS]]
+    
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="statistics.csv"'
+    writer = csv.writer(response)
+    writer.writerow(['subject', *columns])
+    for subject, stats in statistics.items():
+        writer.writerow([subject, *[stats[column] for column in columns]])
+    return response
+
+
+@staff_member_required
+def cache_stats_api(request):
+    """API endpoint exposing this worker's cache hit/miss counters (staff only)"""
+    data = cache_stats.snapshot()
+    data['backend'] = settings.CACHES['default']['BACKEND']
+    data['dataset_version'] = dataset_version()
     return JsonResponse(data)
 
 
+@method_decorator(dataset_conditional, name='dispatch')
 class AboutView(TemplateView):
     """About page view"""
     template_name = 'scores/about.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_students'] = Student.objects.count()
-        context['subjects_count'] = Subject.objects.count()
-        context['languages_count'] = Student.objects.exclude(ma_ngoai_ngu__isnull=True).values('ma_ngoai_ngu').distinct().count()
+        context.update(get_dataset_summary())
         return context
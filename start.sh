@@ -65,8 +65,25 @@ except Exception as e:
     print(f'Superuser creation error: {e}')
 EOF
 
-echo "Starting Gunicorn server..."
-exec gunicorn gscores.wsgi:application \
+# START_MODE=wsgi (default) runs sync workers, one request at a time each.
+# START_MODE=asgi runs Uvicorn workers that serve the async lookup and
+# statistics views concurrently on an event loop.
+if [ "${START_MODE:-wsgi}" = "asgi" ]; then
+    echo "Starting Gunicorn server with Uvicorn (ASGI) workers..."
+    APP=gscores.asgi:application
+    WORKER_CLASS=uvicorn.workers.UvicornWorker
+    export ASYNC_VIEWS=${ASYNC_VIEWS:-True}
+    # Each async request opens its own connection, so none are kept open
+    # past the request (use DATABASE_POOL=True on PostgreSQL instead)
+    export DATABASE_CONN_MAX_AGE=${DATABASE_CONN_MAX_AGE:-0}
+else
+    echo "Starting Gunicorn server..."
+    APP=gscores.wsgi:application
+    WORKER_CLASS=sync
+fi
+
+exec gunicorn "$APP" \
+    --worker-class "$WORKER_CLASS" \
     --bind 0.0.0.0:${PORT:-8000} \
     --workers ${WEB_CONCURRENCY:-2} \
     --timeout 120 \